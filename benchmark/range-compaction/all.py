@@ -2,17 +2,13 @@ import re
 from pathlib import Path
 
 import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
+from benchmark_utils import EXPERIMENT_FOLDERS, list_metrics, load_metric_series
+from derived_metrics import available_derived_metrics
+from profiling import profile_from_argv, span
 
-# ==== Customize your experiment directories here ====
-EXPERIMENT1 = "100M-20:8:1:enable-range-compaction:disable-peridioc-full-compaction"
-EXPERIMENT1_NAME = "Enable Range Compaction"
-EXPERIMENT2 = "100M-20:8:1:disable-range-compaction:disable-peridioc-full-compaction"
-EXPERIMENT2_NAME = "Disable Range Compaction"
-EXPERIMENT3 = "100M-20:8:1:disable-range-compaction:enable-peridioc-full-compaction"
-EXPERIMENT3_NAME = "Disable Range Compaction + Enable Periodic Full Compaction"
-BASE_PATH: Path = Path(__file__).parent  # or set manually, e.g., Path("/path/to/data")
+# ==== Experiments come from benchmark_utils.EXPERIMENT_FOLDERS (or RANGE_COMPACTION_EXPERIMENTS) ====
+BASE_PATH: Path = Path(__file__).parent
 OUT_DIR = BASE_PATH / "comparison_charts"
 OUT_DIR.mkdir(exist_ok=True)
 
@@ -37,90 +33,8 @@ METRICS_NEED_LOG = {"Seek average latency"}
 SMOOTHING_WINDOW = 1  # 1 minute window for smoothing
 # ===================================================
 
-
-def size_to_mb(size_str):
-    """Convert size string (supports GB, MB, kB, B) to MB."""
-    if pd.isnull(size_str):
-        return np.nan
-    s = str(size_str).strip().strip('"')  # Remove quotes if present
-    try:
-        # Handle special case of "0 B"
-        if s == "0 B":
-            return 0.0
-
-        # Extract number and unit
-        parts = s.split()
-        if len(parts) != 2:
-            print(f"Invalid size format (expected 'number unit'): {s}")
-            return np.nan
-
-        num = float(parts[0])
-        unit = parts[1].upper()  # Convert to uppercase for comparison
-        # print(f"Converting size: {s} -> num={num}, unit={unit}")
-
-        # Convert to MB
-        if unit == "GB":
-            return num * 1024
-        elif unit == "MB":
-            return num
-        elif unit == "KB":  # This will match both KB and kB after upper()
-            return num / 1024
-        elif unit == "B":
-            return num / (1024 * 1024)
-        else:
-            print(f"Unknown unit in size string: {s} (unit={unit})")
-            return np.nan
-    except Exception as e:
-        print(f"Failed to convert size {size_str}: {e}")
-        return np.nan
-
-
-def duration_to_microseconds(val):
-    """
-    Convert a string with a time unit to microseconds (float).
-    Supports: ns, us/µs, ms, s (case-insensitive)
-    """
-    if pd.isnull(val):
-        return np.nan
-    s = str(val).replace(" ", "").lower()  # µs -> us
-    try:
-        if s.endswith("ns"):
-            return float(s[:-2]) / 1000  # ns to µs
-        elif s.endswith("µs"):
-            return float(s[:-2])
-        elif s.endswith("ms"):
-            return float(s[:-2]) * 1000
-        elif s.endswith("s"):
-            return float(s[:-1]) * 1_000_000
-        else:
-            return float(s)
-    except Exception as e:
-        print(f"Failed to convert {val} to microseconds: {s}, {e}")
-        return np.nan
-
-
-def is_duration_column(df, col):
-    if df.empty or col not in df.columns:
-        return False
-    try:
-        sample = str(df[col].iloc[0]).lower()
-        return (
-            any(x in sample for x in ["μs", "µs", "ms", "ns", "s"])
-            or "latency" in sample
-        )
-    except Exception:
-        return False
-
-
-def is_size_column(df, col):
-    if df.empty or col not in df.columns:
-        return False
-    try:
-        sample = str(df[col].iloc[0]).lower()
-        # print(f"Sample data for {col}: {sample}")
-        return any(x in sample for x in ["mb", "gb", "kb", "b"])
-    except Exception:
-        return False
+# `python all.py --profile` prints per-stage timings and writes all_profile.json / .trace.json
+profile_from_argv("all")
 
 
 def get_adaptive_size_unit(values):
@@ -155,48 +69,13 @@ def get_adaptive_time_unit(values):
         return "ns", 1_000
 
 
-def auto_convert_column(df, col):
-    if df.empty or col not in df.columns:
-        return pd.Series([], dtype=float)
-    # Size units
-    if is_size_column(df, col):
-        values = df[col].map(size_to_mb)
-        if values.isna().all():
-            print(f"Warning: All values in {col} were converted to NaN")
-        return values
-    # Time/duration units
-    elif is_duration_column(df, col):
-        values = df[col].map(duration_to_microseconds)
-        if values.isna().all():
-            print(f"Warning: All values in {col} were converted to NaN")
-        return values
-    else:
-        try:
-            values = pd.to_numeric(df[col], errors="coerce")
-            if values.isna().all():
-                print(f"Warning: All values in {col} were converted to NaN")
-            return values
-        except Exception as e:
-            print(f"Failed to convert {col} to numeric: {e}")
-            return df[col]  # fallback: keep as is
-
-
-def get_metric_files(exp_dir):
-    """Return a dict: {metric_name: path_to_csv}"""
-    mapping = {}
-    for f in Path(exp_dir).glob("*.csv"):
-        metric_name = f.stem.split("-data-")[0]
-        mapping[metric_name] = f
-    return mapping
-
-
 # Find all available metrics
-metrics1 = get_metric_files(BASE_PATH / EXPERIMENT1)
-metrics2 = get_metric_files(BASE_PATH / EXPERIMENT2)
-metrics3 = get_metric_files(BASE_PATH / EXPERIMENT3)
 common_metrics = sorted(
-    set(metrics1.keys()) & set(metrics2.keys()) & set(metrics3.keys())
+    set.intersection(*(set(list_metrics(folder, include_derived=False)) for folder in EXPERIMENT_FOLDERS.values()))
 )
+# Derived metrics (write amplification, tombstone ratio, ...) are charted like exported ones
+derived_metrics = available_derived_metrics(common_metrics)
+common_metrics = sorted(common_metrics + derived_metrics)
 
 # common_metrics = ["Bytes read per second"]
 
@@ -226,10 +105,9 @@ markdown_content = [
     "# Range Compaction Benchmark Charts\n",
     "This document provides an overview of all the charts generated from the range compaction benchmark comparison.\n",
     "## Overview\n",
-    "The benchmark compares three configurations:",
-    f"- **{EXPERIMENT1_NAME}**: `{EXPERIMENT1}`",
-    f"- **{EXPERIMENT2_NAME}**: `{EXPERIMENT2}`",
-    f"- **{EXPERIMENT3_NAME}**: `{EXPERIMENT3}`\n",
+    f"The benchmark compares {len(EXPERIMENT_FOLDERS)} configurations:",
+    *(f"- **{name}**: `{Path(folder).name}`" for name, folder in EXPERIMENT_FOLDERS.items()),
+    "",
     "## Charts\n",
     "The following charts are available in the `comparison_charts` directory:\n",
 ]
@@ -259,148 +137,100 @@ with open(BASE_PATH / "charts.md", "w") as f:
 
 
 def smooth_data(df, window_minutes=SMOOTHING_WINDOW):
-    """Apply rolling mean smoothing to the data."""
+    """Apply a centered rolling mean over a time window (exports differ in sampling interval)."""
     if df.empty:
         return df
 
-    # Calculate window size in terms of data points
-    # Assuming data points are roughly evenly spaced
-    time_diff = df["time_offset"].diff().mean()
-    if pd.isna(time_diff) or time_diff == 0:
-        window = 10  # fallback to 10 points if can't determine
-    else:
-        window = max(1, int(window_minutes / time_diff))
-
-    # Apply rolling mean
-    df["value"] = df["value"].rolling(window=window, min_periods=1, center=True).mean()
+    df = df.sort_values("Time")
+    df["value"] = (
+        df.rolling(f"{window_minutes}min", on="Time", center=True, min_periods=1)["value"].mean()
+    )
     return df
 
 
-def trim_dataframes(df1, df2, df3):
+def trim_dataframes(frames):
     """Trim dataframes to match the shortest duration among all experiments."""
     # Get the minimum duration among all experiments
-    min_duration = min(
-        df1["time_offset"].max(), df2["time_offset"].max(), df3["time_offset"].max()
-    )
+    min_duration = min(df["time_offset"].max() for df in frames.values())
 
     # Trim each dataframe to the minimum duration
-    df1 = df1[df1["time_offset"] <= min_duration]
-    df2 = df2[df2["time_offset"] <= min_duration]
-    df3 = df3[df3["time_offset"] <= min_duration]
-
-    return df1, df2, df3
+    return {name: df[df["time_offset"] <= min_duration] for name, df in frames.items()}
 
 
 for metric in common_metrics:
     try:
-        df1 = pd.read_csv(metrics1[metric], parse_dates=["Time"])
-        df2 = pd.read_csv(metrics2[metric], parse_dates=["Time"])
-        df3 = pd.read_csv(metrics3[metric], parse_dates=["Time"])
+        # Exported and derived metrics alike, in base units, the OM leader's column for HA exports
+        # (node_charts.py plots every node)
+        frames = {name: load_metric_series(folder, metric) for name, folder in EXPERIMENT_FOLDERS.items()}
 
-        if df1.empty or df2.empty or df3.empty:
-            print(f"Skipping {metric}: Empty DataFrame")
+        if any(df is None for df in frames.values()):
+            print(f"Skipping {metric}: Missing inputs")
             continue
 
-        # Get the value column (it's the last column)
-        value_col = df1.columns[-1]
-        if (
-            value_col not in df1.columns
-            or value_col not in df2.columns
-            or value_col not in df3.columns
-        ):
-            print(f"Skipping {metric}: Column {value_col} not found")
+        if any(df.empty for df in frames.values()):
+            print(f"Skipping {metric}: Empty DataFrame")
             continue
 
+        kind = next(iter(frames.values())).attrs.get("kind", "count")
+        rows = sum(len(df) for df in frames.values())
+
         # Align by time offset
-        df1["time_offset"] = (df1["Time"] - df1["Time"].iloc[0]).dt.total_seconds() / 60
-        df2["time_offset"] = (df2["Time"] - df2["Time"].iloc[0]).dt.total_seconds() / 60
-        df3["time_offset"] = (df3["Time"] - df3["Time"].iloc[0]).dt.total_seconds() / 60
+        with span("align", metric, rows=rows):
+            for df in frames.values():
+                df["time_offset"] = (df["Time"] - df["Time"].iloc[0]).dt.total_seconds() / 60
 
-        # Trim dataframes to match shortest duration
-        df1, df2, df3 = trim_dataframes(df1, df2, df3)
+            # Trim dataframes to match shortest duration
+            frames = trim_dataframes(frames)
 
         # Print duration info for debugging
         print(f"\n{metric} durations:")
-        print(f"{EXPERIMENT1_NAME}: {df1['time_offset'].max():.2f} minutes")
-        print(f"{EXPERIMENT2_NAME}: {df2['time_offset'].max():.2f} minutes")
-        print(f"{EXPERIMENT3_NAME}: {df3['time_offset'].max():.2f} minutes")
-
-        # Auto-convert values
-        df1["value"] = auto_convert_column(df1, value_col)
-        df2["value"] = auto_convert_column(df2, value_col)
-        df3["value"] = auto_convert_column(df3, value_col)
-
-        # Drop missing
-        df1 = df1.dropna(subset=["value"])
-        df2 = df2.dropna(subset=["value"])
-        df3 = df3.dropna(subset=["value"])
-
-        if df1.empty or df2.empty or df3.empty:
-            print(f"Skipping {metric}: No valid data after conversion")
-            continue
+        for name, df in frames.items():
+            print(f"{name}: {df['time_offset'].max():.2f} minutes")
 
         # Pretty y label and adaptive units
         y_label = metric
-        if is_duration_column(df1, value_col):
-            unit, scale = get_adaptive_time_unit(
-                pd.concat([df1["value"], df2["value"], df3["value"]])
-            )
-            df1["value"] = df1["value"] * scale
-            df2["value"] = df2["value"] * scale
-            df3["value"] = df3["value"] * scale
+        if kind == "duration":
+            unit, scale = get_adaptive_time_unit(pd.concat([df["value"] for df in frames.values()]))
             y_label = f"Time ({unit})"
-        elif is_size_column(df1, value_col):
-            unit, scale = get_adaptive_size_unit(
-                pd.concat([df1["value"], df2["value"], df3["value"]])
-            )
-            df1["value"] = df1["value"] * scale
-            df2["value"] = df2["value"] * scale
-            df3["value"] = df3["value"] * scale
+        elif kind == "bytes":
+            unit, scale = get_adaptive_size_unit(pd.concat([df["value"] / (1024 * 1024) for df in frames.values()]))
+            scale = scale / (1024 * 1024)
             y_label = f"Size ({unit})"
+        else:
+            scale = 1.0
+        frames = {name: df.assign(value=df["value"] * scale) for name, df in frames.items()}
 
         # Apply smoothing if needed
         if metric in METRICS_NEED_SMOOTHING:
             print(f"Applying smoothing to {metric}")
-            df1 = smooth_data(df1)
-            df2 = smooth_data(df2)
-            df3 = smooth_data(df3)
+            with span("smooth", metric, rows=rows):
+                frames = {name: smooth_data(df) for name, df in frames.items()}
 
         # Plot
-        plt.figure(figsize=(10, 6))
-        plt.plot(
-            df1["time_offset"], df1["value"], label=f"{EXPERIMENT1_NAME}", linewidth=1
-        )
-        plt.plot(
-            df2["time_offset"],
-            df2["value"],
-            label=f"{EXPERIMENT2_NAME}",
-            linewidth=1,
-        )
-        plt.plot(
-            df3["time_offset"],
-            df3["value"],
-            label=f"{EXPERIMENT3_NAME}",
-            linewidth=1,
-        )
-        plt.xlabel("Time Offset (minutes)", fontsize=13)
-        plt.ylabel(y_label, fontsize=13)
-        plt.title(f"{metric} Over Time", fontsize=15, fontweight="bold")
-        plt.legend(fontsize=11)
-        plt.grid(True, which="both", linestyle=":", linewidth=0.7)
-
-        # Apply log scale if needed
-        if metric in METRICS_NEED_LOG:
-            print(f"Applying log scale to {metric}")
-            plt.yscale("log")
-            # Add minor grid lines for log scale
-            plt.grid(True, which="minor", linestyle=":", linewidth=0.5)
-
-        plt.tight_layout()
-
-        # Save figure
-        save_name = f"{normalize_filename(metric)}_comparison.png"
-        plt.savefig(OUT_DIR / save_name, dpi=1000)
-        plt.close()
+        with span("render", metric):
+            plt.figure(figsize=(10, 6))
+            for name, df in frames.items():
+                plt.plot(df["time_offset"], df["value"], label=name, linewidth=1)
+            plt.xlabel("Time Offset (minutes)", fontsize=13)
+            plt.ylabel(y_label, fontsize=13)
+            plt.title(f"{metric} Over Time", fontsize=15, fontweight="bold")
+            plt.legend(fontsize=11)
+            plt.grid(True, which="both", linestyle=":", linewidth=0.7)
+
+            # Apply log scale if needed
+            if metric in METRICS_NEED_LOG:
+                print(f"Applying log scale to {metric}")
+                plt.yscale("log")
+                # Add minor grid lines for log scale
+                plt.grid(True, which="minor", linestyle=":", linewidth=0.5)
+
+            plt.tight_layout()
+
+            # Save figure
+            save_name = f"{normalize_filename(metric)}_comparison.png"
+            with span("savefig", metric):
+                plt.savefig(OUT_DIR / save_name, dpi=1000)
+            plt.close()
         print(f"Saved {metric} to {OUT_DIR / save_name}")
 
     except Exception as e:
@@ -0,0 +1,241 @@
+"""
+Ozone audit-log parser for per-operation throughput and latency.
+Reads OM (OMAudit) and S3 gateway (S3GAudit) audit logs through mmap in parallel
+chunks with one batched regex per chunk; strings (op, user, volume, bucket, key,
+result) are interned into per-chunk vocabularies and merged into categorical
+columns. Builds per-op throughput series on the Grafana 30s grid and per-op
+latency histograms when the log carries timings.
+"""
+
+import argparse
+import glob
+import gzip
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from benchmark_utils import BASE_PATH, EXPERIMENT_FOLDERS, save_chart, split_file_chunks
+
+AUDIT_LOG_PATTERNS = ["om-audit*.log*", "s3g-audit*.log*", "*audit*.log*"]
+BUCKET_SECONDS = 30
+# Latency histogram: log-spaced from 10µs to 100s
+LATENCY_EDGES_MS = np.logspace(-2, 5, 141)
+GZ_BLOCK_SIZE = 64 * 1024**2
+
+# 2025-06-10 11:04:00,123 | INFO  | OMAudit | user=hadoop | ip=10.0.0.1 | op=CREATE_KEY {volume=vol1, bucket=b1, key=k1, ...} | ret=SUCCESS |
+# Lookaheads pick the entity fields and an optional timing out of the parameters in the same pass
+AUDIT_LINE = re.compile(
+    rb"^(?P<ts>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d[,.]\d{3}) \| \w+\s*\| (?P<logger>\w+) \| "
+    rb"user=(?P<user>[^ |\n]*) \| ip=[^ |\n]* \| op=(?P<op>\w+)"
+    rb"(?=[^\n]*?[{ ,]volume=(?P<volume>[^,}\n]*))?"
+    rb"(?=[^\n]*?[{ ,]bucket=(?P<bucket>[^,}\n]*))?"
+    rb"(?=[^\n]*?[{ ,]key=(?P<key>[^,}\n]*))?"
+    rb"(?=[^\n]*?\b(?:latencyMs|elapsedMs|latency)=(?P<latency>\d+(?:\.\d+)?))?"
+    rb"[^\n]*?\| ret=(?P<ret>\w+)",
+    re.MULTILINE,
+)
+FIELDS = ["logger", "user", "op", "volume", "bucket", "key", "ret"]
+
+
+def _parse_bytes(data, start=0, end=None, keep_keys=True):
+    """Columns of the audit lines in data[start:end]: ms timestamps, latencies and interned string codes"""
+    vocab = {field: {} for field in FIELDS}
+    codes = {field: [] for field in FIELDS}
+    stamps, latencies = [], []
+    for match in AUDIT_LINE.finditer(data, start, len(data) if end is None else end):
+        stamps.append(match["ts"])
+        latency = match["latency"]
+        latencies.append(float(latency) if latency else np.nan)
+        for field in FIELDS:
+            if field == "key" and not keep_keys:
+                continue
+            table = vocab[field]
+            value = match[field] or b""
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            codes[field].append(code)
+
+    text = np.array(stamps, dtype="S23")
+    # "2025-06-10 11:04:00,123" -> ISO form numpy parses in one call
+    iso = np.char.replace(np.char.replace(text, b",", b"."), b" ", b"T").astype("U23")
+    return {
+        "ms": iso.astype("datetime64[ms]").view(np.int64),
+        "latency_ms": np.asarray(latencies, dtype=float),
+        "codes": {f: np.asarray(c, dtype=np.int32) for f, c in codes.items()},
+        "vocab": {f: [v.decode("utf-8", "replace") for v in table] for f, table in vocab.items()},
+    }
+
+
+def parse_chunk(file_path, start, end, keep_keys=True):
+    """Parse the audit lines in one byte range of a log file"""
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _parse_bytes(mm, start, end, keep_keys)
+
+
+def _iter_gz_parts(file_path, keep_keys):
+    """Compressed logs cannot be mapped, so they are decompressed and parsed block by block"""
+    leftover = b""
+    with gzip.open(file_path, "rb") as f:
+        while True:
+            block = f.read(GZ_BLOCK_SIZE)
+            data = leftover + block
+            end = len(data) if not block else data.rfind(b"\n") + 1
+            yield _parse_bytes(data, 0, end, keep_keys)
+            leftover = data[end:]
+            if not block:
+                return
+
+
+def _merge(parts, keep_keys=True):
+    """Concatenate chunk results, remapping each chunk's codes onto shared categories"""
+    columns = {"time": np.concatenate([p["ms"] for p in parts]).astype("datetime64[ms]")}
+    columns["latency_ms"] = np.concatenate([p["latency_ms"] for p in parts])
+    for field in FIELDS:
+        if field == "key" and not keep_keys:
+            continue
+        categories = sorted(set().union(*(p["vocab"][field] for p in parts)))
+        index = {name: i for i, name in enumerate(categories)}
+        merged = [np.asarray([index[n] for n in p["vocab"][field]], dtype=np.int32)[p["codes"][field]]
+                  if len(p["codes"][field]) else np.empty(0, np.int32) for p in parts]
+        columns[field] = pd.Categorical.from_codes(np.concatenate(merged), categories=categories)
+    return pd.DataFrame(columns).sort_values("time", kind="stable").reset_index(drop=True)
+
+
+def read_audit_logs(paths, workers=None, keep_keys=True):
+    """Parse audit logs (plain files in parallel mmap chunks, .gz serially) into one event table"""
+    workers = workers or os.cpu_count() or 1
+    parts = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            if path.endswith(".gz"):
+                parts.extend(_iter_gz_parts(path, keep_keys))
+                continue
+            chunks = split_file_chunks(path, workers * 4)
+            futures = [pool.submit(parse_chunk, path, start, end, keep_keys) for start, end in chunks]
+            parts.extend(future.result() for future in futures)
+    if not parts:
+        return pd.DataFrame(columns=["time", "latency_ms"] + FIELDS)
+    return _merge(parts, keep_keys)
+
+
+def throughput_series(events, bucket_seconds=BUCKET_SECONDS):
+    """Operations per second per op on a fixed time grid (columns: ops, index: bucket start)"""
+    buckets = events["time"].dt.floor(f"{bucket_seconds}s")
+    counts = events.groupby([buckets, "op"], observed=True).size().unstack("op", fill_value=0)
+    grid = pd.date_range(counts.index.min(), counts.index.max(), freq=f"{bucket_seconds}s")
+    return counts.reindex(grid, fill_value=0) / bucket_seconds
+
+
+def latency_histograms(events, edges=LATENCY_EDGES_MS):
+    """{op: counts per latency bin} for events that carry a timing"""
+    timed = events.dropna(subset=["latency_ms"])
+    histograms = {}
+    for op, group in timed.groupby("op", observed=True):
+        bins = np.clip(np.searchsorted(edges, group["latency_ms"].to_numpy(), side="right") - 1, 0, len(edges) - 2)
+        histograms[op] = np.bincount(bins, minlength=len(edges) - 1)
+    return histograms
+
+
+def _histogram_quantile(counts, q, edges=LATENCY_EDGES_MS):
+    cumulative = np.cumsum(counts)
+    if cumulative[-1] == 0:
+        return np.nan
+    i = np.searchsorted(cumulative, q * cumulative[-1])
+    # Geometric bin midpoint on log-spaced edges
+    return float(np.sqrt(edges[i] * edges[i + 1]))
+
+
+def summarize_ops(events, bucket_seconds=BUCKET_SECONDS):
+    """Per op: count, failure %, mean and peak ops/s, and latency p50/p99 (ms) where timed"""
+    if events.empty:
+        return pd.DataFrame()
+    rates = throughput_series(events, bucket_seconds)
+    histograms = latency_histograms(events)
+    grouped = events.groupby("op", observed=True)
+    summary = pd.DataFrame(
+        {
+            "count": grouped.size(),
+            "failure_pct": grouped["ret"].apply(lambda r: 100 * (r != "SUCCESS").mean()),
+            "mean_ops_per_s": rates.mean(),
+            "peak_ops_per_s": rates.max(),
+        }
+    )
+    summary["p50_ms"] = [_histogram_quantile(histograms[op], 0.5) if op in histograms else np.nan for op in summary.index]
+    summary["p99_ms"] = [_histogram_quantile(histograms[op], 0.99) if op in histograms else np.nan for op in summary.index]
+    return summary.sort_values("count", ascending=False).reset_index()
+
+
+def plot_throughput(series_by_experiment, top_ops, filename="audit_throughput.png"):
+    """One panel per experiment with the ops/s of the busiest operations"""
+    _, axes = plt.subplots(len(series_by_experiment), 1, figsize=(14, 4 * len(series_by_experiment)), squeeze=False)
+    for ax, (experiment_name, rates) in zip(axes[:, 0], series_by_experiment.items()):
+        minutes = (rates.index - rates.index[0]).total_seconds() / 60
+        for op in [op for op in top_ops if op in rates.columns]:
+            ax.plot(minutes, rates[op], linewidth=1, label=op)
+        ax.set_title(experiment_name, fontsize=10)
+        ax.set_ylabel("Operations per second")
+        ax.legend(fontsize=8, ncol=4)
+        ax.grid(True, alpha=0.3)
+    axes[-1, 0].set_xlabel("Time Offset (minutes)")
+    save_chart(filename)
+
+
+def find_audit_logs(folder_name):
+    """Audit logs (including rotated and gzipped ones) next to an experiment's exports"""
+    paths = set()
+    for pattern in AUDIT_LOG_PATTERNS:
+        paths.update(glob.glob(os.path.join(BASE_PATH, folder_name, pattern)))
+    return sorted(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-operation throughput and latency from Ozone audit logs")
+    parser.add_argument("--log", action="append", default=[], metavar="FOLDER=PATH",
+                        help="Audit log of an experiment (repeatable; default: *audit*.log* in the folder)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--no-keys", action="store_true", help="Skip key names to save memory on huge logs")
+    parser.add_argument("--bucket-seconds", type=int, default=BUCKET_SECONDS)
+    parser.add_argument("--top", type=int, default=8, help="Operations to chart")
+    parser.add_argument("--out", default=None, help="Write the per-op throughput series to this CSV file")
+    args = parser.parse_args()
+
+    logs = {}
+    for item in args.log:
+        folder_name, path = item.split("=", 1)
+        logs.setdefault(folder_name, []).append(path)
+
+    series_by_experiment, summaries = {}, []
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        paths = logs.get(folder_name) or find_audit_logs(folder_name)
+        print(f"\n{experiment_name}")
+        print("=" * 70)
+        if not paths:
+            print("No audit logs found")
+            continue
+        events = read_audit_logs(paths, args.workers, keep_keys=not args.no_keys)
+        print(f"{len(events):,} audit events from {len(paths)} logs "
+              f"({events['logger'].nunique() if len(events) else 0} loggers, {events['user'].nunique() if len(events) else 0} users)")
+        if events.empty:
+            continue
+        summary = summarize_ops(events, args.bucket_seconds)
+        print(summary.to_string(index=False, float_format="%.2f"))
+        series_by_experiment[experiment_name] = throughput_series(events, args.bucket_seconds)
+        summaries.append(summary.assign(experiment=experiment_name))
+
+    if not series_by_experiment:
+        return
+    busiest = pd.concat(summaries).groupby("op")["count"].sum().sort_values(ascending=False)
+    plot_throughput(series_by_experiment, list(busiest.index[:args.top]))
+    if args.out:
+        combined = pd.concat(series_by_experiment, names=["experiment", "time"])
+        combined.to_csv(args.out)
+        print(f"\nThroughput series saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
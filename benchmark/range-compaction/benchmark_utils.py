@@ -3,9 +3,17 @@ Shared utilities for benchmark analysis scripts.
 Contains common functions for parsing data and reading experiment results.
 """
 
+import functools
 import glob
+import mmap
 import os
+
+import numpy as np
 import pandas as pd
+from profiling import add_rows, span
+
+# Experiment folders are resolved relative to this directory
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 
 # Common experiment folder configuration
 EXPERIMENT_FOLDERS = {
@@ -13,11 +21,25 @@ EXPERIMENT_FOLDERS = {
     "Disable Range Compaction": "100M-20:8:1:disable-range-compaction:disable-peridioc-full-compaction",
     "Disable Range Compaction + Periodic Full Compaction": "100M-20:8:1:disable-range-compaction:enable-peridioc-full-compaction",
 }
+# A directory of experiment folders (e.g. lsm_harness.py or sweep.py output) to analyze instead of the ones above
+EXPERIMENTS_ENV = "RANGE_COMPACTION_EXPERIMENTS"
 
 # Standard magnitude targets for analysis
 TARGET_MAGNITUDES = [10**5, 10**6, 10**7]  # 100K, 1M, 10M
 MAGNITUDE_LABELS = ["10^5", "10^6", "10^7"]
 
+KEY_COUNT_METRIC = "KeyTable Estimated number of keys"
+# Only the OM leader serves reads, so its seek rate identifies it among HA instances
+LEADER_METRIC = "Number of seeks per second"
+
+# Multipliers from the unit suffixes Grafana writes into exported values to
+# base units: bytes, microseconds and plain counts ("mB" is Grafana's milli-byte)
+SIZE_UNITS = {"": 1, "mB": 1e-3, "B": 1, "kB": 1024, "KB": 1024, "KiB": 1024, "MB": 1024**2, "MiB": 1024**2,
+              "GB": 1024**3, "GiB": 1024**3, "TB": 1024**4, "TiB": 1024**4}
+DURATION_UNITS = {"": 1, "ns": 1e-3, "µs": 1, "μs": 1, "us": 1, "ms": 1e3, "s": 1e6, "min": 6e7, "h": 3.6e9}
+COUNT_UNITS = {"": 1, "K": 1e3, "Mil": 1e6, "Bil": 1e9, "Tri": 1e12}
+UNIT_SCALES = {"bytes": SIZE_UNITS, "duration": DURATION_UNITS, "count": COUNT_UNITS}
+
 
 def parse_latency_value(value_str):
     """Parse latency value from string to microseconds"""
@@ -100,10 +122,284 @@ def read_csv_data(folder_path, file_pattern):
     if not files:
         return None
 
-    df = pd.read_csv(files[0])
+    with span("load", os.path.basename(files[0])):
+        df = pd.read_csv(files[0])
+        add_rows(len(df))
     return df
 
 
+def parse_experiment_config(folder_name):
+    """Parse a folder name like '100M-20:8:1:enable-range-compaction:...' into its configuration"""
+    parts = os.path.basename(folder_name.rstrip("/")).split(":")
+    total_ops, first_weight = parts[0].split("-", 1)
+    multiplier = {"K": 10**3, "M": 10**6, "B": 10**9}.get(total_ops[-1:], 1)
+    return {
+        "total_ops": int(float(total_ops.rstrip("KMB")) * multiplier),
+        "weights": ":".join([first_weight] + parts[1:3]),
+        "range_compaction": "enable-range-compaction" in parts,
+        "periodic_full_compaction": "enable-peridioc-full-compaction" in parts,
+    }
+
+
+def experiment_label(folder_name):
+    """Label in the EXPERIMENT_FOLDERS style, e.g. 'Disable Range Compaction + Periodic Full Compaction'"""
+    config = parse_experiment_config(folder_name)
+    label = f"{'Enable' if config['range_compaction'] else 'Disable'} Range Compaction"
+    return label + (" + Periodic Full Compaction" if config["periodic_full_compaction"] else "")
+
+
+def discover_experiment_folders(root):
+    """{label: folder path} for every canonical experiment folder under root
+
+    Labels repeated across folders (several key counts or thread counts) get the folder name appended.
+    """
+    folders = [
+        path for path in sorted(glob.glob(os.path.join(root, "*-range-compaction:*")))
+        if os.path.isdir(path) and glob.glob(os.path.join(path, "*-data-*.csv"))
+    ]
+    # Same order as EXPERIMENT_FOLDERS: range compaction first, periodic full compaction last
+    folders.sort(key=lambda path: (not parse_experiment_config(path)["range_compaction"],
+                                   parse_experiment_config(path)["periodic_full_compaction"]))
+    labels = [experiment_label(path) for path in folders]
+    return {
+        label if labels.count(label) == 1 else f"{label} [{os.path.basename(path)}]": os.path.abspath(path)
+        for label, path in zip(labels, folders)
+    }
+
+
+if os.environ.get(EXPERIMENTS_ENV):
+    EXPERIMENT_FOLDERS = discover_experiment_folders(os.environ[EXPERIMENTS_ENV])
+
+
+def get_metric_files(folder_path):
+    """Return {metric_name: csv_path} for an experiment folder, newest export first wins"""
+    mapping = {}
+    for f in sorted(glob.glob(os.path.join(BASE_PATH, folder_path, "*.csv"))):
+        metric_name = os.path.basename(f).split("-data-")[0]
+        mapping[metric_name] = f
+    return mapping
+
+
+def list_metrics(folder_path, include_derived=True):
+    """Sorted metric names of an experiment, optionally including derived metrics"""
+    names = sorted(get_metric_files(folder_path))
+    if include_derived:
+        from derived_metrics import available_derived_metrics
+
+        names = sorted(names + available_derived_metrics(names))
+    return names
+
+
+def metric_kind(units):
+    """Classify a column of unit suffixes as 'bytes', 'duration' or 'count'"""
+    present = set(units.unique()) - {""}
+    if present & (set(SIZE_UNITS) - {""}):
+        return "bytes"
+    if present & (set(DURATION_UNITS) - {""}):
+        return "duration"
+    return "count"
+
+
+def parse_metric_values(values):
+    """Vectorized parse of exported values into base units, returns (array, kind)"""
+    text = pd.Series(values, dtype=object).astype(str).str.strip().str.replace("/s", "", regex=False)
+    parts = text.str.extract(r"^([-+]?[\d.]+(?:[eE][-+]?\d+)?)\s*(\S*)$")
+    numbers = pd.to_numeric(parts[0], errors="coerce").to_numpy(dtype=float)
+    units = parts[1].fillna("")
+    kind = metric_kind(units)
+    scale = units.map(UNIT_SCALES[kind]).to_numpy(dtype=float)
+    return numbers * scale, kind
+
+
+def load_metric_series(folder_path, metric_name, aggregate="leader"):
+    """Load one exported metric as a Time/value DataFrame in base units
+
+    Exports with one column per OM instance are collapsed with `aggregate`
+    ("leader", "sum" or "max"); see load_instance_series for the per-node data.
+    Leader series come memory-mapped from timeseries_store.py's store when it
+    holds a current copy, so processes share them instead of each parsing the CSV.
+    """
+    if aggregate == "leader":
+        from timeseries_store import read_current_frame
+
+        stored = read_current_frame(folder_path, metric_name)
+        if stored is not None:
+            return stored
+
+    instances = load_instance_series(folder_path, metric_name)
+    if instances is None:
+        # Derived metrics are served through the same loader as exported ones
+        from derived_metrics import load_derived_series
+
+        return load_derived_series(folder_path, metric_name)
+
+    roles = instance_roles(folder_path) if instances.shape[1] > 2 else {}
+    return aggregate_instances(instances, aggregate, roles)
+
+
+def load_instance_series(folder_path, metric_name):
+    """Load an exported metric with one value column per instance (e.g. "om:9874"), or None"""
+    csv_path = get_metric_files(folder_path).get(metric_name)
+    if csv_path is None:
+        return None
+
+    times, columns, kind = _read_metric_csv(csv_path, os.path.getmtime(csv_path))
+    series = pd.DataFrame({"Time": times, **columns})
+    series.attrs["kind"] = kind
+    return series
+
+
+@functools.lru_cache(maxsize=256)
+def _read_metric_csv(csv_path, mtime):
+    """Parsed (times, {instance: values}, kind) of one export, cached until the file changes"""
+    name = os.path.basename(csv_path)
+    with span("load", name):
+        df = pd.read_csv(csv_path)
+        add_rows(len(df))
+    columns, kinds = {}, []
+    with span("parse", name, rows=len(df) * (len(df.columns) - 1)):
+        for instance in df.columns[1:]:
+            columns[instance], column_kind = parse_metric_values(df[instance])
+            kinds.append(column_kind)
+    # An all-zero column reads as a plain count, so prefer any unit-bearing kind
+    kind = next((k for k in kinds if k != "count"), "count")
+
+    valid = np.zeros(len(df), dtype=bool)
+    for values in columns.values():
+        valid |= ~np.isnan(values)
+    times = pd.to_datetime(df["Time"]).to_numpy()[valid]
+    times.setflags(write=False)
+    for instance, values in columns.items():
+        columns[instance] = values[valid]
+        columns[instance].setflags(write=False)
+    return times, columns, kind
+
+
+def instance_roles(folder_path):
+    """Label each instance 'leader' or 'follower'
+
+    Only the OM leader serves reads, so the instance with the most seeks is taken
+    as the leader. A single instance is the leader; without the seek metric every
+    instance is 'unknown'.
+    """
+    seeks = load_instance_series(folder_path, LEADER_METRIC)
+    if seeks is None:
+        return {}
+    instances = list(seeks.columns[1:])
+    if len(instances) == 1:
+        return {instances[0]: "leader"}
+    totals = seeks[instances].sum(skipna=True).to_numpy()
+    leader = instances[int(np.argmax(totals))]
+    return {instance: "leader" if instance == leader else "follower" for instance in instances}
+
+
+def aggregate_instances(instances_df, how="leader", roles=None):
+    """Collapse per-instance columns into one Time/value DataFrame ("leader", "sum" or "max")"""
+    columns = list(instances_df.columns[1:])
+    values = instances_df[columns].to_numpy(dtype=float)
+    if how == "sum":
+        collapsed = np.where(np.isnan(values).all(axis=1), np.nan, np.nansum(values, axis=1))
+    elif how == "max":
+        collapsed = np.fmax.reduce(values, axis=1)
+    elif how == "leader":
+        leaders = [c for c in columns if (roles or {}).get(c) == "leader"]
+        collapsed = values[:, columns.index(leaders[0]) if leaders else 0]
+    else:
+        raise ValueError(f"Unknown instance aggregation '{how}'")
+
+    series = pd.DataFrame({"Time": instances_df["Time"].to_numpy(), "value": collapsed})
+    series = series.dropna(subset=["value"]).reset_index(drop=True)
+    series.attrs.update(instances_df.attrs)
+    return series
+
+
+def project_instances_onto_key_count(folder_path, metric_name):
+    """Long Time/instance/role/value/key_count frame, each node projected onto its own KeyTable estimate"""
+    instances = load_instance_series(folder_path, metric_name)
+    key_counts = load_instance_series(folder_path, KEY_COUNT_METRIC)
+    if instances is None or key_counts is None:
+        return None
+
+    roles = instance_roles(folder_path)
+    # Nodes without their own KeyTable column fall back to the leader's estimate
+    fallback = aggregate_instances(key_counts, "leader", roles)
+    frames = []
+    for instance in instances.columns[1:]:
+        series = instances[["Time", instance]].rename(columns={instance: "value"}).dropna(subset=["value"])
+        if instance in key_counts.columns:
+            own = key_counts[["Time", instance]].rename(columns={instance: "value"}).dropna(subset=["value"])
+        else:
+            own = fallback
+        projected = project_onto_key_count(series, own)
+        frames.append(projected.assign(instance=instance, role=roles.get(instance, "unknown")))
+    result = pd.concat(frames, ignore_index=True)
+    result.attrs.update(instances.attrs)
+    return result
+
+
+def project_onto_key_count(series_df, key_count_df):
+    """Attach the nearest-in-time KeyTable estimate to every sample of a series"""
+    key_counts = key_count_df[["Time", "value"]].rename(columns={"value": "key_count"})
+    with span("align", "key count", rows=len(series_df)):
+        projected = pd.merge_asof(
+            series_df.sort_values("Time"), key_counts.sort_values("Time"), on="Time", direction="nearest"
+        )
+    projected.attrs.update(series_df.attrs)
+    return projected
+
+
+def load_key_count_projection(folder_path, metric_name):
+    """Samples of an exported or derived metric with the experiment's own KeyTable estimate attached, or None
+
+    Samples from before the KeyTable estimate starts have no key count of their own and are dropped.
+    """
+    series = load_metric_series(folder_path, metric_name)
+    key_counts = load_metric_series(folder_path, KEY_COUNT_METRIC)
+    if series is None or key_counts is None or series.empty or key_counts.empty:
+        return None
+    series = series[series["Time"] >= key_counts["Time"].iloc[0]]
+    return project_onto_key_count(series, key_counts).reset_index(drop=True)
+
+
+def _time_ns(times):
+    """Convert datetimes to int64 nanoseconds regardless of the pandas time unit"""
+    return np.asarray(times, dtype="datetime64[ns]").view(np.int64)
+
+
+def align_experiment_series(folder_path, metrics=None, step_seconds=30):
+    """Align an experiment's metrics on a shared time grid
+
+    Each grid point takes the latest sample at or before it, as long as that sample
+    is not older than the series' own sampling interval. Returns (times, metric
+    names, matrix of shape (metrics, times)) with NaN where a metric has no data.
+    """
+    series = {}
+    for metric in metrics or sorted(get_metric_files(folder_path)):
+        df = load_metric_series(folder_path, metric)
+        if df is not None and not df.empty:
+            series[metric] = df
+    if not series:
+        return pd.DatetimeIndex([]), [], np.empty((0, 0))
+
+    start = min(df["Time"].iloc[0] for df in series.values())
+    end = max(df["Time"].iloc[-1] for df in series.values())
+    times = pd.date_range(start, end, freq=f"{step_seconds}s")
+    grid = _time_ns(times)
+    step_ns = step_seconds * 10**9
+
+    matrix = np.full((len(series), len(grid)), np.nan)
+    with span("align", os.path.basename(folder_path), rows=matrix.size):
+        for row, df in enumerate(series.values()):
+            t = _time_ns(df["Time"])
+            idx = np.searchsorted(t, grid, side="right") - 1
+            spacing = np.median(np.diff(t)) if len(t) > 1 else step_ns
+            tolerance = max(step_ns, 1.5 * spacing)
+            valid = (idx >= 0) & (grid - t[np.clip(idx, 0, None)] <= tolerance)
+            matrix[row, valid] = df["value"].to_numpy()[idx[valid]]
+
+    return times, list(series), matrix
+
+
 def get_key_count_data():
     """Get key count progression data (same across all experiments)"""
     key_count_folder = list(EXPERIMENT_FOLDERS.values())[0]
@@ -161,11 +457,32 @@ def create_magnitude_label(target_mag):
     return f"10^{len(str(target_mag)) - 1}"
 
 
+def split_file_chunks(file_path, num_chunks):
+    """Split a text file into byte ranges that start and end on line boundaries"""
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+
+    num_chunks = max(1, min(num_chunks, size))
+    boundaries = [0]
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, num_chunks):
+            pos = max(size * i // num_chunks, boundaries[-1])
+            newline = mm.find(b"\n", pos)
+            if newline == -1:
+                break
+            boundaries.append(newline + 1)
+    boundaries.append(size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
 def save_chart(filename, dpi=150):
     """Save matplotlib chart with standard settings"""
     import matplotlib.pyplot as plt
     
     plt.tight_layout()
-    plt.savefig(filename, dpi=dpi, bbox_inches="tight")
+    with span("savefig", os.path.basename(filename)):
+        plt.savefig(filename, dpi=dpi, bbox_inches="tight")
     print(f"Chart saved as '{filename}'")
     plt.close()
\ No newline at end of file
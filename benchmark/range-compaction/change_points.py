@@ -0,0 +1,255 @@
+"""
+Change-point detection over every aligned metric series.
+Runs binary segmentation with an L2 (mean-shift) cost, or a two-sided CUSUM, on all
+metrics of an experiment at once, reports the regime boundaries with their
+before/after levels (rates per minute for series CUSUM differenced), and groups
+boundaries that co-occur across metrics (e.g. a Compaction write bytes surge next
+to a Seek 99%-tile step).
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import EXPERIMENT_FOLDERS, KEY_COUNT_METRIC, align_experiment_series
+
+MIN_SEGMENT = 10  # samples (5 minutes at the 30s grid)
+MAX_CHANGES = 20  # per series
+PENALTY_SCALE = 8.0  # multiplies sigma^2 * log(n) per change point
+CUSUM_DRIFT = 0.5  # in units of sigma
+CUSUM_THRESHOLD = 8.0  # in units of sigma
+CUSUM_CLIP = 3.0  # standardized samples are clipped here, so one burst cannot raise an alarm alone
+COOCCURRENCE_MINUTES = 5.0
+# Rank correlation with time above which CUSUM runs on the first differences
+TREND_CORRELATION = 0.95
+
+
+def _prepare(matrix):
+    """Fill gaps and estimate per-series noise from first differences (robust to steps)"""
+    filled = pd.DataFrame(matrix.T).ffill().bfill().to_numpy().T
+    filled = np.nan_to_num(filled)
+    diffs = np.diff(filled, axis=1)
+    mad = np.median(np.abs(diffs - np.median(diffs, axis=1, keepdims=True)), axis=1)
+    sigma = mad / 0.6745 / np.sqrt(2)
+    # Mostly-flat series (e.g. zero compaction bytes) fall back to the plain std
+    sigma = np.where(sigma > 0, sigma, filled.std(axis=1))
+    return filled, np.where(sigma > 0, sigma, 1.0)
+
+
+def binary_segmentation(matrix, penalty_scale=PENALTY_SCALE, min_segment=MIN_SEGMENT, max_changes=MAX_CHANGES):
+    """Greedy binary segmentation with an L2 cost, vectorized across series
+
+    Each iteration adds, for every series at once, the split with the largest cost
+    reduction among all current segments, until the reduction drops below the penalty.
+    Returns a list of sorted change indices per series.
+    """
+    x, sigma = _prepare(matrix)
+    num_series, n = x.shape
+    penalty = penalty_scale * sigma**2 * np.log(n)
+
+    s1 = np.concatenate([np.zeros((num_series, 1)), np.cumsum(x, axis=1)], axis=1)
+    s2 = np.concatenate([np.zeros((num_series, 1)), np.cumsum(x * x, axis=1)], axis=1)
+    positions = np.arange(n)
+    # Segment of every position, as [start, end) bounds per series
+    seg_start = np.zeros((num_series, n), dtype=int)
+    seg_end = np.full((num_series, n), n)
+    active = np.ones(num_series, dtype=bool)
+    changes = [[] for _ in range(num_series)]
+    rows = np.arange(num_series)
+
+    def cost(a, b):
+        length = np.maximum(b - a, 1)
+        total = np.take_along_axis(s1, b, 1) - np.take_along_axis(s1, a, 1)
+        squares = np.take_along_axis(s2, b, 1) - np.take_along_axis(s2, a, 1)
+        return squares - total**2 / length
+
+    for _ in range(max_changes):
+        split = np.broadcast_to(positions, (num_series, n))
+        gain = cost(seg_start, seg_end) - cost(seg_start, split) - cost(split, seg_end)
+        valid = (split - seg_start >= min_segment) & (seg_end - split >= min_segment)
+        gain = np.where(valid, gain, -np.inf)
+
+        best = np.argmax(gain, axis=1)
+        accept = active & (gain[rows, best] > penalty)
+        if not accept.any():
+            break
+        for s in np.flatnonzero(accept):
+            t = best[s]
+            changes[s].append(int(t))
+            a, b = seg_start[s, t], seg_end[s, t]
+            seg_end[s, a:t] = t
+            seg_start[s, t:b] = t
+        active &= accept
+
+    return [sorted(c) for c in changes]
+
+
+def trending_series(x, trend_correlation=TREND_CORRELATION):
+    """Mask of the trending series (cumulative counters and averages, growing key counts)
+
+    The trend test is the rank correlation with time, so a jittery gauge still counts as monotone.
+    """
+    ranks = pd.DataFrame(x.T).rank().to_numpy().T
+    ranks = ranks - ranks.mean(axis=1, keepdims=True)
+    steps = np.arange(x.shape[1]) - (x.shape[1] - 1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = ranks @ steps / np.sqrt((ranks**2).sum(axis=1) * (steps**2).sum())
+    return np.abs(np.nan_to_num(correlation)) >= trend_correlation
+
+
+def _difference_trending(x, trend_correlation=TREND_CORRELATION):
+    """Replace trending series by their first differences
+
+    A level-shift detector alarms every few samples along a steady trend; on the
+    differences it reports changes of rate instead.
+    """
+    trending = trending_series(x, trend_correlation)
+    diffs = np.diff(x, axis=1, prepend=x[:, :1])
+    return np.where(trending[:, None], diffs, x)
+
+
+def cusum(matrix, drift=CUSUM_DRIFT, threshold=CUSUM_THRESHOLD, min_segment=MIN_SEGMENT, clip=CUSUM_CLIP):
+    """Two-sided CUSUM on standardized, clipped series; the reference level restarts after each alarm
+
+    Trending series are differenced first, so their boundaries mark changes of rate.
+    """
+    filled, _ = _prepare(matrix)
+    x, sigma = _prepare(_difference_trending(filled))
+    # Bursty and autocorrelated series are noisier than their first differences suggest:
+    # floor sigma at the spread around a rolling median, which still follows steps
+    local = pd.DataFrame(x.T).rolling(2 * min_segment + 1, center=True, min_periods=1).median().to_numpy().T
+    sigma = np.maximum(sigma, (x - local).std(axis=1))
+    num_series, n = x.shape
+    reference = x[:, :min_segment].mean(axis=1)
+    since = np.zeros(num_series, dtype=int)
+    upper = np.zeros(num_series)
+    lower = np.zeros(num_series)
+    changes = [[] for _ in range(num_series)]
+
+    for t in range(min_segment, n):
+        z = np.clip((x[:, t] - reference) / sigma, -clip, clip)
+        upper = np.maximum(0.0, upper + z - drift)
+        lower = np.maximum(0.0, lower - z - drift)
+        since += 1
+        alarm = ((upper > threshold) | (lower > threshold)) & (since >= min_segment)
+        for s in np.flatnonzero(alarm):
+            changes[s].append(t)
+        # Restart on the new regime, estimated from the most recent samples
+        reference = np.where(alarm, x[:, max(0, t - min_segment + 1):t + 1].mean(axis=1), reference)
+        upper[alarm] = 0.0
+        lower[alarm] = 0.0
+        since[alarm] = 0
+
+    return changes
+
+
+def regime_table(experiment_name, times, names, matrix, changes, differenced=None):
+    """Tabulate boundaries with the mean level of the regimes on either side
+
+    Series marked in `differenced` had their changes of rate detected, so their levels
+    are mean rates per minute rather than mean values.
+    """
+    key_counts = matrix[names.index(KEY_COUNT_METRIC)] if KEY_COUNT_METRIC in names else None
+    offsets = (times - times[0]).total_seconds().to_numpy() / 60
+    differenced = np.zeros(len(names), dtype=bool) if differenced is None else differenced
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.diff(matrix, axis=1, prepend=np.nan) / np.diff(offsets, prepend=np.nan)
+    values = np.where(differenced[:, None], rates, matrix)
+    rows = []
+    for s, metric in enumerate(names):
+        bounds = [0] + changes[s] + [matrix.shape[1]]
+        # Gap-only regimes have no level
+        levels = [pd.Series(values[s, a:b]).mean() for a, b in zip(bounds, bounds[1:])]
+        for k, t in enumerate(changes[s]):
+            before, after = levels[k], levels[k + 1]
+            # A boundary next to a gap-only regime is an artifact of filling the gap
+            if np.isnan(before) or np.isnan(after):
+                continue
+            rows.append(
+                {
+                    "experiment": experiment_name,
+                    "metric": metric,
+                    "time": times[t],
+                    "offset_minutes": offsets[t],
+                    "key_count": key_counts[t] if key_counts is not None else np.nan,
+                    "level": "rate per minute" if differenced[s] else "mean",
+                    "before": before,
+                    "after": after,
+                    "ratio": after / before if before else np.nan,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def flag_cooccurrence(table, window_minutes=COOCCURRENCE_MINUTES):
+    """Group boundaries across metrics (per experiment) that fall within window_minutes of the group's first one
+
+    Groups are anchored at their first boundary rather than chained, so a group
+    never spans more than the window, and a metric appears at most once per
+    group: its next boundary starts a new group.
+    """
+    if table.empty:
+        return table.assign(group=pd.Series(dtype=int), cooccurring_metrics=pd.Series(dtype=int))
+
+    table = table.sort_values(["experiment", "offset_minutes"], ignore_index=True)
+    groups = []
+    group, experiment, start, metrics = -1, None, 0.0, set()
+    for row in table[["experiment", "offset_minutes", "metric"]].itertuples(index=False):
+        if row.experiment != experiment or row.offset_minutes - start > window_minutes or row.metric in metrics:
+            group, experiment, start, metrics = group + 1, row.experiment, row.offset_minutes, set()
+        metrics.add(row.metric)
+        groups.append(group)
+    table["group"] = groups
+    table["cooccurring_metrics"] = table.groupby("group")["metric"].transform("size")
+    return table
+
+
+def detect_change_points(method="binseg", step_seconds=30, window_minutes=COOCCURRENCE_MINUTES, **kwargs):
+    """Run change-point detection over every metric of every experiment"""
+    detector = binary_segmentation if method == "binseg" else cusum
+    tables = []
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        times, names, matrix = align_experiment_series(folder_name, step_seconds=step_seconds)
+        if not names:
+            continue
+        changes = detector(matrix, **kwargs)
+        # CUSUM runs trending series on their differences, so their regimes are rates
+        differenced = trending_series(_prepare(matrix)[0]) if method == "cusum" else None
+        tables.append(regime_table(experiment_name, times, names, matrix, changes, differenced))
+
+    tables = [t for t in tables if not t.empty]
+    return flag_cooccurrence(pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(), window_minutes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect regime changes across all aligned metric series")
+    parser.add_argument("--method", choices=["binseg", "cusum"], default="binseg")
+    parser.add_argument("--window", type=float, default=COOCCURRENCE_MINUTES, help="Co-occurrence window (minutes)")
+    parser.add_argument("--out", default=None, help="Write the boundary table to this CSV file")
+    args = parser.parse_args()
+
+    table = detect_change_points(args.method, window_minutes=args.window)
+    if table.empty:
+        print("No change points found")
+        return
+
+    print(f"Found {len(table)} regime boundaries ({args.method})")
+    for experiment_name, df in table.groupby("experiment", sort=False):
+        print(f"\n{experiment_name}")
+        print("=" * 70)
+        shared = df[df["cooccurring_metrics"] > 1]
+        for group, events in shared.groupby("group"):
+            print(f"  ~{events['offset_minutes'].min():7.1f} min, ~{events['key_count'].min():,.0f} keys:")
+            for _, row in events.iterrows():
+                unit = "/min" if row["level"] == "rate per minute" else ""
+                print(f"      {row['metric']:<40} {row['before']:12.4g}{unit:<4} -> {row['after']:12.4g}{unit:<4}"
+                      f"  ({row['ratio']:.2f}x)")
+        print(f"  ({len(df) - len(shared)} isolated boundaries not shown)")
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"\nBoundary table saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""
+Adaptive range-compaction advisor driven by the streaming metric feed.
+Consumes KeyTable/DeletedTable key estimates, seek latency, next/seek rates,
+SST size and compaction bytes one sample at a time. An online recursive least
+squares model (with forgetting) learns seek latency from nexts per seek and the
+tombstones left behind since the range was last compacted; when the latency it
+attributes to them, accumulated over a horizon, is worth the bytes a compaction
+would rewrite, it recommends compacting that key range.
+The backtest replays the archived experiments and scores the model's own expected
+gain, at every sample and at each recommendation, against the latency gap to the
+range-compaction run at the same key count; recommendations on that run itself
+are false positives.
+"""
+
+import argparse
+import math
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    TARGET_MAGNITUDES,
+    align_experiment_series,
+    create_magnitude_label,
+    get_metric_files,
+    parse_experiment_config,
+)
+from online_stats import EWMA, Welford
+from watch import TailedExport
+
+LATENCY_METRIC = "Seek average latency"
+FEED_METRICS = {
+    "keys": KEY_COUNT_METRIC,
+    "deleted": "DeletedTable Estimated number of keys",
+    "nexts": "Number of next per second",
+    "seeks": "Number of seeks per second",
+    "sst_bytes": "SST file total size",
+    "compaction_bytes": "Compaction write bytes",
+}
+# freon writes /vol1/bucket1/<19-digit counter> and deletes the oldest keys first
+DEFAULT_KEY_PREFIX = "/vol1/bucket1/"
+KEY_DIGITS = 19
+FORGETTING = 0.995
+HORIZON_SECONDS = 3600
+# Seek-seconds saved over the horizon per GiB rewritten before a compaction pays off. Calibrated on the
+# archived runs: recommendations on the range-compaction run (all false positives) stayed near 1e3,
+# those on the runs without it started above 2e4
+MIN_BENEFIT_PER_GIB = 1e4
+COOLDOWN_SECONDS = 600
+WARMUP_SAMPLES = 20
+# Expected gain must exceed this many standard deviations of the model's residuals
+NOISE_SIGMAS = 3.0
+# Range compactions the OM logged during an archived run
+RANGE_LOG_NAME = "compatiing-range.log"
+RANGE_LOG_PATTERN = re.compile(rb"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ .*Compacting range KeyRange")
+
+
+class RecursiveLeastSquares:
+    """Online linear regression with exponential forgetting (O(n^2) per update)"""
+
+    def __init__(self, n_features, forgetting=FORGETTING, delta=1e4):
+        self.forgetting = forgetting
+        self.weights = np.zeros(n_features)
+        self.p = np.eye(n_features) * delta
+        self.count = 0
+
+    def predict(self, x):
+        return float(self.weights @ x)
+
+    def update(self, x, y):
+        """Fit one observation; returns the a-priori prediction error"""
+        error = y - self.predict(x)
+        px = self.p @ x
+        gain = px / (self.forgetting + x @ px)
+        self.weights += gain * error
+        self.p = (self.p - np.outer(gain, px)) / self.forgetting
+        self.count += 1
+        return error
+
+
+class CompactionAdvisor:
+    """Incremental statistics and the tombstone cost model for one OM
+
+    `sst_range` = (start key, end key, bytes) from SST properties replaces the
+    deleted-key frontier estimate of the range and its rewrite cost. Each
+    recommended range starts where the previous one ended. With `assume_applied`
+    every recommendation is also taken as carried out, which moves the frontier
+    the tombstone feature counts from; replays of archived runs move it only at
+    the range compactions the run itself logged (`compacted`).
+    """
+
+    def __init__(self, horizon_seconds=HORIZON_SECONDS, min_benefit_per_gib=MIN_BENEFIT_PER_GIB,
+                 cooldown_seconds=COOLDOWN_SECONDS, key_prefix=DEFAULT_KEY_PREFIX, forgetting=FORGETTING,
+                 sst_range=None, assume_applied=True):
+        self.horizon = horizon_seconds
+        self.min_benefit = min_benefit_per_gib
+        self.cooldown = cooldown_seconds
+        self.key_prefix = key_prefix
+        self.sst_range = sst_range
+        self.assume_applied = assume_applied
+        self.model = RecursiveLeastSquares(3, forgetting)
+        self.residuals = Welford()
+        self.seek_rate = EWMA(300)
+        self.compaction_rate = EWMA(HORIZON_SECONDS)
+        self.frontier = 0.0  # deleted-key estimate when the range was last compacted
+        self.range_start = 0.0  # deleted-key estimate at the end of the last recommended range
+        self.last_recommendation = -math.inf
+
+    def features(self, sample):
+        """[1, nexts per seek, millions of deletes since the frontier] or None when the sample is incomplete
+
+        The deleted/KeyTable ratio barely moves within a run, so the tombstones
+        still sitting in the range are what separates the configurations.
+        """
+        keys, deleted = sample.get("keys", math.nan), sample.get("deleted", math.nan)
+        nexts, seeks = sample.get("nexts", math.nan), sample.get("seeks", math.nan)
+        if not (seeks > 0 and keys > 0 and deleted >= 0 and nexts >= 0):
+            return None
+        return np.array([1.0, nexts / seeks, max(deleted - self.frontier, 0.0) / 1e6])
+
+    def expected_gain(self, x):
+        """Seek latency (µs) the model attributes to tombstones: prediction now minus with none left
+
+        Nexts per seek stay as they are: they follow the listing batch size, and
+        crediting a drop to the lowest rate seen turned noise in that rate into a gain.
+        """
+        cleared = x.copy()
+        cleared[2] = 0.0
+        return max(self.model.predict(x) - self.model.predict(cleared), 0.0)
+
+    def candidate_range(self, sample):
+        """(start key, end key, rewrite bytes) of the range to compact
+
+        Without SST properties this is the keys deleted since the previous
+        recommendation (freon deletes oldest first), costed as their share of the SST footprint.
+        """
+        if self.sst_range is not None:
+            return self.sst_range
+        start, end = int(self.range_start), int(sample["deleted"])
+        fraction = max(sample["deleted"] - self.range_start, 0.0) / (sample["keys"] + sample["deleted"])
+        io_bytes = sample.get("sst_bytes", math.nan) * fraction
+        return f"{self.key_prefix}{start:0{KEY_DIGITS}d}", f"{self.key_prefix}{end:0{KEY_DIGITS}d}", io_bytes
+
+    def compacted(self, sample):
+        """The range was compacted up to this sample: its tombstones no longer count"""
+        deleted = sample.get("deleted", math.nan)
+        if deleted == deleted:
+            self.frontier = max(self.frontier, deleted)
+            self.range_start = max(self.range_start, deleted)
+
+    def update(self, t_seconds, sample, latency):
+        """Feed one sample; returns a recommendation dict or None"""
+        compaction_bytes = sample.get("compaction_bytes", math.nan)
+        if compaction_bytes == compaction_bytes:
+            self.compaction_rate.update(t_seconds, compaction_bytes)
+        x = self.features(sample)
+        if x is None or latency != latency:
+            return None
+
+        self.seek_rate.update(t_seconds, sample["seeks"])
+        error = self.model.update(x, latency)
+        if self.model.count > WARMUP_SAMPLES:
+            self.residuals.update(error)
+        if self.model.count <= WARMUP_SAMPLES or t_seconds - self.last_recommendation < self.cooldown:
+            return None
+
+        gain_us = self.expected_gain(x)
+        noise = NOISE_SIGMAS * math.sqrt(self.residuals.variance) if self.residuals.count > 1 else math.inf
+        start_key, end_key, io_bytes = self.candidate_range(sample)
+        saved_seconds = gain_us * 1e-6 * self.seek_rate.value * self.horizon
+        benefit = saved_seconds / (io_bytes / 1024**3) if io_bytes > 0 else math.nan
+        if gain_us <= noise or not benefit >= self.min_benefit:
+            return None
+
+        self.last_recommendation = t_seconds
+        # Later ranges start where this one ends
+        self.range_start = max(self.range_start, sample["deleted"])
+        if self.assume_applied:
+            self.compacted(sample)
+        rate = self.compaction_rate.value
+        return {
+            "time": pd.Timestamp(t_seconds, unit="s"),
+            "key_count": sample["keys"],
+            "start_key": start_key,
+            "end_key": end_key,
+            "expected_gain_us": gain_us,
+            "saved_seek_seconds": saved_seconds,
+            "io_gib": io_bytes / 1024**3,
+            "benefit_per_gib": benefit,
+            # Rewrite time at the recent background compaction throughput
+            "io_minutes": io_bytes / rate / 60 if rate > 0 else math.nan,
+        }
+
+
+def sst_key_range(sst_csv, min_ratio=0.5, cf="keyTable"):
+    """(start key, end key, bytes) of the files with a tombstone ratio of at least min_ratio in a sst_properties.py --out table"""
+    files = pd.read_csv(sst_csv)
+    files = files[(files["cf"] == cf) & (files["entries"] > 0)]
+    dense = files[files["deletions"] / files["entries"] >= min_ratio]
+    if dense.empty:
+        return None
+    return dense["smallest_key"].min(), dense["largest_key"].max(), float(dense["file_size"].sum())
+
+
+def range_compaction_times(folder, first_sample_seconds):
+    """Epoch seconds of the range compactions in an experiment's OM log, on the metric clock
+
+    The OM logs in UTC and Grafana exports local time; the offset is taken as the
+    whole hours between the first compaction and the first sample, since the
+    service starts with the run.
+    """
+    path = os.path.join(folder, RANGE_LOG_NAME)
+    if not os.path.exists(path):
+        return np.empty(0)
+    with open(path, "rb") as f:
+        stamps = [match.group(1).decode() for match in RANGE_LOG_PATTERN.finditer(f.read())]
+    if not stamps:
+        return np.empty(0)
+    seconds = pd.to_datetime(stamps).to_numpy().astype("datetime64[ns]").view(np.int64) / 1e9
+    offset = round((first_sample_seconds - seconds.min()) / 3600) * 3600
+    return np.sort(seconds + offset)
+
+
+def replay(folder, latency_metric=LATENCY_METRIC, **advisor_options):
+    """Stream an archived experiment through an advisor
+
+    Returns a per-sample frame (latency, expected gain, key count) and the recommendations.
+    """
+    times, names, matrix = align_experiment_series(folder, [latency_metric] + list(FEED_METRICS.values()))
+    rows = dict(zip(names, matrix))
+    if latency_metric not in rows:
+        return pd.DataFrame(), pd.DataFrame()
+    feed = {field: rows.get(metric, np.full(len(times), np.nan)) for field, metric in FEED_METRICS.items()}
+    latency = rows[latency_metric]
+    seconds = np.asarray(times, dtype="datetime64[ns]").view(np.int64) / 1e9
+
+    advisor = CompactionAdvisor(assume_applied=False, **advisor_options)
+    compactions = range_compaction_times(folder, seconds[0]) if len(seconds) else np.empty(0)
+    # Number of logged compactions at or before each sample
+    compacted = np.searchsorted(compactions, seconds, side="right")
+    gains = np.full(len(times), np.nan)
+    recommendations = []
+    for i, t in enumerate(seconds.tolist()):
+        sample = {field: values[i] for field, values in feed.items()}
+        if i and compacted[i] > compacted[i - 1]:
+            advisor.compacted(sample)
+        recommendation = advisor.update(t, sample, latency[i])
+        if recommendation:
+            recommendations.append(recommendation)
+        x = advisor.features(sample)
+        if x is not None and advisor.model.count > WARMUP_SAMPLES:
+            gains[i] = advisor.expected_gain(x)
+    samples = pd.DataFrame({
+        "time": times,
+        "latency": latency,
+        "expected_gain_us": gains,
+        "key_count": feed["keys"],
+    })
+    return samples, pd.DataFrame(recommendations)
+
+
+def latency_at_key_counts(samples, key_counts):
+    """Latency of an experiment interpolated at the given KeyTable sizes"""
+    valid = samples.dropna(subset=["key_count", "latency"]).sort_values("key_count")
+    return np.interp(key_counts, valid["key_count"], valid["latency"], left=np.nan, right=np.nan)
+
+
+def realized_gap(frame, samples, reference_samples):
+    """Latency gap to the reference run at each row's key count (zero throughout for the reference itself)"""
+    key_counts = frame["key_count"].to_numpy()
+    return latency_at_key_counts(samples, key_counts) - latency_at_key_counts(reference_samples, key_counts)
+
+
+def score_gains(samples, reference_samples):
+    """The cost model's expected gain at every sample against the realized gap to the reference run"""
+    realized = realized_gap(samples, samples, reference_samples)
+    predicted = samples["expected_gain_us"].to_numpy()
+    scored = ~np.isnan(realized) & ~np.isnan(predicted)
+    if not scored.any():
+        return None
+    return {
+        "scored": int(scored.sum()),
+        "predicted_us": predicted[scored].mean(),
+        "realized_us": realized[scored].mean(),
+        "mae_us": np.abs(predicted[scored] - realized[scored]).mean(),
+        # Error of never predicting a gain
+        "zero_mae_us": np.abs(realized[scored]).mean(),
+    }
+
+
+def score_recommendations(recommendations, samples, reference_samples):
+    """Predicted gain against the realized latency gap to the reference run at each recommendation's key count
+
+    A recommendation is a false positive when the gap is not positive; every
+    recommendation made on the reference run itself is one.
+    """
+    if recommendations.empty:
+        return None
+    realized = realized_gap(recommendations, samples, reference_samples)
+    predicted = recommendations["expected_gain_us"].to_numpy()
+    scored = ~np.isnan(realized)
+    if not scored.any():
+        return None
+    return {
+        "scored": int(scored.sum()),
+        "predicted_us": predicted[scored].mean(),
+        "realized_us": realized[scored].mean(),
+        "false_positive_rate": (realized[scored] <= 0).mean(),
+        "mae_us": np.abs(predicted[scored] - realized[scored]).mean(),
+    }
+
+
+def backtest(folders=EXPERIMENT_FOLDERS, latency_metric=LATENCY_METRIC, **advisor_options):
+    """Replay every experiment; {experiment: (samples, recommendations)}"""
+    results = {}
+    for experiment_name, folder_name in folders.items():
+        samples, recommendations = replay(folder_name, latency_metric, **advisor_options)
+        if not samples.empty:
+            results[experiment_name] = (samples, recommendations)
+    return results
+
+
+def print_backtest(results, folders=EXPERIMENT_FOLDERS):
+    # Range compaction shows what compaction actually gained at each key count
+    reference = [name for name in results if parse_experiment_config(folders[name])["range_compaction"]]
+    if not reference:
+        print("No range-compaction run to score against")
+        return
+    reference_samples = results[reference[0]][0]
+
+    print("\n" + "=" * 70)
+    print(f"COST MODEL BACKTEST: EXPECTED GAIN vs LATENCY GAP TO '{reference[0]}' (µs)")
+    print("=" * 70)
+    print(f"{'Experiment':<52} {'Samples':>7} {'Pred.':>8} {'Real.':>8} {'MAE':>8} {'No-gain':>8}")
+    for experiment_name, (samples, _) in results.items():
+        score = score_gains(samples, reference_samples)
+        if score is None:
+            print(f"{experiment_name[:52]:<52} {0:>7}")
+            continue
+        print(f"{experiment_name[:52]:<52} {score['scored']:>7} {score['predicted_us']:>8.0f} "
+              f"{score['realized_us']:>8.0f} {score['mae_us']:>8.0f} {score['zero_mae_us']:>8.0f}")
+
+    print(f"\n{'Experiment':<52} " + " ".join(f"{create_magnitude_label(m):>15}" for m in TARGET_MAGNITUDES))
+    reference_latency = latency_at_key_counts(reference_samples, TARGET_MAGNITUDES)
+    for experiment_name, (samples, _) in results.items():
+        realized = latency_at_key_counts(samples, TARGET_MAGNITUDES) - reference_latency
+        gain_samples = samples.dropna(subset=["expected_gain_us"]).sort_values("key_count")
+        predicted = np.interp(TARGET_MAGNITUDES, gain_samples["key_count"], gain_samples["expected_gain_us"],
+                              left=np.nan, right=np.nan)
+        cells = " ".join(f"{p:>7.0f} / {r:>5.0f}" for p, r in zip(predicted, realized))
+        print(f"{experiment_name[:52]:<52} {cells}")
+
+    print("\n" + "=" * 70)
+    print(f"RECOMMENDATIONS vs REALIZED GAP TO '{reference[0]}' (µs)")
+    print("=" * 70)
+    print(f"{'Experiment':<52} {'Recs':>5} {'Scored':>6} {'Pred.':>8} {'Real.':>8} {'FP':>5} {'MAE':>8}")
+    for experiment_name, (samples, recommendations) in results.items():
+        score = score_recommendations(recommendations, samples, reference_samples)
+        if score is None:
+            print(f"{experiment_name[:52]:<52} {len(recommendations):>5} {0:>6}")
+            continue
+        print(f"{experiment_name[:52]:<52} {len(recommendations):>5} {score['scored']:>6} {score['predicted_us']:>8.0f} "
+              f"{score['realized_us']:>8.0f} {score['false_positive_rate']:>5.0%} {score['mae_us']:>8.0f}")
+
+    for experiment_name, (_, recommendations) in results.items():
+        if recommendations.empty:
+            continue
+        print(f"\n{experiment_name}: first recommendations")
+        with pd.option_context("display.width", 200, "display.max_colwidth", 40):
+            print(recommendations.head(10).to_string(index=False, float_format="%.3g"))
+
+
+def follow(folder, latency_metric, interval, **advisor_options):
+    """Tail a running experiment's exports and print recommendations as they appear"""
+    exports = {}
+    advisor = CompactionAdvisor(**advisor_options)
+    fed = 0
+    while True:
+        files = get_metric_files(folder)
+        for metric in [latency_metric] + list(FEED_METRICS.values()):
+            if metric in files and (metric not in exports or exports[metric].path != files[metric]):
+                exports[metric] = TailedExport(files[metric])
+        for tailed in exports.values():
+            tailed.poll()
+        latency = exports.get(latency_metric)
+        if latency is not None and latency.values:
+            times = latency.times.view()
+            instance = next(iter(latency.values))
+            for i in range(fed, len(times)):
+                sample = {}
+                for field, metric in FEED_METRICS.items():
+                    tailed = exports.get(metric)
+                    if tailed is None or not tailed.values:
+                        continue
+                    # Latest value of each feed at or before the latency sample, from the same instance when it has one
+                    j = np.searchsorted(tailed.times.view(), times[i], side="right") - 1
+                    values = tailed.values.get(instance) or next(iter(tailed.values.values()))
+                    sample[field] = values.view()[j] if j >= 0 else math.nan
+                recommendation = advisor.update(times[i] / 1e9, sample, latency.values[instance].view()[i])
+                if recommendation:
+                    print(f"[{recommendation['time']}] compact {recommendation['start_key']} .. {recommendation['end_key']}: "
+                          f"-{recommendation['expected_gain_us']:.1f}µs/seek, {recommendation['saved_seek_seconds']:.1f} "
+                          f"seek-s saved vs {recommendation['io_gib']:.2f} GiB rewritten")
+            fed = len(times)
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend when and where to range-compact from streaming metrics")
+    parser.add_argument("--follow", default=None, metavar="FOLDER", help="Tail a running experiment instead of backtesting")
+    parser.add_argument("--latency-metric", default=LATENCY_METRIC)
+    parser.add_argument("--horizon-minutes", type=float, default=HORIZON_SECONDS / 60)
+    parser.add_argument("--min-benefit", type=float, default=MIN_BENEFIT_PER_GIB,
+                        help="Seek-seconds saved per GiB rewritten before recommending")
+    parser.add_argument("--cooldown-minutes", type=float, default=COOLDOWN_SECONDS / 60)
+    parser.add_argument("--key-prefix", default=DEFAULT_KEY_PREFIX)
+    parser.add_argument("--sst-table", default=None, help="sst_properties.py --out CSV; recommend its densest tombstone range")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between polls with --follow")
+    parser.add_argument("--out", default=None, help="Write all backtest recommendations to this CSV file")
+    args = parser.parse_args()
+
+    options = {
+        "horizon_seconds": args.horizon_minutes * 60,
+        "min_benefit_per_gib": args.min_benefit,
+        "cooldown_seconds": args.cooldown_minutes * 60,
+        "key_prefix": args.key_prefix,
+    }
+    if args.sst_table:
+        options["sst_range"] = sst_key_range(args.sst_table)
+        if options["sst_range"] is None:
+            print("No keyTable SST files above the tombstone ratio threshold, using the deleted-key frontier")
+
+    if args.follow:
+        try:
+            follow(args.follow, args.latency_metric, args.interval, **options)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    results = backtest(EXPERIMENT_FOLDERS, args.latency_metric, **options)
+    print_backtest(results)
+    if args.out and results:
+        combined = pd.concat([recs.assign(experiment=name) for name, (_, recs) in results.items()])
+        combined.to_csv(args.out, index=False)
+        print(f"\nRecommendations saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
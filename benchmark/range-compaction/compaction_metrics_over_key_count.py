@@ -9,86 +9,58 @@ from benchmark_utils import (
     MAGNITUDE_LABELS,
     TARGET_MAGNITUDES,
     create_magnitude_label,
-    extract_magnitude_data,
-    find_magnitude_index,
-    get_key_count_data,
-    parse_bytes_value,
-    parse_time_value,
-    read_csv_data,
+    load_key_count_projection,
     save_chart,
 )
+from profiling import profile_from_argv, span
+
+
+# Derived metric (derived_metrics.py) shown next to the exported compaction metrics
+WRITE_AMPLIFICATION_METRIC = "Write amplification"
 
 
 def get_compaction_metrics_data():
     """Extract compaction metrics data at different magnitudes using shared utilities"""
     data = {}
 
-    # Get shared key count data
-    key_count_df, key_count_col = get_key_count_data()
-    if key_count_df is None:
-        return {}
-
-    # Get compaction metrics for each experiment
+    # Get compaction metrics for each experiment, each against its own key count
     for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
-        compaction_write_df = read_csv_data(folder_name, "Compaction write bytes*.csv")
-        compaction_time_df = read_csv_data(folder_name, "Compaction time average*.csv")
+        compaction_write = load_key_count_projection(folder_name, "Compaction write bytes")
+        compaction_time = load_key_count_projection(folder_name, "Compaction time average")
+        write_amplification = load_key_count_projection(folder_name, WRITE_AMPLIFICATION_METRIC)
 
-        if compaction_write_df is None or compaction_time_df is None:
+        if compaction_write is None or compaction_time is None:
             continue
 
-        compaction_write_col = compaction_write_df.columns[1]
-        compaction_time_col = compaction_time_df.columns[1]
-        
-        # Calculate max compaction write bytes for each magnitude
-        def get_max_write_bytes_at_magnitude(target_mag):
-            closest_idx = find_magnitude_index(key_count_df, key_count_col, target_mag)
-            if closest_idx is not None and closest_idx < len(key_count_df):
-                # Get all values up to this point and find the max
-                write_idx_end = min(closest_idx + 1, len(compaction_write_df))
-                max_write_val = 0
-                for i in range(write_idx_end):
-                    val = parse_bytes_value(compaction_write_df[compaction_write_col].iloc[i])
-                    max_write_val = max(max_write_val, val)
-                return max_write_val
-            return 0
-
         # Extract data at target magnitudes
         magnitude_data = {}
 
         for target_mag in TARGET_MAGNITUDES:
             mag_label = create_magnitude_label(target_mag)
 
-            # Extract write bytes data
-            write_data = extract_magnitude_data(
-                compaction_write_df,
-                compaction_write_col,
-                key_count_df,
-                key_count_col,
-                target_mag,
-                parse_bytes_value,
-            )
-
-            # Extract time data
-            time_data = extract_magnitude_data(
-                compaction_time_df,
-                compaction_time_col,
-                key_count_df,
-                key_count_col,
-                target_mag,
-                parse_time_value,
-            )
-
-            # Get max write bytes up to this magnitude
-            max_write_bytes = get_max_write_bytes_at_magnitude(target_mag)
-
-            if write_data and time_data:
-                magnitude_data[mag_label] = {
-                    "write_bytes_mb": write_data["value"],
-                    "max_write_bytes_mb": max_write_bytes,
-                    "time_seconds": time_data["value"],
-                    "key_count": write_data["key_count"],
-                    "target_magnitude": target_mag,
-                }
+            # First sample where the key count reaches this magnitude
+            write_reached = compaction_write.index[compaction_write["key_count"] >= target_mag]
+            time_reached = compaction_time.index[compaction_time["key_count"] >= target_mag]
+            if write_reached.empty or time_reached.empty:
+                continue
+            write_idx, time_idx = write_reached[0], time_reached[0]
+
+            amplification = 0
+            if write_amplification is not None:
+                amplification_reached = write_amplification[write_amplification["key_count"] >= target_mag]
+                if not amplification_reached.empty:
+                    amplification = amplification_reached["value"].iloc[0]
+
+            # Exported values come back in bytes and µs
+            magnitude_data[mag_label] = {
+                "write_bytes_mb": compaction_write["value"].iloc[write_idx] / (1024 * 1024),
+                # Max compaction write bytes up to this magnitude
+                "max_write_bytes_mb": compaction_write["value"].iloc[: write_idx + 1].max() / (1024 * 1024),
+                "time_seconds": compaction_time["value"].iloc[time_idx] / 1e6,
+                "write_amplification": amplification,
+                "key_count": int(compaction_write["key_count"].iloc[write_idx]),
+                "target_magnitude": target_mag,
+            }
 
         data[experiment_name] = magnitude_data
 
@@ -461,10 +433,31 @@ def create_compaction_visualization(experiment_data):
     ax3.legend()
     ax3.grid(True, alpha=0.3)
 
-    # Plot 4: Leave empty or add summary text
-    ax4.axis('off')
-    ax4.text(0.5, 0.5, "Compaction Metrics Analysis\nAcross Key Count Orders of Magnitude\n\n• Average Write Bytes (top-left)\n• Max Write Bytes (top-right)\n• Average Time (bottom-left)", 
-             ha='center', va='center', fontsize=12, transform=ax4.transAxes)
+    # Plot 4: Write amplification, a derived metric
+    for offset, (name, color, source) in zip(
+        (-width, 0, width),
+        (
+            ("Enable Range Compaction", colors["enable"], enable_data),
+            ("Disable Range Compaction", colors["disable"], disable_no_data),
+            ("Disable Range Compaction + Periodic Full Compaction", colors["periodic"], disable_with_data),
+        ),
+    ):
+        ax4.bar(
+            [i + offset for i in x],
+            [source.get(mag, {}).get("write_amplification", 0) for mag in MAGNITUDE_LABELS],
+            width,
+            label=name,
+            color=color,
+            alpha=0.7,
+        )
+
+    ax4.set_xlabel("Key Count Magnitude")
+    ax4.set_ylabel("Write Amplification")
+    ax4.set_title("Write Amplification by Order of Magnitude")
+    ax4.set_xticks(x)
+    ax4.set_xticklabels(MAGNITUDE_LABELS)
+    ax4.legend()
+    ax4.grid(True, alpha=0.3)
 
     save_chart("compaction_metrics_over_key_count.png")
 
@@ -522,6 +515,11 @@ def print_compaction_summary(experiment_data):
                     f"  Disable + Periodic Full:     {disable_with_max_write:8.1f} MB  ({disable_with_max_write / enable_max_write:.1f}x)"
                 )
             print()
+            print("Write Amplification:")
+            print(f"  Enable Range Compaction:     {enable_mag_data.get('write_amplification', 0):8.2f}")
+            print(f"  Disable Range Compaction:    {disable_no_mag_data.get('write_amplification', 0):8.2f}")
+            print(f"  Disable + Periodic Full:     {disable_with_mag_data.get('write_amplification', 0):8.2f}")
+            print()
             print("Compaction Time Average:")
             print(f"  Enable Range Compaction:     {enable_time:8.1f} sec")
             if enable_time > 0:
@@ -538,11 +536,14 @@ def print_compaction_summary(experiment_data):
 
 
 if __name__ == "__main__":
+    profile_from_argv("compaction_metrics_over_key_count")
+
     # Get experiment data
     experiment_data = get_compaction_metrics_data()
 
     # Create visualization
-    create_compaction_visualization(experiment_data)
+    with span("render", "compaction metrics"):
+        create_compaction_visualization(experiment_data)
 
     # Print summary
     print_compaction_summary(experiment_data)
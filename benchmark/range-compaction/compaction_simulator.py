@@ -0,0 +1,438 @@
+"""
+Leveled-compaction simulator for projecting compaction cost beyond the measured key counts.
+Models memtable flushes, level sizing and tombstone propagation of the OM KeyTable
+under the freon create/delete/list mix, for three policies: no range compaction,
+range compaction and periodic full compaction. All policies (and calibration
+candidates) are simulated together as columns of the same NumPy state arrays.
+"""
+
+import argparse
+
+import matplotlib.pyplot as plt
+import numpy as np
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    create_magnitude_label,
+    load_metric_series,
+    parse_experiment_config,
+    project_onto_key_count,
+    save_chart,
+)
+
+POLICIES = ["none", "range", "periodic_full"]
+POLICY_LABELS = {
+    "none": "Disable Range Compaction",
+    "range": "Enable Range Compaction",
+    "periodic_full": "Disable Range Compaction + Periodic Full Compaction",
+}
+
+DEFAULT_WEIGHTS = (20, 8, 1)  # create:delete:list
+PROJECTION_MAGNITUDES = [10**5, 10**6, 10**7, 10**8, 10**9]
+
+# Calibration grids; the coarse overlap grid is refined around its minimum
+OVERLAP_GRID = np.linspace(0.0, 8.0, 33)
+GARBAGE_SHARE_GRID = np.geomspace(0.01, 0.9, 25)
+REFINE_POINTS = 21
+# Relative error difference below which the upper end of the grid fits as well as the minimum
+EDGE_TOLERANCE = 1e-3
+
+DEFAULT_LSM_OPTIONS = {
+    "entry_bytes": 200,  # average KeyTable put (key + OmKeyInfo)
+    "tombstone_bytes": 60,  # key + internal key trailer
+    "write_buffer_size": 64 * 1024**2,
+    "level0_file_num_compaction_trigger": 4,
+    "max_bytes_for_level_base": 256 * 1024**2,
+    "max_bytes_for_level_multiplier": 10,
+    "num_levels": 7,
+    # Fraction of the next level's key range rewritten per byte moved down:
+    # 1.0 for uniformly random keys, close to 0 for append-only keys
+    "overlap_factor": 1.0,
+    "ops_per_second": 1600,
+    "max_live_keys": 25000,
+    "range_compaction_interval_s": 30,
+    "range_compaction_max_entries": 3_000_000,
+    "range_compaction_min_entries": 100_000,
+    # Share of dead puts and tombstones in the key ranges range compaction picks;
+    # the live puts making up the rest are read and rewritten
+    "range_compaction_garbage_share": 0.5,
+    "full_compaction_interval_s": 3600,
+}
+
+
+def _level_sizes(live, dead, tombs, options):
+    """Bytes per level from entry counts"""
+    return (live + dead) * options["entry_bytes"] + tombs * options["tombstone_bytes"]
+
+
+def _compact_down(state, i, p, q, bottommost, options):
+    """Move fraction p of level i into level i+1, rewriting fraction q of level i+1"""
+    live, dead, tombs = state["live"], state["dead"], state["tombs"]
+    j = i + 1
+
+    read = _level_sizes(live[:, i], dead[:, i], tombs[:, i], options) * p
+    read += _level_sizes(live[:, j], dead[:, j], tombs[:, j], options) * q
+
+    merged_live = live[:, i] * p + live[:, j] * q
+    merged_dead = dead[:, i] * p + dead[:, j] * q
+    merged_tombs = tombs[:, i] * p + tombs[:, j] * q
+    # A tombstone and the put it shadows cancel when they meet; the tombstone
+    # itself can only be dropped once nothing older can exist below it
+    cancelled = np.minimum(merged_tombs, merged_dead)
+    merged_dead -= cancelled
+    merged_tombs = np.where(bottommost, 0.0, merged_tombs)
+
+    for component, merged in ((live, merged_live), (dead, merged_dead), (tombs, merged_tombs)):
+        component[:, i] *= 1 - p
+        component[:, j] = component[:, j] * (1 - q) + merged
+
+    state["compaction_read"] += read
+    state["compaction_write"] += _level_sizes(merged_live, merged_dead, merged_tombs, options)
+
+
+def simulate(
+    weights=DEFAULT_WEIGHTS,
+    max_key_count=10**9,
+    policies=POLICIES,
+    options=None,
+    overlap_factors=None,
+    max_steps=5000,
+):
+    """Simulate leveled compaction until every scenario reaches max_key_count estimated keys
+
+    Scenarios are the cross product of policies and overlap factors. Returns a dict
+    of (steps, scenarios) arrays plus the scenario labels.
+    """
+    options = {**DEFAULT_LSM_OPTIONS, **(options or {})}
+    if overlap_factors is None:
+        overlap_factors = [options["overlap_factor"]]
+
+    policy_idx = np.repeat([POLICIES.index(p) for p in policies], len(overlap_factors))
+    overlap = np.tile(np.asarray(overlap_factors, dtype=float), len(policies))
+    num_scenarios = len(policy_idx)
+    num_levels = options["num_levels"]
+
+    creates, deletes, lists = weights
+    write_share = (creates + deletes) / (creates + deletes + lists)
+    create_share = creates / (creates + deletes)
+    memtable_entry_bytes = create_share * options["entry_bytes"] + (1 - create_share) * options["tombstone_bytes"]
+    entries_per_flush = options["write_buffer_size"] / memtable_entry_bytes
+    # Deletes hit keys created ~max_live_keys creates earlier; those puts are
+    # still in the memtable and are dropped by the flush itself
+    hit = np.clip(1 - options["max_live_keys"] / (entries_per_flush * create_share), 0.0, 1.0)
+
+    # Coarsen to several flushes per step so long projections stay bounded
+    slowest_growth = max(create_share - 2 * (1 - create_share), 0.1 * create_share)
+    flushes_needed = max_key_count / (entries_per_flush * slowest_growth)
+    flushes_per_step = max(1, int(np.ceil(flushes_needed / max_steps)))
+    step_entries = flushes_per_step * entries_per_flush
+    step_seconds = step_entries / (options["ops_per_second"] * write_share)
+    created = step_entries * create_share
+    deleted = step_entries * (1 - create_share)
+
+    targets = np.zeros(num_levels)
+    targets[1:] = options["max_bytes_for_level_base"] * options["max_bytes_for_level_multiplier"] ** np.arange(
+        num_levels - 1
+    )
+    is_range = policy_idx == POLICIES.index("range")
+    is_full = policy_idx == POLICIES.index("periodic_full")
+
+    state = {
+        "live": np.zeros((num_scenarios, num_levels)),
+        "dead": np.zeros((num_scenarios, num_levels)),
+        "tombs": np.zeros((num_scenarios, num_levels)),
+        "l0_files": np.zeros(num_scenarios),
+        "compaction_read": np.zeros(num_scenarios),
+        "compaction_write": np.zeros(num_scenarios),
+    }
+    history = {
+        name: []
+        for name in ("time_s", "created_keys", "estimated_keys", "flush_bytes", "user_bytes",
+                     "compaction_read", "compaction_write", "tombstones", "sst_bytes")
+    }
+    flush_bytes = 0.0
+    user_bytes = 0.0
+
+    for step in range(1, max_steps + 1):
+        live, dead, tombs = state["live"], state["dead"], state["tombs"]
+
+        # Deletes whose put already left the memtable turn a live put into a dead one
+        older_hits = deleted * (1 - hit)
+        total_live = live.sum(axis=1, keepdims=True)
+        share = np.divide(live, total_live, out=np.zeros_like(live), where=total_live > 0)
+        converted = np.minimum(share * older_hits, live)
+        live -= converted
+        dead += converted
+
+        flushed_puts = created - deleted * hit
+        live[:, 0] += flushed_puts
+        tombs[:, 0] += deleted
+        state["l0_files"] += flushes_per_step
+        flush_bytes += flushed_puts * options["entry_bytes"] + deleted * options["tombstone_bytes"]
+        user_bytes += created * options["entry_bytes"] + deleted * options["tombstone_bytes"]
+
+        # Level compactions, top-down
+        sizes = _level_sizes(live, dead, tombs, options)
+        for i in range(num_levels - 1):
+            if i == 0:
+                p = (state["l0_files"] >= options["level0_file_num_compaction_trigger"]).astype(float)
+                state["l0_files"] *= 1 - p
+            else:
+                excess = np.clip(sizes[:, i] - targets[i], 0.0, None)
+                p = np.divide(excess, sizes[:, i], out=np.zeros(num_scenarios), where=sizes[:, i] > 0)
+            q = np.clip(overlap * p, 0.0, 1.0)
+            bottommost = sizes[:, i + 2:].sum(axis=1) == 0 if i + 2 < num_levels else np.ones(num_scenarios, bool)
+            _compact_down(state, i, p, q, bottommost, options)
+            sizes = _level_sizes(live, dead, tombs, options)
+
+        elapsed = step * step_seconds
+        # Range compaction: drop tombstones and the puts they shadow in the dense ranges,
+        # rewriting the live puts that share those ranges
+        runs = np.floor(elapsed / options["range_compaction_interval_s"]) - np.floor(
+            (elapsed - step_seconds) / options["range_compaction_interval_s"]
+        )
+        garbage = (dead + tombs).sum(axis=1)
+        budget = np.where(
+            is_range & (garbage >= options["range_compaction_min_entries"]),
+            runs * options["range_compaction_max_entries"],
+            0.0,
+        )
+        dropped = np.minimum(budget, garbage)
+        r = np.divide(dropped, garbage, out=np.zeros(num_scenarios), where=garbage > 0)[:, None]
+        share = options["range_compaction_garbage_share"]
+        rewritten = np.minimum(dropped * (1 - share) / share, live.sum(axis=1)) * options["entry_bytes"]
+        state["compaction_read"] += (
+            dead * r * options["entry_bytes"] + tombs * r * options["tombstone_bytes"]
+        ).sum(axis=1) + rewritten
+        state["compaction_write"] += rewritten
+        dead *= 1 - r
+        tombs *= 1 - r
+
+        # Periodic full compaction: rewrite all live puts into the bottom level
+        interval = options["full_compaction_interval_s"]
+        due = is_full & (np.floor(elapsed / interval) > np.floor((elapsed - step_seconds) / interval))
+        total = _level_sizes(live, dead, tombs, options).sum(axis=1)
+        live_total = live.sum(axis=1)
+        state["compaction_read"] += np.where(due, total, 0.0)
+        state["compaction_write"] += np.where(due, live_total * options["entry_bytes"], 0.0)
+        for component in (live, dead, tombs):
+            component[due] = 0.0
+        live[due, -1] = live_total[due]
+        state["l0_files"][due] = 0
+
+        # RocksDB estimate-num-keys: entries - 2 * deletions over all files
+        estimated = np.clip(live.sum(axis=1) + dead.sum(axis=1) - tombs.sum(axis=1), 0.0, None)
+        history["time_s"].append(elapsed)
+        history["created_keys"].append(created * step)
+        history["estimated_keys"].append(estimated)
+        history["flush_bytes"].append(flush_bytes)
+        history["user_bytes"].append(user_bytes)
+        history["compaction_read"].append(state["compaction_read"].copy())
+        history["compaction_write"].append(state["compaction_write"].copy())
+        history["tombstones"].append(tombs.sum(axis=1))
+        history["sst_bytes"].append(_level_sizes(live, dead, tombs, options).sum(axis=1))
+
+        if estimated.min() >= max_key_count:
+            break
+
+    result = {name: np.asarray(values) for name, values in history.items()}
+    for name in ("time_s", "created_keys", "flush_bytes", "user_bytes"):
+        result[name] = np.repeat(result[name][:, None], num_scenarios, axis=1)
+    result["write_amplification"] = (result["flush_bytes"] + result["compaction_write"]) / result["user_bytes"]
+    result["policy"] = [POLICIES[i] for i in policy_idx]
+    result["overlap_factor"] = overlap
+    return result
+
+
+def values_at_key_counts(result, metric, key_counts):
+    """Interpolate a simulated metric at the given estimated key counts, shape (len(key_counts), scenarios)"""
+    estimated = result["estimated_keys"]
+    values = result[metric]
+    out = np.full((len(key_counts), estimated.shape[1]), np.nan)
+    for s in range(estimated.shape[1]):
+        # The estimate can dip after tombstones are dropped; interpolate on its running max
+        axis = np.maximum.accumulate(estimated[:, s])
+        inside = np.asarray(key_counts) <= axis[-1]
+        out[inside, s] = np.interp(np.asarray(key_counts)[inside], axis, values[:, s])
+    return out
+
+
+def _cumulative_rate(series):
+    """Integrate a per-second rate series over time"""
+    dt = series["Time"].diff().dt.total_seconds().fillna(0).to_numpy()
+    return np.cumsum(series["value"].to_numpy() * dt)
+
+
+def measured_compaction_ratio(folder_path):
+    """Return (key_counts, cumulative compaction write / flush write) for one experiment"""
+    key_count = load_metric_series(folder_path, KEY_COUNT_METRIC)
+    compaction = load_metric_series(folder_path, "Compaction write bytes")
+    flush = load_metric_series(folder_path, "Flush write bytes")
+    if key_count is None or compaction is None or flush is None:
+        return None, None
+
+    compaction = compaction.assign(cumulative=_cumulative_rate(compaction))
+    flush = flush.assign(cumulative=_cumulative_rate(flush))
+    merged = project_onto_key_count(compaction, key_count).merge(
+        flush[["Time", "cumulative"]], on="Time", suffixes=("_compaction", "_flush")
+    )
+    merged = merged[(merged["cumulative_flush"] > 0) & (merged["key_count"] > 0)]
+    ratio = merged["cumulative_compaction"] / merged["cumulative_flush"]
+    return merged["key_count"].to_numpy(), ratio.to_numpy()
+
+
+def _policy_of(folder_name):
+    config = parse_experiment_config(folder_name)
+    return "range" if config["range_compaction"] else "periodic_full" if config["periodic_full_compaction"] else "none"
+
+
+def _fit_errors(weights, options, policy, key_counts, measured, overlap_factors):
+    """RMSE in log1p space between simulated and measured compaction/flush ratio, per overlap factor"""
+    result = simulate(weights, key_counts.max(), [policy], options, overlap_factors, max_steps=2000)
+    simulated = values_at_key_counts(result, "compaction_write", key_counts) / values_at_key_counts(
+        result, "flush_bytes", key_counts
+    )
+    return np.sqrt(np.nanmean((np.log1p(simulated) - np.log1p(measured)[:, None]) ** 2, axis=0))
+
+
+def _grid_minimum(grid, errors):
+    """Index of the best grid point and whether the fit is unidentified
+
+    A minimum on the upper end of the grid, or one the upper end matches (the
+    overlap saturates once every compaction rewrites the whole next level), only
+    bounds the parameter from below.
+    """
+    best = int(np.nanargmin(errors))
+    at_edge = best == len(grid) - 1 or errors[-1] <= errors[best] * (1 + EDGE_TOLERANCE)
+    return best, at_edge
+
+
+def _refine(grid, best, points=REFINE_POINTS):
+    """Finer grid spanning the neighbours of grid[best]"""
+    return np.linspace(grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)], points)
+
+
+def calibrate(weights=DEFAULT_WEIGHTS, options=None, overlap_grid=None, share_grid=None):
+    """Fit the model against the measured compaction/flush write ratio
+
+    The overlap factor is fitted per experiment without range compaction, on a
+    coarse grid refined around its minimum; fits on the grid's upper edge are
+    reported but left out of the median. With that overlap, the range-compaction
+    experiment then fits the garbage share of the ranges it rewrites.
+    """
+    options = {**DEFAULT_LSM_OPTIONS, **(options or {})}
+    if overlap_grid is None:
+        overlap_grid = OVERLAP_GRID
+    if share_grid is None:
+        share_grid = GARBAGE_SHARE_GRID
+
+    measurements = {}
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        key_counts, measured = measured_compaction_ratio(folder_name)
+        if key_counts is not None and len(key_counts) > 0:
+            measurements[experiment_name] = (_policy_of(folder_name), key_counts, measured)
+
+    fits = {}
+    for experiment_name, (policy, key_counts, measured) in measurements.items():
+        if policy == "range":
+            continue
+        errors = _fit_errors(weights, options, policy, key_counts, measured, overlap_grid)
+        best, at_edge = _grid_minimum(overlap_grid, errors)
+        grid = overlap_grid
+        if not at_edge:
+            grid = _refine(overlap_grid, best)
+            errors = _fit_errors(weights, options, policy, key_counts, measured, grid)
+            best = int(np.nanargmin(errors))
+        fits[experiment_name] = {
+            "policy": policy, "parameter": "overlap_factor", "value": grid[best],
+            "rmse_log": errors[best], "at_edge": at_edge,
+        }
+
+    identified = [fit["value"] for fit in fits.values() if not fit["at_edge"]]
+    if identified:
+        options["overlap_factor"] = float(np.median(identified))
+
+    for experiment_name, (policy, key_counts, measured) in measurements.items():
+        if policy != "range":
+            continue
+        errors = np.array([
+            _fit_errors(weights, {**options, "range_compaction_garbage_share": share}, policy, key_counts, measured,
+                        [options["overlap_factor"]])[0]
+            for share in share_grid
+        ])
+        best = int(np.nanargmin(errors))
+        # The share is bounded on both sides, so a minimum on either end is unidentified
+        at_edge = best in (0, len(share_grid) - 1)
+        fits[experiment_name] = {
+            "policy": policy, "parameter": "range_compaction_garbage_share", "value": share_grid[best],
+            "rmse_log": errors[best], "at_edge": at_edge,
+        }
+        if not at_edge:
+            options["range_compaction_garbage_share"] = float(share_grid[best])
+
+    return options, fits
+
+
+def print_projection(result, key_counts):
+    """Print compaction read/write and write amplification per policy at each key count"""
+    reads = values_at_key_counts(result, "compaction_read", key_counts)
+    writes = values_at_key_counts(result, "compaction_write", key_counts)
+    amplification = values_at_key_counts(result, "write_amplification", key_counts)
+
+    print("Simulated Compaction Cost by Order of Magnitude:")
+    print("=" * 70)
+    for k, key_count in enumerate(key_counts):
+        print(f"\n{create_magnitude_label(key_count)} Keys:")
+        print("-" * 20)
+        for s, policy in enumerate(result["policy"]):
+            print(
+                f"  {POLICY_LABELS[policy]:<52} read {reads[k, s] / 1024**3:9.2f} GB  "
+                f"write {writes[k, s] / 1024**3:9.2f} GB  WA {amplification[k, s]:6.2f}"
+            )
+
+
+def plot_projection(result, filename="compaction_simulation.png"):
+    """Plot write amplification and compaction write bytes over estimated key count"""
+    _, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    for s, policy in enumerate(result["policy"]):
+        keys = result["estimated_keys"][:, s]
+        ax1.plot(keys, result["write_amplification"][:, s], label=POLICY_LABELS[policy])
+        ax2.plot(keys, result["compaction_write"][:, s] / 1024**3, label=POLICY_LABELS[policy])
+
+    for ax, ylabel in ((ax1, "Write Amplification"), (ax2, "Cumulative Compaction Write (GB)")):
+        ax.set_xscale("log")
+        ax.set_xlabel("Estimated Key Count")
+        ax.set_ylabel(ylabel)
+        ax.grid(True, which="both", alpha=0.3)
+        ax.legend()
+    ax1.set_title("Simulated Write Amplification")
+    ax2.set_title("Simulated Compaction Write Bytes")
+    save_chart(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Project compaction cost with a leveled-compaction simulator")
+    parser.add_argument("--weights", default="20:8:1", help="create:delete:list workload weights")
+    parser.add_argument("--max-keys", type=float, default=1e9, help="Simulate up to this estimated key count")
+    parser.add_argument("--calibrate", action="store_true", help="Fit the overlap factor to the measured CSVs first")
+    args = parser.parse_args()
+
+    weights = tuple(int(w) for w in args.weights.split(":"))
+    options = None
+    if args.calibrate:
+        options, fits = calibrate(weights)
+        print("Calibration against measured compaction/flush write ratio:")
+        for experiment_name, fit in fits.items():
+            note = "  (at grid edge, not used)" if fit["at_edge"] else ""
+            print(f"  {experiment_name:<52} {fit['parameter']} {fit['value']:.3f}  rmse(log) {fit['rmse_log']:.3f}{note}")
+        print(f"Using overlap factor {options['overlap_factor']:.2f}, "
+              f"range compaction garbage share {options['range_compaction_garbage_share']:.3f}\n")
+
+    result = simulate(weights, args.max_keys, options=options)
+    key_counts = [k for k in PROJECTION_MAGNITUDES if k <= args.max_keys]
+    print_projection(result, key_counts)
+    plot_projection(result)
+
+
+if __name__ == "__main__":
+    main()
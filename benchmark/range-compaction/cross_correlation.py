@@ -0,0 +1,185 @@
+"""
+Lagged cross-correlation and Granger-style lead/lag scores between aligned metrics.
+For every ordered pair of metrics in an experiment, computes the FFT cross-correlation
+over a lag window and an F test of whether the leader's history improves an
+autoregressive model of the follower, all pairs in one batch.
+"""
+
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import EXPERIMENT_FOLDERS, align_experiment_series
+
+MAX_LAG = 60  # samples (30 minutes at the 30s grid)
+GRANGER_ORDER = 10  # lagged samples in the autoregressive models
+DRIVER_KEYWORDS = ["Compaction", "DeletedTable", "Flush", "SST"]
+RESPONSE_KEYWORDS = ["Seek", "DB get"]
+
+
+def prepare_series(matrix, difference=True):
+    """Gap-fill, optionally difference, and standardize every row"""
+    filled = pd.DataFrame(matrix.T).ffill().bfill().fillna(0.0).to_numpy().T
+    if difference:
+        filled = np.diff(filled, axis=1)
+    centered = filled - filled.mean(axis=1, keepdims=True)
+    std = centered.std(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(std > 0, centered / std, np.nan)
+
+
+def lagged_cross_correlation(z, max_lag=MAX_LAG):
+    """Cross-correlation of every ordered pair at lags -max_lag..max_lag
+
+    Returns (lags, corr) where corr[i, j, k] correlates z[i, t] with z[j, t + lags[k]],
+    i.e. a peak at a positive lag means series i leads series j.
+    """
+    n = z.shape[1]
+    zz = np.nan_to_num(z)
+    spectrum = np.fft.rfft(zz, n=2 * n, axis=1)
+    raw = np.fft.irfft(np.conj(spectrum)[:, None, :] * spectrum[None, :, :], n=2 * n, axis=2)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    # Negative lags wrap around to the end of the circular correlation
+    corr = raw[:, :, lags % (2 * n)] / (n - np.abs(lags))
+    invalid = np.isnan(z).any(axis=1)
+    corr[invalid] = np.nan
+    corr[:, invalid] = np.nan
+    return lags, corr
+
+
+def _lag_tensor(z, order):
+    """Lagged copies of every series: shape (series, samples, order) aligned to z[:, order:]"""
+    n = z.shape[1]
+    return np.stack([z[:, order - k:n - k] for k in range(1, order + 1)], axis=2)
+
+
+def granger_scores(z, order=GRANGER_ORDER):
+    """F statistics and p-values for 'series i helps predict series j' over all ordered pairs"""
+    z = np.nan_to_num(z)
+    num_series, n = z.shape
+    lags = _lag_tensor(z, order)  # (S, N, p)
+    target = z[:, order:]  # (S, N)
+    samples = target.shape[1]
+    ones = np.ones(samples)
+
+    # Restricted model per follower j: [1, own lags]
+    restricted = np.concatenate([np.broadcast_to(ones, (num_series, samples))[..., None], lags], axis=2)
+    ata_r = np.einsum("snp,snq->spq", restricted, restricted) + np.eye(order + 1) * 1e-9
+    aty_r = np.einsum("snp,sn->sp", restricted, target)
+    beta_r = np.linalg.solve(ata_r, aty_r[..., None])[..., 0]
+    rss_r = (target**2).sum(1) - (beta_r * aty_r).sum(1)
+
+    # Unrestricted model per (leader i, follower j): [1, own lags of j, lags of i],
+    # assembled blockwise from the shared products
+    yy = ata_r  # (j, p+1, p+1)
+    xx = np.einsum("inp,inq->ipq", lags, lags)  # (i, p, p)
+    yx = np.einsum("jnp,inq->ijpq", restricted, lags)  # (i, j, p+1, p)
+    size = 2 * order + 1
+    ata = np.empty((num_series, num_series, size, size))
+    ata[:, :, : order + 1, : order + 1] = yy[None]
+    ata[:, :, order + 1 :, order + 1 :] = xx[:, None]
+    ata[:, :, : order + 1, order + 1 :] = yx
+    ata[:, :, order + 1 :, : order + 1] = np.swapaxes(yx, 2, 3)
+    aty = np.empty((num_series, num_series, size))
+    aty[:, :, : order + 1] = aty_r[None]
+    aty[:, :, order + 1 :] = np.einsum("inp,jn->ijp", lags, target)
+    beta = np.linalg.solve(ata + np.eye(size) * 1e-9, aty[..., None])[..., 0]
+    rss_u = (target**2).sum(1)[None, :] - (beta * aty).sum(2)
+
+    dof = samples - size
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f_stat = ((rss_r[None, :] - rss_u) / order) / (rss_u / dof)
+    f_stat[np.diag_indices(num_series)] = np.nan
+    return f_stat, _f_survival(f_stat, order, dof)
+
+
+def _f_survival(f_stat, d1, d2):
+    """Upper-tail F probability via the Wilson-Hilferty normal approximation"""
+    a = 2 / (9 * d1)
+    b = 2 / (9 * d2)
+    with np.errstate(invalid="ignore"):
+        cube = np.cbrt(np.clip(f_stat, 0, None))
+        z = ((1 - b) * cube - (1 - a)) / np.sqrt(b * cube**2 + a)
+    erfc = np.frompyfunc(math.erfc, 1, 1)
+    return np.where(np.isnan(z), np.nan, erfc(np.nan_to_num(z) / math.sqrt(2)).astype(float) / 2)
+
+
+def lead_lag_report(experiment_name, names, z, max_lag=MAX_LAG, order=GRANGER_ORDER, step_seconds=30):
+    """One row per ordered pair: best lag, peak correlation and Granger score"""
+    lags, corr = lagged_cross_correlation(z, max_lag)
+    f_stat, p_value = granger_scores(z, order)
+
+    # Keep only lags where the leader comes first (lag >= 0); the reverse direction is (j, i)
+    forward = corr[:, :, lags >= 0]
+    forward_lags = lags[lags >= 0]
+    filled = np.nan_to_num(np.abs(forward), nan=-1.0)
+    best = np.argmax(filled, axis=2)
+    peak = np.take_along_axis(forward, best[..., None], axis=2)[..., 0]
+
+    leader, follower = np.nonzero(~np.eye(len(names), dtype=bool))
+    return pd.DataFrame(
+        {
+            "experiment": experiment_name,
+            "leader": [names[i] for i in leader],
+            "follower": [names[j] for j in follower],
+            "lead_minutes": forward_lags[best[leader, follower]] * step_seconds / 60,
+            "correlation": peak[leader, follower],
+            "zero_lag_correlation": corr[leader, follower, max_lag],
+            "granger_f": f_stat[leader, follower],
+            "granger_p": p_value[leader, follower],
+        }
+    )
+
+
+def analyze_all(difference=True, max_lag=MAX_LAG, order=GRANGER_ORDER, step_seconds=30):
+    """Lead/lag report across all experiments"""
+    reports = []
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        _, names, matrix = align_experiment_series(folder_name, step_seconds=step_seconds)
+        if len(names) < 2:
+            continue
+        z = prepare_series(matrix, difference)
+        reports.append(lead_lag_report(experiment_name, names, z, max_lag, order, step_seconds))
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank lead/lag relations between aligned metrics")
+    parser.add_argument("--max-lag", type=int, default=MAX_LAG, help="Max lag in samples")
+    parser.add_argument("--order", type=int, default=GRANGER_ORDER, help="Granger autoregressive order")
+    parser.add_argument("--levels", action="store_true", help="Correlate levels instead of first differences")
+    parser.add_argument("--all-pairs", action="store_true", help="Rank every pair, not only compaction -> latency")
+    parser.add_argument("--top", type=int, default=15, help="Rows to print per experiment")
+    parser.add_argument("--out", default=None, help="Write the full pair table to this CSV file")
+    args = parser.parse_args()
+
+    report = analyze_all(not args.levels, args.max_lag, args.order)
+    if report.empty:
+        print("Not enough aligned metrics")
+        return
+
+    ranked = report.dropna(subset=["correlation"])
+    if not args.all_pairs:
+        drivers = ranked["leader"].str.contains("|".join(DRIVER_KEYWORDS))
+        responses = ranked["follower"].str.contains("|".join(RESPONSE_KEYWORDS))
+        ranked = ranked[drivers & responses]
+    ranked = ranked.assign(strength=ranked["correlation"].abs()).sort_values("strength", ascending=False)
+
+    for experiment_name, df in ranked.groupby("experiment", sort=False):
+        print(f"\n{experiment_name}")
+        print("=" * 70)
+        for _, row in df.head(args.top).iterrows():
+            print(
+                f"  {row['leader']:<38} -> {row['follower']:<26} lead {row['lead_minutes']:5.1f} min  "
+                f"r={row['correlation']:+.2f}  F={row['granger_f']:7.2f}  p={row['granger_p']:.1e}"
+            )
+
+    if args.out:
+        report.to_csv(args.out, index=False)
+        print(f"\nPair table saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
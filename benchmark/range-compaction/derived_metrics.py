@@ -0,0 +1,240 @@
+"""
+Derived metrics computed from the exported Grafana series.
+Each derived metric is a small expression over aligned series, e.g.
+    integral(m("Flush write bytes") + m("Compaction write bytes")) / integral(m("Bytes write per second"))
+Expressions are evaluated lazily on first request and cached per experiment, and are
+served by benchmark_utils.load_metric_series exactly like an exported CSV metric.
+"""
+
+import argparse
+import ast
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    align_experiment_series,
+    get_metric_files,
+    load_metric_series,
+    project_onto_key_count,
+)
+from profiling import span
+
+DERIVED_METRICS = {
+    # Cumulative bytes written by flushes and compactions per byte written by the OM
+    "Write amplification": (
+        'integral(m("Flush write bytes") + m("Compaction write bytes")) / integral(m("Bytes write per second"))'
+    ),
+    "Compaction write amplification": 'integral(m("Compaction write bytes")) / integral(m("Flush write bytes"))',
+    "Read amplification (next per seek)": 'm("Number of next per second") / m("Number of seeks per second")',
+    "Seeks per key read": 'm("Number of seeks per second") / m("Number of keys read per second")',
+    "Tombstone ratio": 'm("DeletedTable Estimated number of keys") / m("KeyTable Estimated number of keys")',
+    # Key counts are gauges, so a drop is real rather than a counter reset
+    "KeyTable growth per second": 'deriv(m("KeyTable Estimated number of keys"))',
+}
+
+# Inputs to the per-decade write amplification report
+WRITE_AMPLIFICATION_INPUTS = ["Flush write bytes", "Compaction write bytes", "Bytes write per second"]
+
+
+def referenced_metrics(expression):
+    """Return the metric names an expression reads through m("...")"""
+    names = []
+    for node in ast.walk(ast.parse(expression, mode="eval")):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "m":
+            names.append(node.args[0].value)
+    return names
+
+
+def exported_inputs(metric_name, resolving=()):
+    """Exported metric names a derived metric reads, following derived metrics it builds on
+
+    A cycle yields the derived name itself, which no export provides.
+    """
+    names = []
+    for name in referenced_metrics(DERIVED_METRICS[metric_name]):
+        if name in DERIVED_METRICS and name not in resolving:
+            names.extend(exported_inputs(name, resolving + (metric_name,)))
+        else:
+            names.append(name)
+    return names
+
+
+def _delta(x):
+    """Per-sample increase of a counter; a decrease is a reset, so the new value is the increase"""
+    d = np.diff(x, prepend=np.nan)
+    return np.where(d < 0, x, d)
+
+
+def _functions(dt):
+    """Operators available inside expressions, bound to the sample spacing in seconds"""
+    return {
+        "delta": _delta,
+        "rate": lambda x: _delta(x) / dt,
+        "deriv": lambda x: np.diff(x, prepend=np.nan) / dt,
+        "total": lambda x: np.cumsum(np.nan_to_num(_delta(x))),
+        "integral": lambda x: np.cumsum(np.nan_to_num(x * dt)),
+        "log10": lambda x: np.log10(np.where(x > 0, x, np.nan)),
+        "max": np.fmax,
+        "min": np.fmin,
+    }
+
+
+_BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+
+
+def evaluate_expression(expression, times, series):
+    """Evaluate an expression over arrays aligned on `times`; series maps metric name -> array"""
+    seconds = np.asarray(times, dtype="datetime64[ns]").view(np.int64) / 1e9
+    functions = _functions(np.diff(seconds, prepend=np.nan))
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            return _BINARY_OPERATORS[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -visit(node.operand)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id == "m":
+                return series[node.args[0].value]
+            if node.func.id in functions:
+                return functions[node.func.id](*[visit(arg) for arg in node.args])
+        raise ValueError(f"Unsupported expression element: {ast.dump(node)}")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = visit(ast.parse(expression, mode="eval"))
+    result = np.broadcast_to(result, len(seconds)).astype(float)
+    return np.where(np.isfinite(result), result, np.nan)
+
+
+def load_derived_series(folder_path, metric_name, step_seconds=30):
+    """Evaluate a derived metric for one experiment as a Time/value DataFrame, or None"""
+    expression = DERIVED_METRICS.get(metric_name)
+    if expression is None:
+        return None
+
+    # Inputs that are derived themselves are evaluated through load_metric_series like exported ones
+    inputs = sorted(set(exported_inputs(metric_name)))
+    files = get_metric_files(folder_path)
+    if not all(name in files for name in inputs):
+        return None
+    # The exported input mtimes are part of the cache key, so a re-exported CSV is derived again
+    mtimes = tuple(os.path.getmtime(files[name]) for name in inputs)
+    series = _derive_series(folder_path, metric_name, step_seconds, mtimes)
+    return None if series is None else series.copy()
+
+
+@functools.lru_cache(maxsize=256)
+def _derive_series(folder_path, metric_name, step_seconds, mtimes):
+    expression = DERIVED_METRICS[metric_name]
+    inputs = referenced_metrics(expression)
+    times, names, matrix = align_experiment_series(folder_path, inputs, step_seconds)
+    if set(names) != set(inputs):
+        return None
+    with span("derive", metric_name, rows=len(times)):
+        values = evaluate_expression(expression, times, dict(zip(names, matrix)))
+    series = pd.DataFrame({"Time": times, "value": values}).dropna(subset=["value"])
+    series = series.reset_index(drop=True)
+    series.attrs["kind"] = "count"
+    return series
+
+
+def derived_metric_frame(folder_path, metric_name):
+    """Derived metric in the shape of a Grafana export (Time + one value column), or None"""
+    series = load_derived_series(folder_path, metric_name)
+    if series is None:
+        return None
+    return pd.DataFrame({"Time": series["Time"], metric_name: series["value"]})
+
+
+def available_derived_metrics(metric_names):
+    """Derived metrics whose inputs are all among the given exported metric names"""
+    available = set(metric_names)
+    derived = []
+    # Derived metrics may build on each other, so resolve until nothing new appears
+    while True:
+        new = [
+            name for name, expression in DERIVED_METRICS.items()
+            if name not in available and set(referenced_metrics(expression)) <= available
+        ]
+        if not new:
+            return derived
+        derived.extend(new)
+        available.update(new)
+
+
+def write_amplification_by_decade(folder_path, decades=(10**4, 10**5, 10**6, 10**7, 10**8)):
+    """Write amplification within each key-count decade: flush + compaction bytes per user byte"""
+    times, names, matrix = align_experiment_series(folder_path, WRITE_AMPLIFICATION_INPUTS + [KEY_COUNT_METRIC])
+    if len(names) != len(WRITE_AMPLIFICATION_INPUTS) + 1:
+        return pd.DataFrame()
+
+    series = dict(zip(names, matrix))
+    written = evaluate_expression(
+        'integral(m("Flush write bytes") + m("Compaction write bytes"))', times, series
+    )
+    user = evaluate_expression('integral(m("Bytes write per second"))', times, series)
+    frame = pd.DataFrame({"Time": times, "value": written, "user": user}).dropna()
+    key_count = load_metric_series(folder_path, KEY_COUNT_METRIC)
+    frame = project_onto_key_count(frame, key_count)
+
+    rows = []
+    for low, high in zip(decades, decades[1:]):
+        inside = frame[(frame["key_count"] >= low) & (frame["key_count"] < high)]
+        if len(inside) < 2:
+            continue
+        user_bytes = inside["user"].iloc[-1] - inside["user"].iloc[0]
+        written_bytes = inside["value"].iloc[-1] - inside["value"].iloc[0]
+        rows.append(
+            {
+                "decade": f"10^{len(str(low)) - 1}-10^{len(str(high)) - 1}",
+                "user_mb": user_bytes / 1024**2,
+                "written_mb": written_bytes / 1024**2,
+                "write_amplification": written_bytes / user_bytes if user_bytes > 0 else np.nan,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate derived metrics and per-decade write amplification")
+    parser.add_argument("--list", action="store_true", help="List derived metric definitions")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, expression in DERIVED_METRICS.items():
+            print(f"{name}:\n    {expression}")
+        return
+
+    print("Write Amplification by Key-Count Decade:")
+    print("=" * 70)
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        print(f"\n{experiment_name}")
+        print("-" * 20)
+        table = write_amplification_by_decade(folder_name)
+        print(table.to_string(index=False, float_format="%.2f") if not table.empty else "  (missing inputs)")
+
+    print("\nDerived metrics at end of run:")
+    print("=" * 70)
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        print(f"\n{experiment_name}")
+        for name in DERIVED_METRICS:
+            series = load_derived_series(folder_name, name)
+            if series is not None and not series.empty:
+                print(f"  {name:<40} {series['value'].iloc[-1]:12.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Collapsed-stack profiles (async-profiler / perf `folded` format) and differential
+flame graphs between experiments.
+Profiles are streamed block by block into a trie with interned frame ids kept in
+flat arrays, so memory follows the number of distinct stacks, not the dump size.
+Two tries sharing one frame table are compared node by node: the SVG takes its
+widths from the second profile and colors each frame by the change in its share
+of samples (red grew, blue shrank), and the top-N table ranks frames by delta.
+"""
+
+import argparse
+import glob
+import gzip
+import html
+import os
+import zlib
+from array import array
+from collections import Counter
+
+import pandas as pd
+
+BLOCK_SIZE = 8 * 1024**2
+PROFILE_PATTERNS = ["*.collapsed", "*.collapsed.gz", "*.folded", "*.folded.gz"]
+FRAME_HEIGHT = 16
+SVG_WIDTH = 1200
+MIN_WIDTH_PX = 0.1
+FONT_SIZE = 11
+CHAR_WIDTH = 0.59 * FONT_SIZE
+
+
+class FrameTable:
+    """Interns frame strings to dense integer ids"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        frame_id = self.ids.get(name)
+        if frame_id is None:
+            frame_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return frame_id
+
+
+class StackTrie:
+    """Call-stack trie: node 0 is the root, nodes live in parallel arrays"""
+
+    def __init__(self, frames=None):
+        self.frames = frames or FrameTable()
+        self.children = {}  # (parent node, frame id) -> node
+        self.parent = array("i", [-1])
+        self.frame = array("i", [-1])
+        self.total = array("q", [0])
+        self.self_count = array("q", [0])
+        # Per frame: samples with the frame anywhere on the stack, and at the leaf
+        self.inclusive = Counter()
+        self.leaf = Counter()
+
+    def add(self, stack, count):
+        """Add `count` samples of a root-first list of frame names"""
+        node = 0
+        self.total[0] += count
+        seen = set()
+        for name in stack:
+            frame_id = self.frames.intern(name)
+            key = (node, frame_id)
+            child = self.children.get(key)
+            if child is None:
+                child = self.children[key] = len(self.frame)
+                self.parent.append(node)
+                self.frame.append(frame_id)
+                self.total.append(0)
+                self.self_count.append(0)
+            node = child
+            self.total[node] += count
+            seen.add(frame_id)
+        self.self_count[node] += count
+        for frame_id in seen:
+            self.inclusive[frame_id] += count
+        if stack:
+            self.leaf[self.frame[node]] += count
+
+    def child_map(self):
+        """{node: [child nodes]} built once for traversals"""
+        kids = {}
+        for (parent, _), child in self.children.items():
+            kids.setdefault(parent, []).append(child)
+        return kids
+
+    def __len__(self):
+        return len(self.frame)
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def read_collapsed(paths, trie=None, frames=None):
+    """Stream folded-stack files ("frame;frame;frame count" per line) into a trie"""
+    trie = trie or StackTrie(frames)
+    for path in paths:
+        leftover = b""
+        with _open(path) as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                data = leftover + block
+                end = len(data) if not block else data.rfind(b"\n") + 1
+                for line in data[:end].decode("utf-8", "replace").splitlines():
+                    stack, _, count = line.rstrip().rpartition(" ")
+                    if stack and count.isdigit():
+                        trie.add(stack.split(";"), int(count))
+                leftover = data[end:]
+                if not block:
+                    break
+    return trie
+
+
+def profile_paths(source):
+    """A profile file, or every collapsed/folded file inside an experiment folder"""
+    if os.path.isdir(source):
+        return sorted(p for pattern in PROFILE_PATTERNS for p in glob.glob(os.path.join(source, pattern)))
+    return [source]
+
+
+def frame_deltas(base, target, top=30):
+    """Frames ranked by change in inclusive share of samples between two tries sharing a frame table"""
+    names = base.frames.names
+    base_total, target_total = max(base.total[0], 1), max(target.total[0], 1)
+    frame_ids = set(base.inclusive) | set(target.inclusive)
+    table = pd.DataFrame(
+        {
+            "frame": [names[f] for f in frame_ids],
+            "base_inclusive_pct": [100 * base.inclusive[f] / base_total for f in frame_ids],
+            "target_inclusive_pct": [100 * target.inclusive[f] / target_total for f in frame_ids],
+            "base_self_pct": [100 * base.leaf[f] / base_total for f in frame_ids],
+            "target_self_pct": [100 * target.leaf[f] / target_total for f in frame_ids],
+        }
+    )
+    table["inclusive_delta_pct"] = table["target_inclusive_pct"] - table["base_inclusive_pct"]
+    table["self_delta_pct"] = table["target_self_pct"] - table["base_self_pct"]
+    order = table["inclusive_delta_pct"].abs().sort_values(ascending=False, kind="stable").index
+    return table.loc[order].head(top).reset_index(drop=True)
+
+
+def _color(delta, scale):
+    """Red for growth, blue for shrinkage, pale when unchanged (delta in share units)"""
+    if scale <= 0:
+        return "rgb(250,250,240)"
+    strength = min(abs(delta) / scale, 1.0)
+    fade = int(250 - 190 * strength)
+    return f"rgb(250,{fade},{fade})" if delta > 0 else f"rgb({fade},{fade},250)"
+
+
+def _layout(target, base):
+    """(depth, x fraction, width fraction, target node, share delta) per drawn frame, root excluded
+
+    Widths come from the target; the base node is found by the same frame path.
+    """
+    target_total, base_total = max(target.total[0], 1), max(base.total[0], 1) if base is not None else 1
+    target_kids = target.child_map()
+    names = target.frames.names
+    boxes = []
+    # (target node, base node or -1, depth, x)
+    stack = [(0, 0 if base is not None else -1, -1, 0.0)]
+    while stack:
+        node, base_node, depth, x = stack.pop()
+        if node:
+            share = target.total[node] / target_total
+            base_share = base.total[base_node] / base_total if base_node >= 0 else 0.0
+            boxes.append((depth, x, share, node, share - base_share if base is not None else 0.0))
+        offset = x
+        for child in sorted(target_kids.get(node, []), key=lambda c: names[target.frame[c]]):
+            base_child = base.children.get((base_node, target.frame[child]), -1) if base_node >= 0 else -1
+            stack.append((child, base_child, depth + 1, offset))
+            offset += target.total[child] / target_total
+    return boxes
+
+
+def render_svg(target, base=None, title="Flame graph", width=SVG_WIDTH):
+    """Flame graph SVG of `target`; with `base`, colored by the change in share of each frame"""
+    boxes = [b for b in _layout(target, base) if b[2] * width >= MIN_WIDTH_PX]
+    depth = max((b[0] for b in boxes), default=0) + 1
+    height = (depth + 3) * FRAME_HEIGHT
+    scale = max((abs(b[4]) for b in boxes), default=0.0)
+    names = target.frames.names
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="Verdana, sans-serif" font-size="{FONT_SIZE}">',
+        '<rect width="100%" height="100%" fill="#f8f8f8"/>',
+        f'<text x="{width / 2}" y="{FRAME_HEIGHT}" text-anchor="middle" font-size="{FONT_SIZE + 4}">{html.escape(title)}</text>',
+    ]
+    for level, x, share, node, delta in boxes:
+        name = names[target.frame[node]]
+        left, w = x * width, share * width
+        y = height - (level + 2) * FRAME_HEIGHT
+        # Stable per-name warm colors, as flamegraph.pl does
+        warm = zlib.crc32(name.encode())
+        fill = _color(delta, scale) if base is not None else f"rgb({205 + warm % 50},{90 + (warm >> 8) % 120},50)"
+        tooltip = f"{name} ({target.total[node]:,} samples, {100 * share:.2f}%"
+        tooltip += f", {100 * delta:+.2f} pp vs base)" if base is not None else ")"
+        label = name if len(name) * CHAR_WIDTH < w - 4 else name[:max(int((w - 4) / CHAR_WIDTH) - 2, 0)] + ".."
+        parts.append(
+            f'<g><title>{html.escape(tooltip)}</title>'
+            f'<rect x="{left:.2f}" y="{y}" width="{w:.2f}" height="{FRAME_HEIGHT - 1}" fill="{fill}" rx="2"/>'
+            + (f'<text x="{left + 3:.2f}" y="{y + FRAME_HEIGHT - 4}">{html.escape(label)}</text>' if w > 3 * CHAR_WIDTH else "")
+            + "</g>"
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flame graphs and differential flame graphs from collapsed stacks")
+    parser.add_argument("base", help="Collapsed-stack file or experiment folder (e.g. range compaction disabled)")
+    parser.add_argument("target", nargs="?", default=None, help="Second profile to compare against the base")
+    parser.add_argument("--top", type=int, default=30, help="Frames in the delta table")
+    parser.add_argument("--out", default=None, help="Output SVG (default: flamegraph.svg or flamegraph_diff.svg)")
+    parser.add_argument("--csv", default=None, help="Write the frame delta table to this CSV file")
+    args = parser.parse_args()
+
+    frames = FrameTable()
+    base = read_collapsed(profile_paths(args.base), frames=frames)
+    print(f"{args.base}: {base.total[0]:,} samples, {len(base):,} trie nodes, {len(frames.names):,} frames")
+    if args.target is None:
+        out = args.out or "flamegraph.svg"
+        with open(out, "w") as f:
+            f.write(render_svg(base, title=os.path.basename(args.base.rstrip("/"))))
+        print(f"Flame graph saved as '{out}'")
+        return
+
+    target = read_collapsed(profile_paths(args.target), frames=frames)
+    print(f"{args.target}: {target.total[0]:,} samples, {len(target):,} trie nodes, {len(frames.names):,} frames")
+
+    deltas = frame_deltas(base, target, args.top)
+    print("\n" + "=" * 70)
+    print(f"TOP {args.top} FRAMES BY CHANGE IN INCLUSIVE SHARE (target - base, percentage points)")
+    print("=" * 70)
+    with pd.option_context("display.width", 200, "display.max_colwidth", 70):
+        print(deltas.to_string(index=False, float_format="%.2f"))
+    if args.csv:
+        deltas.to_csv(args.csv, index=False)
+        print(f"\nDelta table saved as '{args.csv}'")
+
+    out = args.out or "flamegraph_diff.svg"
+    title = f"{os.path.basename(args.target.rstrip('/'))} vs {os.path.basename(args.base.rstrip('/'))}"
+    with open(out, "w") as f:
+        f.write(render_svg(target, base, title))
+    print(f"Differential flame graph saved as '{out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+JVM GC log ingestion and latency-spike attribution.
+Streams unified JVM GC logs (-Xlog:gc*, G1, ZGC, Shenandoah) block by block into
+a columnar pause table, finds spikes in the OM seek/get latency series, and
+attributes every spike window to GC, compaction, both or neither by vectorized
+interval intersection against the merged pause and compaction intervals.
+"""
+
+import argparse
+import glob
+import gzip
+import os
+import re
+
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from benchmark_utils import BASE_PATH, EXPERIMENT_FOLDERS, load_metric_series, save_chart
+from rocksdb_log_parser import read_rocksdb_log
+
+BLOCK_SIZE = 8 * 1024**2
+DEFAULT_METRICS = ["Seek max latency", "DB get 99%-tile"]
+# Per-interval bytes; the exported compaction time is a running average and never drops to zero
+COMPACTION_METRICS = ["Compaction write bytes"]
+GC_LOG_PATTERN = "gc*.log*"
+
+# Spike: robust z-score against a centered rolling median/MAD
+SPIKE_WINDOW = 31  # samples
+SPIKE_Z = 4.0
+# RocksDB "max" statistics accumulate since DB open, so there a spike is a new maximum
+# at least this much above the previous one
+SPIKE_RISE = 0.05
+# A pause explains a spike when it covers at least this fraction of the spike latency
+GC_EXPLAINS_FRACTION = 0.5
+# Widens every spike window on both sides to absorb clock skew between hosts
+SLACK_SECONDS = 5.0
+
+# "[decorations] GC(12) Pause Young (Normal) (G1 Evacuation Pause) 512M->128M(1024M) 12.345ms"
+PAUSE_LINE = re.compile(
+    rb"^(?P<decorations>(?:\[[^\]\n]*\])+)\s*(?:GC\((?P<gc_id>\d+)\)\s*)?(?:[yYoO]:\s*)?"
+    rb"(?P<what>(?:Pause|Allocation Stall)\b[^\n]*?)\s+(?P<ms>\d+(?:\.\d+)?)ms\s*$",
+    re.MULTILINE,
+)
+ISO_TIME = re.compile(r"\[(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?)([+-]\d{4}|Z)?\]")
+UPTIME = re.compile(r"\[(\d+(?:\.\d+)?)(s|ms)\]")
+HEAP = re.compile(r"\s*(\d+)([KMG])->(\d+)([KMG])\((\d+)[KMG]\)")
+HEAP_UNITS = {"K": 1 / 1024, "M": 1.0, "G": 1024.0}
+
+PAUSE_KINDS = ["young", "mixed", "full", "remark", "cleanup", "zgc", "shenandoah", "stall", "other"]
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def iter_pause_lines(path, block_size=BLOCK_SIZE):
+    """Yield regex matches of pause lines, reading the log in blocks cut at line ends"""
+    leftover = b""
+    with _open(path) as f:
+        while True:
+            block = f.read(block_size)
+            data = leftover + block
+            if not block:
+                yield from PAUSE_LINE.finditer(data)
+                return
+            end = data.rfind(b"\n") + 1
+            yield from PAUSE_LINE.finditer(data, 0, end)
+            leftover = data[end:]
+
+
+def classify_pause(what):
+    text = what.lower()
+    if text.startswith("allocation stall"):
+        return "stall"
+    for kind in ("young", "mixed", "full", "remark", "cleanup"):
+        if kind in text:
+            return kind
+    if "mark start" in text or "mark end" in text or "relocate start" in text:
+        return "zgc"
+    if "init mark" in text or "final mark" in text or "update refs" in text:
+        return "shenandoah"
+    return "other"
+
+
+def parse_gc_log(paths, jvm_start=None, offset_hours=0.0):
+    """Columnar pause table of one or more (rotated) GC logs, sorted by start time
+
+    Lines carry the time the pause ended; logs decorated with uptime only are
+    anchored at `jvm_start`. `offset_hours` shifts GC times onto the export clock.
+    """
+    rows = {"gc_id": [], "end": [], "uptime_s": [], "duration_ms": [], "what": [], "heap_before_mb": [], "heap_after_mb": []}
+    for path in paths:
+        for match in iter_pause_lines(path):
+            decorations = match["decorations"].decode("utf-8", "replace")
+            what = match["what"].decode("utf-8", "replace")
+            iso, uptime = ISO_TIME.search(decorations), UPTIME.search(decorations)
+            end = pd.NaT
+            if iso:
+                end = pd.Timestamp(iso[1] + (iso[2] or ""))
+                # Absolute log times are compared in UTC, without a zone like the exports
+                end = end.tz_convert("UTC").tz_localize(None) if end.tzinfo else end
+            seconds = float(uptime[1]) / (1000 if uptime[2] == "ms" else 1) if uptime else np.nan
+            if pd.isna(end) and jvm_start is not None and uptime:
+                end = pd.Timestamp(jvm_start) + pd.Timedelta(seconds=seconds)
+            heap = HEAP.search(what)
+            rows["gc_id"].append(int(match["gc_id"]) if match["gc_id"] else -1)
+            rows["end"].append(end)
+            rows["uptime_s"].append(seconds)
+            rows["duration_ms"].append(float(match["ms"]))
+            rows["what"].append(HEAP.sub("", what).strip())
+            rows["heap_before_mb"].append(float(heap[1]) * HEAP_UNITS[heap[2]] if heap else np.nan)
+            rows["heap_after_mb"].append(float(heap[3]) * HEAP_UNITS[heap[4]] if heap else np.nan)
+
+    end = pd.to_datetime(pd.Series(rows["end"], dtype="datetime64[ns]")) + pd.Timedelta(hours=offset_hours)
+    duration = np.asarray(rows["duration_ms"], dtype=float)
+    table = pd.DataFrame(
+        {
+            "gc_id": np.asarray(rows["gc_id"], dtype=np.int64),
+            "start": end - pd.to_timedelta(duration, unit="ms"),
+            "end": end,
+            "duration_ms": duration,
+            "kind": pd.Categorical([classify_pause(w) for w in rows["what"]], categories=PAUSE_KINDS),
+            "cause": pd.Categorical(rows["what"]),
+            "uptime_s": np.asarray(rows["uptime_s"], dtype=float),
+            "heap_before_mb": np.asarray(rows["heap_before_mb"], dtype=float),
+            "heap_after_mb": np.asarray(rows["heap_after_mb"], dtype=float),
+        }
+    )
+    if table["end"].isna().any():
+        missing = int(table["end"].isna().sum())
+        print(f"Warning: {missing} pauses have no wall-clock time (pass --jvm-start for uptime-only logs)")
+        table = table.dropna(subset=["end"])
+    return table.sort_values("start", kind="stable").reset_index(drop=True)
+
+
+def summarize_pauses(table):
+    """Count, total, p99 and max pause per kind"""
+    grouped = table.groupby("kind", observed=True)["duration_ms"]
+    summary = grouped.agg(pauses="count", total_ms="sum", mean_ms="mean", max_ms="max")
+    summary["p99_ms"] = grouped.quantile(0.99)
+    return summary.reset_index()
+
+
+def merge_intervals(starts, ends):
+    """Union of [start, end] intervals (int64 ns) as sorted, disjoint (starts, ends)"""
+    if len(starts) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    # A new interval begins where the start lies past every earlier end
+    new = np.r_[True, starts[1:] > ends[:-1]]
+    group = np.cumsum(new) - 1
+    merged_ends = np.zeros(group[-1] + 1, dtype=np.int64)
+    np.maximum.at(merged_ends, group, ends)
+    return starts[new], merged_ends
+
+
+def covered(starts, ends, window_starts, window_ends):
+    """Time (ns) each window overlaps a set of disjoint sorted intervals, vectorized over windows"""
+    if len(starts) == 0:
+        return np.zeros(len(window_starts), dtype=np.int64)
+    cumulative = np.r_[0, np.cumsum(ends - starts)]
+
+    def before(t):
+        # Interval time elapsed before t: whole intervals plus the part of the one containing t
+        k = np.searchsorted(starts, t, side="right")
+        inside = np.clip(t - starts[np.maximum(k - 1, 0)], 0, (ends - starts)[np.maximum(k - 1, 0)])
+        return cumulative[np.maximum(k - 1, 0)] + np.where(k > 0, inside, 0)
+
+    return before(window_ends) - before(window_starts)
+
+
+def find_spikes(series, window=SPIKE_WINDOW, z=SPIKE_Z, rise=SPIKE_RISE):
+    """Spike samples of a Time/value series with the window each sample covers
+
+    A sample summarizes the interval since the previous sample, so that interval is
+    its window. Cumulative series (never falling) spike where they step up; others
+    where the robust z-score against a centered rolling median/MAD exceeds `z`.
+    """
+    values = series["value"]
+    previous = values.shift()
+    if (values.diff() < 0).mean() < 0.01:
+        score = (values - previous) / previous.abs().clip(lower=1e-9)
+        baseline, threshold = previous, rise
+    else:
+        baseline = values.rolling(window, center=True, min_periods=1).median()
+        mad = (values - baseline).abs().rolling(window, center=True, min_periods=1).median()
+        scale = 1.4826 * mad.where(mad > 0, values.abs().median() * 0.01 + 1e-9)
+        score, threshold = (values - baseline) / scale, z
+    spikes = series.assign(score=score, baseline=baseline)
+    spacing = series["Time"].diff().fillna(series["Time"].diff().median())
+    spikes["window_start"] = series["Time"] - spacing
+    return spikes[spikes["score"] > threshold].reset_index(drop=True)
+
+
+def compaction_intervals(folder_name, rocksdb_log=None, offset_hours=0.0):
+    """(starts, ends) int64 ns of compaction activity
+
+    Taken from a RocksDB LOG when given, otherwise from export samples where compaction bytes or time are non-zero.
+    """
+    if rocksdb_log:
+        table = read_rocksdb_log(rocksdb_log)
+        table = table[(table["event"] == "compaction") & (table["duration_us"] >= 0)]
+        offset_ns = int(offset_hours * 3600 * 10**9)
+        starts = table["start_us"].to_numpy(dtype=np.int64) * 1000 + offset_ns
+        return merge_intervals(starts, starts + table["duration_us"].to_numpy(dtype=np.int64) * 1000)
+
+    starts, ends = [], []
+    for metric in COMPACTION_METRICS:
+        series = load_metric_series(folder_name, metric)
+        if series is None or series.empty:
+            continue
+        t = series["Time"].to_numpy().astype("datetime64[ns]").view(np.int64)
+        spacing = np.diff(t, prepend=t[0] - (np.median(np.diff(t)) if len(t) > 1 else 0))
+        active = series["value"].to_numpy() > 0
+        starts.append((t - spacing)[active])
+        ends.append(t[active])
+    if not starts:
+        return merge_intervals(np.empty(0, np.int64), np.empty(0, np.int64))
+    return merge_intervals(np.concatenate(starts), np.concatenate(ends))
+
+
+def attribute_spikes(spikes, pauses, compactions, slack_seconds=SLACK_SECONDS, explains=GC_EXPLAINS_FRACTION):
+    """Add gc_ms, max_pause_ms, compaction_s and attribution (gc, compaction, gc+compaction, neither) per spike"""
+    slack = int(slack_seconds * 10**9)
+    window_starts = spikes["window_start"].to_numpy().astype("datetime64[ns]").view(np.int64) - slack
+    window_ends = spikes["Time"].to_numpy().astype("datetime64[ns]").view(np.int64) + slack
+
+    gc_starts = pauses["start"].to_numpy().astype("datetime64[ns]").view(np.int64)
+    gc_ends = pauses["end"].to_numpy().astype("datetime64[ns]").view(np.int64)
+    merged_gc = merge_intervals(gc_starts, gc_ends)
+    gc_ns = covered(*merged_gc, window_starts, window_ends)
+    compaction_ns = covered(*compactions, window_starts, window_ends)
+
+    # Longest single pause overlapping each window: pauses sorted by start, few per window
+    # (running max of ends, since allocation stalls of several threads can overlap)
+    first = np.searchsorted(np.maximum.accumulate(gc_ends), window_starts, side="left") if len(gc_ends) else np.zeros(len(spikes), int)
+    last = np.searchsorted(gc_starts, window_ends, side="right") if len(gc_starts) else np.zeros(len(spikes), int)
+    durations = pauses["duration_ms"].to_numpy()
+    max_pause = np.array([durations[a:b].max() if b > a else 0.0 for a, b in zip(first, last)])
+
+    # Latency values are in µs; a pause adds at most its length to one operation
+    gc_explains = gc_ns / 1e3 >= explains * spikes["value"].to_numpy()
+    in_compaction = compaction_ns > 0
+    attribution = np.select(
+        [gc_explains & in_compaction, gc_explains, in_compaction],
+        ["gc+compaction", "gc", "compaction"],
+        "neither",
+    )
+    return spikes.assign(
+        gc_ms=gc_ns / 1e6,
+        max_pause_ms=max_pause,
+        compaction_s=compaction_ns / 1e9,
+        attribution=pd.Categorical(attribution, categories=["gc", "compaction", "gc+compaction", "neither"]),
+    )
+
+
+def plot_overlay(experiment_name, series_by_metric, pauses, compactions, filename):
+    """Latency series with attributed spikes, above a strip of GC pauses and compaction intervals"""
+    colors = {"gc": "tab:red", "compaction": "tab:orange", "gc+compaction": "tab:purple", "neither": "black"}
+    fig, (ax, strip) = plt.subplots(
+        2, 1, figsize=(14, 7), sharex=True, gridspec_kw={"height_ratios": [4, 1]}
+    )
+    for metric, (series, spikes) in series_by_metric.items():
+        ax.plot(series["Time"], series["value"], linewidth=0.8, label=metric)
+        for attribution, group in spikes.groupby("attribution", observed=True):
+            ax.scatter(group["Time"], group["value"], s=18, color=colors[attribution], zorder=3,
+                       label=f"{metric} spike: {attribution} ({len(group)})")
+    ax.set_yscale("log")
+    # Logs usually outlast the exports; keep the view on the latency data
+    first = min(series["Time"].iloc[0] for series, _ in series_by_metric.values())
+    last = max(series["Time"].iloc[-1] for series, _ in series_by_metric.values())
+    ax.set_xlim(first, last)
+    ax.set_ylabel("Latency (µs)")
+    ax.set_title(f"{experiment_name}: latency spikes vs GC pauses and compaction", fontweight="bold")
+    ax.legend(fontsize=8)
+    ax.grid(True, alpha=0.3)
+
+    if len(compactions[0]):
+        left, right = mdates.date2num(compactions[0].astype("datetime64[ns]")), mdates.date2num(compactions[1].astype("datetime64[ns]"))
+        strip.broken_barh(list(zip(left, right - left)), (0, 0.45), color="tab:orange")
+    if len(pauses):
+        left, right = mdates.date2num(pauses["start"].to_numpy()), mdates.date2num(pauses["end"].to_numpy())
+        # Pauses are milliseconds long; give them a visible minimum width
+        strip.broken_barh(list(zip(left, np.maximum(right - left, 1 / 86400))), (0.55, 0.45), color="tab:red")
+    strip.set_yticks([0.225, 0.775])
+    strip.set_yticklabels(["compaction", "GC pause"])
+    strip.set_xlabel("Time")
+    fig.autofmt_xdate()
+    save_chart(filename)
+
+
+def find_gc_logs(folder_name):
+    """GC logs (including rotated ones) stored next to an experiment's exports"""
+    return sorted(glob.glob(os.path.join(BASE_PATH, folder_name, GC_LOG_PATTERN)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attribute OM latency spikes to JVM GC pauses or compaction")
+    parser.add_argument("--gc-log", action="append", default=[], metavar="FOLDER=PATH",
+                        help=f"GC log of an experiment (repeatable; default: {GC_LOG_PATTERN} in the folder)")
+    parser.add_argument("--rocksdb-log", action="append", default=[], metavar="FOLDER=PATH",
+                        help="RocksDB LOG for exact compaction intervals (default: from the exports)")
+    parser.add_argument("--metric", action="append", default=None, help="Latency metric (repeatable)")
+    parser.add_argument("--gc-offset-hours", type=float, default=0.0, help="Added to GC log times to match the exports")
+    parser.add_argument("--rocksdb-offset-hours", type=float, default=0.0, help="Added to RocksDB LOG times")
+    parser.add_argument("--jvm-start", default=None, help="Wall-clock JVM start for uptime-only GC logs")
+    parser.add_argument("--z", type=float, default=SPIKE_Z, help="Robust z-score for a spike")
+    parser.add_argument("--slack-seconds", type=float, default=SLACK_SECONDS)
+    parser.add_argument("--out", default=None, help="Write every attributed spike to this CSV file")
+    args = parser.parse_args()
+
+    gc_logs = dict(item.split("=", 1) for item in args.gc_log)
+    rocksdb_logs = dict(item.split("=", 1) for item in args.rocksdb_log)
+    metrics = args.metric or DEFAULT_METRICS
+    all_spikes = []
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        paths = [gc_logs[folder_name]] if folder_name in gc_logs else find_gc_logs(folder_name)
+        pauses = parse_gc_log(paths, args.jvm_start, args.gc_offset_hours)
+        compactions = compaction_intervals(folder_name, rocksdb_logs.get(folder_name), args.rocksdb_offset_hours)
+
+        print(f"\n{experiment_name}")
+        print("=" * 70)
+        print(f"GC logs: {', '.join(paths) if paths else 'none found'}; {len(pauses)} pauses; "
+              f"{len(compactions[0])} compaction intervals")
+        if len(pauses):
+            print(summarize_pauses(pauses).to_string(index=False, float_format="%.2f"))
+
+        series_by_metric = {}
+        for metric in metrics:
+            series = load_metric_series(folder_name, metric)
+            if series is None or series.empty:
+                continue
+            spikes = attribute_spikes(find_spikes(series, z=args.z), pauses, compactions, args.slack_seconds)
+            series_by_metric[metric] = (series, spikes)
+            counts = spikes["attribution"].value_counts().reindex(spikes["attribution"].cat.categories, fill_value=0)
+            print(f"{metric}: {len(spikes)} spikes -> " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+            all_spikes.append(spikes.assign(experiment=experiment_name, metric=metric))
+
+        if series_by_metric:
+            plot_overlay(experiment_name, series_by_metric, pauses, compactions,
+                         f"gc_overlay_{folder_name.split(':')[3]}_{folder_name.split(':')[4]}.png")
+
+    if args.out and all_spikes:
+        pd.concat(all_spikes, ignore_index=True).to_csv(args.out, index=False)
+        print(f"\nSpike attribution saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
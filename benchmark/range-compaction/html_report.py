@@ -0,0 +1,397 @@
+"""
+Interactive HTML report backed by multi-resolution min/max/mean pyramids.
+Level 0 of each series holds the raw samples and every further level halves the
+resolution, keeping the min, max and mean of each pair of buckets. Levels are cut
+into fixed-size float32 tiles. The coarse levels are embedded in the HTML file,
+so it opens instantly on its own; the fine levels are written as sidecar tile
+files next to it, which the viewer fetches on demand when a zoom needs them.
+The report size therefore follows the number of series, not their length.
+"""
+
+import argparse
+import base64
+import json
+import os
+
+import numpy as np
+from benchmark_utils import BASE_PATH, EXPERIMENT_FOLDERS, list_metrics, load_metric_series
+
+TILE_SIZE = 512
+# Levels with at most this many buckets are embedded; finer ones go to sidecar tiles
+INLINE_BUCKETS = 4096
+COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b"]
+DEFAULT_REPORT_PATH = os.path.join(BASE_PATH, "report.html")
+
+
+def build_pyramid(offsets, values):
+    """Power-of-two levels of (time, min, max, mean) arrays, finest first
+
+    Each coarser bucket starts at its first child's time; NaN samples are ignored.
+    """
+    valid = ~np.isnan(values)
+    t = offsets.astype(float)
+    low = np.where(valid, values, np.inf)
+    high = np.where(valid, values, -np.inf)
+    sums = np.where(valid, values, 0.0)
+    counts = valid.astype(float)
+
+    levels = []
+    while True:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / counts
+        levels.append(
+            (t, np.where(counts > 0, low, np.nan), np.where(counts > 0, high, np.nan), np.where(counts > 0, mean, np.nan))
+        )
+        if len(t) <= 1:
+            return levels
+        if len(t) % 2:
+            # Pad with an empty bucket so pairs line up
+            t = np.append(t, t[-1])
+            low, high = np.append(low, np.inf), np.append(high, -np.inf)
+            sums, counts = np.append(sums, 0.0), np.append(counts, 0.0)
+        t = t[0::2]
+        low = np.minimum(low[0::2], low[1::2])
+        high = np.maximum(high[0::2], high[1::2])
+        sums = sums[0::2] + sums[1::2]
+        counts = counts[0::2] + counts[1::2]
+
+
+def encode_tile(t, low, high, mean):
+    """Little-endian float32 [t..., min..., max..., mean...]"""
+    return np.concatenate([t, low, high, mean]).astype("<f4").tobytes()
+
+
+def tile_dir(path):
+    """Sidecar directory holding the fine tiles of the report at path"""
+    return os.path.splitext(path)[0] + "_tiles"
+
+
+def series_payload(key, experiment_name, series, color, tiles_path, tile_size=TILE_SIZE,
+                   inline_buckets=INLINE_BUCKETS):
+    """Manifest entry and embedded tile blocks for one series; fine tiles are written under tiles_path"""
+    seconds = (series["Time"] - series["Time"].iloc[0]).dt.total_seconds().to_numpy()
+    values = series["value"].to_numpy(dtype=float)
+    levels = build_pyramid(seconds, values)
+
+    manifest_levels, blocks = [], []
+    for level, (t, low, high, mean) in enumerate(levels):
+        inline = len(t) <= inline_buckets
+        starts = []
+        for index, first in enumerate(range(0, len(t), tile_size)):
+            part = slice(first, first + tile_size)
+            starts.append(float(t[first]))
+            data = encode_tile(t[part], low[part], high[part], mean[part])
+            if inline:
+                blocks.append(
+                    f'<script type="application/octet-stream" id="{key}-{level}-{index}">'
+                    f'{base64.b64encode(data).decode("ascii")}</script>'
+                )
+            else:
+                with open(os.path.join(tiles_path, f"{key}-{level}-{index}.bin"), "wb") as f:
+                    f.write(data)
+        manifest_levels.append({"count": len(t), "starts": starts, "inline": inline})
+
+    entry = {
+        "key": key,
+        "experiment": experiment_name,
+        "color": color,
+        "step": float(np.median(np.diff(seconds))) if len(seconds) > 1 else 1.0,
+        "end": float(seconds[-1]) if len(seconds) else 0.0,
+        "levels": manifest_levels,
+    }
+    return entry, blocks
+
+
+def build_report(path=DEFAULT_REPORT_PATH, metrics=None, tile_size=TILE_SIZE, inline_buckets=INLINE_BUCKETS):
+    """Write the report and its sidecar tiles; returns (number of series, embedded tiles, sidecar tiles)"""
+    names = metrics or sorted(set().union(*(list_metrics(f) for f in EXPERIMENT_FOLDERS.values())))
+    tiles_path = tile_dir(path)
+    os.makedirs(tiles_path, exist_ok=True)
+    # Tiles of an earlier build would be served for series that no longer match them
+    for name in os.listdir(tiles_path):
+        if name.endswith(".bin"):
+            os.remove(os.path.join(tiles_path, name))
+    manifest = {"tileSize": tile_size, "tileDir": os.path.basename(tiles_path), "metrics": []}
+    blocks = []
+    for metric in names:
+        entry = {"name": metric, "kind": "count", "series": []}
+        for e, (experiment_name, folder_name) in enumerate(EXPERIMENT_FOLDERS.items()):
+            series = load_metric_series(folder_name, metric)
+            if series is None or series.empty:
+                continue
+            entry["kind"] = series.attrs.get("kind", "count")
+            key = f"s{sum(len(m['series']) for m in manifest['metrics']) + len(entry['series'])}"
+            payload, series_blocks = series_payload(key, experiment_name, series, COLORS[e % len(COLORS)], tiles_path,
+                                                    tile_size, inline_buckets)
+            entry["series"].append(payload)
+            blocks.extend(series_blocks)
+        if entry["series"]:
+            manifest["metrics"].append(entry)
+
+    html = (
+        REPORT_TEMPLATE.replace("__MANIFEST__", json.dumps(manifest, separators=(",", ":")))
+        .replace("__TILES__", "\n".join(blocks))
+    )
+    with open(path, "w") as f:
+        f.write(html)
+    return sum(len(m["series"]) for m in manifest["metrics"]), len(blocks), len(os.listdir(tiles_path))
+
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Range Compaction Benchmark Report</title>
+<style>
+  body { font-family: sans-serif; margin: 16px; color: #222; }
+  .chart { margin: 12px 0 28px; }
+  .chart h3 { margin: 0 0 4px; font-size: 15px; }
+  .legend span { margin-right: 14px; font-size: 12px; }
+  .legend i { display: inline-block; width: 12px; height: 3px; margin-right: 4px; vertical-align: middle; }
+  canvas { border: 1px solid #ccc; cursor: crosshair; width: 100%; height: 260px; }
+  #status { font-size: 12px; color: #666; }
+</style>
+</head>
+<body>
+<h2>Range Compaction Benchmark Report</h2>
+<p id="status">Scroll to zoom, drag to pan, double-click to reset. Bands show min/max per pixel, lines the mean.
+Fine levels are fetched from the sidecar tiles as the zoom needs them.</p>
+<label><input type="checkbox" id="logscale"> log scale</label>
+<div id="charts"></div>
+<script type="application/json" id="manifest">__MANIFEST__</script>
+__TILES__
+<script>
+const MANIFEST = JSON.parse(document.getElementById("manifest").textContent);
+const cache = new Map();
+const charts = [];
+let fullEnd = 0;
+let view = null;
+
+const pending = new Set();
+const failed = new Set();
+
+function unpack(buffer) {
+  const f = new Float32Array(buffer);
+  const n = f.length / 4;
+  return { t: f.subarray(0, n), min: f.subarray(n, 2 * n), max: f.subarray(2 * n, 3 * n), mean: f.subarray(3 * n) };
+}
+
+// Embedded tiles are decoded on first use; sidecar tiles are fetched once and redrawn on arrival.
+// Returns null while a sidecar tile is not there yet
+function tile(key, level, index) {
+  const id = key + "-" + level + "-" + index;
+  if (cache.has(id)) return cache.get(id);
+  const block = document.getElementById(id);
+  if (block) {
+    const text = atob(block.textContent.trim());
+    const bytes = new Uint8Array(text.length);
+    for (let i = 0; i < text.length; i++) bytes[i] = text.charCodeAt(i);
+    cache.set(id, unpack(bytes.buffer));
+    return cache.get(id);
+  }
+  if (!pending.has(id) && !failed.has(id)) {
+    pending.add(id);
+    fetch(MANIFEST.tileDir + "/" + id + ".bin")
+      .then((response) => { if (!response.ok) throw new Error(response.status); return response.arrayBuffer(); })
+      .then((buffer) => { cache.set(id, unpack(buffer)); pending.delete(id); redraw(); })
+      .catch(() => {
+        pending.delete(id);
+        failed.add(id);
+        document.getElementById("status").textContent =
+          "Fine tiles could not be loaded from " + MANIFEST.tileDir + "/; serve the report over HTTP to zoom further.";
+      });
+  }
+  return null;
+}
+
+// Tile indices of one level overlapping [x0, x1]
+function overlapping(starts, x0, x1) {
+  const indices = [];
+  for (let index = 0; index < starts.length; index++) {
+    const next = index + 1 < starts.length ? starts[index + 1] : Infinity;
+    if (next >= x0 && starts[index] <= x1) indices.push(index);
+  }
+  return indices;
+}
+
+// Points of one series inside [x0, x1] at the level giving about one bucket per pixel,
+// or the finest coarser level already loaded while its tiles are on their way
+function visible(series, x0, x1, pixels) {
+  const wanted = (x1 - x0) / series.step / pixels;
+  const best = Math.max(0, Math.min(series.levels.length - 1, Math.ceil(Math.log2(Math.max(wanted, 1)))));
+  for (let level = best; level < series.levels.length; level++) {
+    const tiles = overlapping(series.levels[level].starts, x0, x1).map((index) => tile(series.key, level, index));
+    if (tiles.includes(null) && level + 1 < series.levels.length) continue;
+    const points = [];
+    for (const data of tiles) {
+      if (data === null) continue;
+      for (let i = 0; i < data.t.length; i++) {
+        points.push([data.t[i], data.min[i], data.max[i], data.mean[i]]);
+      }
+    }
+    return { level, points };
+  }
+}
+
+function formatValue(kind, v) {
+  const a = Math.abs(v);
+  if (kind === "bytes") {
+    const units = ["B", "KB", "MB", "GB", "TB"];
+    let u = 0;
+    while (a >= Math.pow(1024, u + 1) && u < units.length - 1) u++;
+    return (v / Math.pow(1024, u)).toPrecision(3) + " " + units[u];
+  }
+  if (kind === "duration") {
+    if (a >= 1e6) return (v / 1e6).toPrecision(3) + " s";
+    if (a >= 1e3) return (v / 1e3).toPrecision(3) + " ms";
+    return v.toPrecision(3) + " µs";
+  }
+  if (a >= 1e9) return (v / 1e9).toPrecision(3) + "G";
+  if (a >= 1e6) return (v / 1e6).toPrecision(3) + "M";
+  if (a >= 1e3) return (v / 1e3).toPrecision(3) + "K";
+  return v.toPrecision(3);
+}
+
+function draw(chart) {
+  const canvas = chart.canvas;
+  const ratio = window.devicePixelRatio || 1;
+  canvas.width = canvas.clientWidth * ratio;
+  canvas.height = canvas.clientHeight * ratio;
+  const ctx = canvas.getContext("2d");
+  ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+  const W = canvas.clientWidth, H = canvas.clientHeight;
+  const left = 80, right = 10, top = 10, bottom = 28;
+  const plotW = W - left - right, plotH = H - top - bottom;
+  const log = document.getElementById("logscale").checked;
+  const [x0, x1] = view;
+  const ty = (v) => (log ? (v > 0 ? Math.log10(v) : NaN) : v);
+
+  const layers = chart.metric.series.map((s) => ({ series: s, ...visible(s, x0, x1, plotW) }));
+  let lo = Infinity, hi = -Infinity;
+  for (const layer of layers) {
+    for (const p of layer.points) {
+      if (p[0] < x0 || p[0] > x1) continue;
+      const a = ty(p[1]), b = ty(p[2]);
+      if (!isNaN(a)) lo = Math.min(lo, a);
+      if (!isNaN(b)) hi = Math.max(hi, b);
+    }
+  }
+  if (!isFinite(lo)) { lo = 0; hi = 1; }
+  if (hi === lo) { hi = lo + 1; }
+  const sx = (t) => left + ((t - x0) / (x1 - x0)) * plotW;
+  const sy = (v) => top + (1 - (ty(v) - lo) / (hi - lo)) * plotH;
+
+  ctx.clearRect(0, 0, W, H);
+  ctx.font = "11px sans-serif";
+  ctx.fillStyle = "#444";
+  ctx.strokeStyle = "#eee";
+  for (let i = 0; i <= 4; i++) {
+    const y = top + (i / 4) * plotH;
+    const v = hi - (i / 4) * (hi - lo);
+    ctx.beginPath(); ctx.moveTo(left, y); ctx.lineTo(W - right, y); ctx.stroke();
+    ctx.fillText(formatValue(chart.metric.kind, log ? Math.pow(10, v) : v), 4, y + 4);
+  }
+  for (let i = 0; i <= 6; i++) {
+    const t = x0 + (i / 6) * (x1 - x0);
+    const x = sx(t);
+    ctx.beginPath(); ctx.moveTo(x, top); ctx.lineTo(x, top + plotH); ctx.stroke();
+    ctx.fillText((t / 60).toFixed(t < 600 && x1 - x0 < 600 ? 1 : 0) + " min", x - 14, H - 8);
+  }
+
+  ctx.save();
+  ctx.beginPath(); ctx.rect(left, top, plotW, plotH); ctx.clip();
+  for (const layer of layers) {
+    ctx.globalAlpha = 0.25;
+    ctx.strokeStyle = layer.series.color;
+    ctx.beginPath();
+    for (const p of layer.points) {
+      if (isNaN(p[1])) continue;
+      const x = sx(p[0]);
+      ctx.moveTo(x, sy(p[1])); ctx.lineTo(x, sy(p[2]) - 0.5);
+    }
+    ctx.stroke();
+    ctx.globalAlpha = 1;
+    ctx.beginPath();
+    let pen = false;
+    for (const p of layer.points) {
+      const y = sy(p[3]);
+      if (isNaN(y)) { pen = false; continue; }
+      if (pen) ctx.lineTo(sx(p[0]), y); else ctx.moveTo(sx(p[0]), y);
+      pen = true;
+    }
+    ctx.stroke();
+  }
+  ctx.restore();
+  chart.levels.textContent = layers.map((l) => "level " + l.level).join(", ");
+}
+
+function redraw() { charts.forEach(draw); }
+
+function attach(chart) {
+  const canvas = chart.canvas;
+  let drag = null;
+  const toTime = (event) => {
+    const r = canvas.getBoundingClientRect();
+    const f = Math.min(1, Math.max(0, (event.clientX - r.left - 80) / (r.width - 90)));
+    return view[0] + f * (view[1] - view[0]);
+  };
+  canvas.addEventListener("wheel", (event) => {
+    event.preventDefault();
+    const t = toTime(event);
+    const scale = event.deltaY > 0 ? 1.25 : 0.8;
+    const x0 = t - (t - view[0]) * scale, x1 = t + (view[1] - t) * scale;
+    if (x1 - x0 > 1) view = [Math.max(0, x0), Math.min(fullEnd, x1)];
+    redraw();
+  });
+  canvas.addEventListener("mousedown", (event) => { drag = { x: event.clientX, view: view.slice() }; });
+  window.addEventListener("mouseup", () => { drag = null; });
+  canvas.addEventListener("mousemove", (event) => {
+    if (!drag) return;
+    const span = drag.view[1] - drag.view[0];
+    const shift = ((drag.x - event.clientX) / (canvas.clientWidth - 90)) * span;
+    const x0 = Math.min(Math.max(0, drag.view[0] + shift), fullEnd - span);
+    view = [x0, x0 + span];
+    redraw();
+  });
+  canvas.addEventListener("dblclick", () => { view = [0, fullEnd]; redraw(); });
+}
+
+for (const metric of MANIFEST.metrics) {
+  const div = document.createElement("div");
+  div.className = "chart";
+  const legend = metric.series.map((s) => '<span><i style="background:' + s.color + '"></i>' + s.experiment + "</span>").join("");
+  div.innerHTML = "<h3>" + metric.name + '</h3><div class="legend">' + legend + ' <span class="levels"></span></div><canvas></canvas>';
+  document.getElementById("charts").appendChild(div);
+  const chart = { metric, canvas: div.querySelector("canvas"), levels: div.querySelector(".levels") };
+  charts.push(chart);
+  attach(chart);
+  for (const s of metric.series) fullEnd = Math.max(fullEnd, s.end);
+}
+view = [0, fullEnd];
+document.getElementById("logscale").addEventListener("change", redraw);
+window.addEventListener("resize", redraw);
+redraw();
+</script>
+</body>
+</html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the interactive multi-resolution HTML report")
+    parser.add_argument("--metric", action="append", default=None, help="Metric to include (repeatable, default: all)")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="Buckets per tile")
+    parser.add_argument("--inline-buckets", type=int, default=INLINE_BUCKETS,
+                        help="Embed pyramid levels with at most this many buckets; finer ones become sidecar tiles")
+    parser.add_argument("--out", default=DEFAULT_REPORT_PATH, help="Output HTML file")
+    args = parser.parse_args()
+
+    series, inline, sidecar = build_report(args.out, args.metric, args.tile_size, args.inline_buckets)
+    size = os.path.getsize(args.out) / 1024**2
+    print(f"Report with {series} series in {inline} embedded tiles saved as '{args.out}' ({size:.1f} MB)")
+    print(f"{sidecar} fine tiles saved in '{tile_dir(args.out)}'; serve both over HTTP (python -m http.server) "
+          f"to zoom past the embedded levels")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Latency-distribution heatmaps over key count or time.
+Samples are binned into a log-scaled 2-D histogram with chunked np.bincount
+(no per-point drawing). Series are read one at a time, first for the shared
+bin edges and then to add their counts, so memory holds one series and the
+histograms rather than every sample. Each experiment's histogram is rendered
+as an image with one color scale shared across experiments.
+"""
+
+import argparse
+
+import matplotlib.pyplot as plt
+import numpy as np
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    get_metric_files,
+    load_metric_series,
+    project_onto_key_count,
+    save_chart,
+)
+from matplotlib.colors import LogNorm
+from matplotlib.ticker import FuncFormatter
+
+DEFAULT_METRIC_PREFIX = "Seek"
+X_BINS = 120
+Y_BINS = 100
+CHUNK_SIZE = 10**7
+
+
+def log_edges(lo, hi, bins):
+    """Bin edges evenly spaced in log10 between positive lo and hi"""
+    return np.linspace(np.log10(lo), np.log10(max(hi, lo * 10)), bins + 1)
+
+
+def accumulate_histogram(counts, x, y, x_edges, y_edges, log_x=True, log_y=True):
+    """Add samples to counts (shape (x bins, y bins)) in place, chunk by chunk
+
+    Edges are in log10 space for log axes. Samples outside the edges or non-positive
+    on a log axis are dropped.
+    """
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    for start in range(0, len(x), CHUNK_SIZE):
+        xs = np.asarray(x[start:start + CHUNK_SIZE], dtype=float)
+        ys = np.asarray(y[start:start + CHUNK_SIZE], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if log_x:
+                xs = np.log10(xs)
+            if log_y:
+                ys = np.log10(ys)
+        # Uniform bins in (log) space, so the bin index is a scaled floor
+        ix = np.floor((xs - x_edges[0]) / (x_edges[-1] - x_edges[0]) * nx)
+        iy = np.floor((ys - y_edges[0]) / (y_edges[-1] - y_edges[0]) * ny)
+        # The upper edge belongs to the last bin
+        ix = np.where(xs == x_edges[-1], nx - 1, ix)
+        iy = np.where(ys == y_edges[-1], ny - 1, iy)
+        valid = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        flat = ix[valid].astype(np.int64) * ny + iy[valid].astype(np.int64)
+        counts += np.bincount(flat, minlength=nx * ny).reshape(nx, ny)
+    return counts
+
+
+def iter_samples(folder_name, metrics, x_axis="key_count"):
+    """(x, latency in µs) arrays for each of the given duration metrics of one experiment, one series at a time"""
+    key_count = load_metric_series(folder_name, KEY_COUNT_METRIC)
+    for metric in metrics:
+        series = load_metric_series(folder_name, metric)
+        if series is None or series.empty or series.attrs.get("kind") != "duration":
+            continue
+        if x_axis == "key_count":
+            if key_count is None:
+                continue
+            series = project_onto_key_count(series, key_count)
+            x = series["key_count"].to_numpy(dtype=float)
+        else:
+            x = (series["Time"] - series["Time"].iloc[0]).dt.total_seconds().to_numpy() / 60
+        yield x, series["value"].to_numpy(dtype=float)
+
+
+def _sample_range(x, y, log_x):
+    """(x min, x max, y min, y max) of the samples a log histogram can place, or None"""
+    y = y[y > 0]
+    if log_x:
+        x = x[x > 0]
+    if len(x) == 0 or len(y) == 0:
+        return None
+    return np.nanmin(x), np.nanmax(x), y.min(), y.max()
+
+
+def build_heatmaps(metrics=None, x_axis="key_count", x_bins=X_BINS, y_bins=Y_BINS):
+    """Histograms per experiment on shared edges: returns (x edges, y edges, {experiment: counts})
+
+    Returns (None, None, {}) when no sample can be placed on the log axes.
+    """
+    log_x = x_axis == "key_count"
+    names = {
+        experiment_name: metrics or sorted(m for m in get_metric_files(folder) if m.startswith(DEFAULT_METRIC_PREFIX))
+        for experiment_name, folder in EXPERIMENT_FOLDERS.items()
+    }
+
+    # First pass: only the shared bin edges are kept from each series
+    ranges = [
+        _sample_range(x, y, log_x)
+        for experiment_name, folder_name in EXPERIMENT_FOLDERS.items()
+        for x, y in iter_samples(folder_name, names[experiment_name], x_axis)
+    ]
+    ranges = np.array([r for r in ranges if r is not None])
+    if len(ranges) == 0:
+        return None, None, {}
+    y_edges = log_edges(ranges[:, 2].min(), ranges[:, 3].max(), y_bins)
+    if log_x:
+        x_edges = log_edges(max(ranges[:, 0].min(), 1.0), ranges[:, 1].max(), x_bins)
+    else:
+        x_edges = np.linspace(0.0, max(ranges[:, 1].max(), 1.0), x_bins + 1)
+
+    # Second pass: each series is added to its experiment's counts and dropped
+    heatmaps = {}
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        counts = np.zeros((x_bins, y_bins), dtype=np.int64)
+        for x, y in iter_samples(folder_name, names[experiment_name], x_axis):
+            accumulate_histogram(counts, x, y, x_edges, y_edges, log_x=log_x)
+        heatmaps[experiment_name] = counts
+    return x_edges, y_edges, heatmaps
+
+
+def plot_heatmaps(x_edges, y_edges, heatmaps, x_axis="key_count", title="Seek latency", filename="latency_heatmap.png"):
+    """One image per experiment with a shared logarithmic color scale"""
+    vmax = max(int(c.max()) for c in heatmaps.values())
+    norm = LogNorm(vmin=1, vmax=max(vmax, 2))
+    power = FuncFormatter(lambda v, _: f"$10^{{{v:g}}}$")
+
+    # The color bar gets its own grid column so save_chart's tight layout can place it
+    fig, axes = plt.subplots(1, len(heatmaps) + 1, figsize=(6 * len(heatmaps) + 1, 5), squeeze=False,
+                             gridspec_kw={"width_ratios": [1] * len(heatmaps) + [0.05]})
+    for ax in axes[0][1:-1]:
+        ax.sharey(axes[0][0])
+        ax.tick_params(labelleft=False)
+    image = None
+    for ax, (experiment_name, counts) in zip(axes[0], heatmaps.items()):
+        # Empty bins stay transparent under LogNorm
+        masked = np.ma.masked_equal(counts.T, 0)
+        image = ax.imshow(
+            masked, origin="lower", aspect="auto", norm=norm, cmap="viridis", interpolation="nearest",
+            extent=[x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]],
+        )
+        ax.set_title(experiment_name, fontsize=10)
+        ax.set_xlabel("Key Count" if x_axis == "key_count" else "Time Offset (minutes)")
+        if x_axis == "key_count":
+            ax.xaxis.set_major_formatter(power)
+        ax.yaxis.set_major_formatter(power)
+        ax.grid(True, alpha=0.2)
+    axes[0][0].set_ylabel("Latency (µs)")
+    fig.colorbar(image, cax=axes[0][-1], label="Samples per bin")
+    fig.suptitle(f"{title} distribution over {'key count' if x_axis == 'key_count' else 'time'}", fontweight="bold")
+
+    save_chart(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render log-scaled latency heatmaps per experiment")
+    parser.add_argument("--metric", action="append", default=None,
+                        help=f"Latency metric (repeatable, default: all '{DEFAULT_METRIC_PREFIX}*' duration metrics)")
+    parser.add_argument("--x", choices=["key_count", "time"], default="key_count", help="Horizontal axis")
+    parser.add_argument("--x-bins", type=int, default=X_BINS)
+    parser.add_argument("--y-bins", type=int, default=Y_BINS)
+    parser.add_argument("--out", default=None, help="Output PNG (default: latency_heatmap_<axis>.png)")
+    args = parser.parse_args()
+
+    x_edges, y_edges, heatmaps = build_heatmaps(args.metric, args.x, args.x_bins, args.y_bins)
+    if not heatmaps:
+        print("No latency samples found")
+        return
+    for experiment_name, counts in heatmaps.items():
+        print(f"{experiment_name}: {int(counts.sum()):,} samples binned")
+    title = ", ".join(args.metric) if args.metric else f"{DEFAULT_METRIC_PREFIX} latency"
+    plot_heatmaps(x_edges, y_edges, heatmaps, args.x, title, args.out or f"latency_heatmap_{args.x}.png")
+
+
+if __name__ == "__main__":
+    main()
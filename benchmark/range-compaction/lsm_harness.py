@@ -0,0 +1,376 @@
+"""
+Embedded LSM harness for reproducing the range-compaction experiments offline.
+Drives a local RocksDB (through the optional `rocksdict` bindings) with the OM
+layout: a keyTable of /vol1/bucket1/<counter> keys and a deletedTable that
+receives every deleted key, under freon's create:delete:list mix with the oldest
+keys deleted first. Range compaction of the deleted prefix and periodic full
+compaction can be switched on, and the run is written as an experiment folder of
+Grafana-format exports (plus the range-compaction log) under the cluster runs'
+metric names. Point the analysis scripts at the output directory with
+RANGE_COMPACTION_EXPERIMENTS=<out_dir>.
+Time is virtual: every `ops_per_second * 30` operations make one 30s sample, so
+rates line up with the cluster runs while latencies are measured for real.
+"""
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import KEY_COUNT_METRIC
+from synthetic_data import EXPORT_STAMP, START_TIME, format_values
+
+try:
+    import rocksdict
+except ImportError:
+    rocksdict = None
+
+KEY_PREFIX = "/vol1/bucket1/"
+KEY_DIGITS = 19
+VALUE_BYTES = 200  # average serialized OmKeyInfo
+DEFAULT_WEIGHTS = (20, 8, 1)  # create:delete:list
+DEFAULT_OPS = 10**6
+OPS_PER_SECOND = 200
+STEP_SECONDS = 30
+LIST_BATCH = 100
+RANGE_COMPACTION_INTERVAL_S = 30
+RANGE_COMPACTION_MIN_ENTRIES = 10_000
+FULL_COMPACTION_INTERVAL_S = 3600
+COLUMN_FAMILIES = ["keyTable", "deletedTable"]
+INSTANCE = "om:9874"
+RANGE_LOG_NAME = "compatiing-range.log"
+
+DB_OPTIONS = {
+    "write_buffer_size": 4 * 1024**2,
+    "level0_file_num_compaction_trigger": 4,
+    "max_bytes_for_level_base": 16 * 1024**2,
+    "target_file_size_base": 4 * 1024**2,
+}
+
+# Seek latency histogram: log-spaced µs buckets, kept since DB open like RocksDB statistics
+LATENCY_EDGES_US = np.logspace(-1, 7, 321)
+
+# Exported metric -> unit family (see synthetic_data.format_values)
+HARNESS_METRICS = {
+    KEY_COUNT_METRIC: "raw",
+    "DeletedTable Estimated number of keys": "raw",
+    "Number of seeks per second": "count",
+    "Number of next per second": "count",
+    "Number of keys read per second": "count",
+    "Number of keys written per second": "count",
+    "Number of keys updated per second": "count",
+    "Bytes read per second": "bytes",
+    "Bytes write per second": "bytes",
+    "Flush write bytes": "bytes",
+    # The cluster's panel of this name reports bytes: the typical flush size of the interval
+    "Flush write median latency": "bytes",
+    "Compaction read bytes": "bytes",
+    "Compaction write bytes": "bytes",
+    "SST file total size": "bytes",
+    "Seek average latency": "duration",
+    "Seek median latency": "duration",
+    "Seek 95%-tile latency": "duration",
+    "Seek 99%-tile latency": "duration",
+    "Seek max latency": "duration",
+    "DB get average latency": "duration",
+    "DB get median": "duration",
+    "DB get 95%-tile": "duration",
+    "DB get 99%-tile": "duration",
+    "Flush time average": "duration",
+    "Compaction time average": "duration",
+}
+
+# RocksDB statistics tickers exported as per-second rates
+RATE_TICKERS = {
+    "Number of seeks per second": "rocksdb.number.db.seek",
+    "Number of next per second": "rocksdb.number.db.next",
+    "Number of keys read per second": "rocksdb.number.keys.read",
+    "Number of keys written per second": "rocksdb.number.keys.written",
+    "Number of keys updated per second": "rocksdb.number.keys.updated",
+    "Bytes read per second": "rocksdb.bytes.read",
+    "Bytes write per second": "rocksdb.bytes.written",
+    "Flush write bytes": "rocksdb.flush.write.bytes",
+    "Compaction read bytes": "rocksdb.compact.read.bytes",
+    "Compaction write bytes": "rocksdb.compact.write.bytes",
+}
+
+TICKER_LINE = re.compile(r"^(rocksdb\.[\w.]+) COUNT : (\d+)$", re.MULTILINE)
+HISTOGRAM_LINE = re.compile(
+    r"^(rocksdb\.[\w.]+) P50 : ([\d.]+) P95 : ([\d.]+) P99 : ([\d.]+) P100 : ([\d.]+) COUNT : (\d+) SUM : (\d+)$",
+    re.MULTILINE,
+)
+
+
+def require_rocksdict():
+    if rocksdict is None:
+        raise ImportError("lsm_harness needs the RocksDB bindings: pip install rocksdict")
+
+
+def parse_statistics(text):
+    """({ticker: count}, {histogram: (p50, p95, p99, max, count, sum)}) from a RocksDB statistics dump"""
+    tickers = {name: int(count) for name, count in TICKER_LINE.findall(text)}
+    histograms = {m[0]: tuple(float(v) for v in m[1:]) for m in HISTOGRAM_LINE.findall(text)}
+    return tickers, histograms
+
+
+def format_key(index):
+    return f"{KEY_PREFIX}{index:0{KEY_DIGITS}d}".encode()
+
+
+def experiment_folder_name(total_ops, weights=DEFAULT_WEIGHTS, range_compaction=False, periodic_full_compaction=False):
+    """Folder name in the repo's scheme, e.g. '1M-20:8:1:enable-range-compaction:disable-peridioc-full-compaction'"""
+    for suffix, scale in (("B", 10**9), ("M", 10**6), ("K", 10**3)):
+        if total_ops >= scale and total_ops % scale == 0:
+            label = f"{total_ops // scale}{suffix}"
+            break
+    else:
+        label = str(total_ops)
+    return (
+        f"{label}-{':'.join(str(w) for w in weights)}:"
+        f"{'enable' if range_compaction else 'disable'}-range-compaction:"
+        f"{'enable' if periodic_full_compaction else 'disable'}-peridioc-full-compaction"
+    )
+
+
+def write_export(path, times, values, family):
+    """One Grafana CSV: quoted header, unquoted rows, no trailing newline"""
+    stamps = [f"{t[:10]} {t[11:19]}" for t in np.datetime_as_string(np.asarray(times, dtype="datetime64[s]")).tolist()]
+    cells = format_values(np.asarray(values, dtype=float), family)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'"Time","{INSTANCE}"')
+        f.write("".join(f"\n{t},{v}" for t, v in zip(stamps, cells)))
+
+
+class SeekHistogram:
+    """Cumulative seek latency histogram with RocksDB-style percentiles"""
+
+    def __init__(self):
+        self.counts = np.zeros(len(LATENCY_EDGES_US) - 1, dtype=np.int64)
+        self.total_us = 0.0
+        self.max_us = 0.0
+        self.pending = []
+
+    def add(self, micros):
+        self.pending.append(micros)
+
+    def snapshot(self):
+        """(average, p50, p95, p99, max) in µs over every seek so far"""
+        if self.pending:
+            values = np.asarray(self.pending)
+            bins = np.clip(np.searchsorted(LATENCY_EDGES_US, values, side="right") - 1, 0, len(self.counts) - 1)
+            self.counts += np.bincount(bins, minlength=len(self.counts))
+            self.total_us += values.sum()
+            self.max_us = max(self.max_us, values.max())
+            self.pending = []
+        n = self.counts.sum()
+        if n == 0:
+            return (0.0,) * 5
+        cumulative = np.cumsum(self.counts)
+        mids = np.sqrt(LATENCY_EDGES_US[:-1] * LATENCY_EDGES_US[1:])
+        p50, p95, p99 = (mids[np.searchsorted(cumulative, q * n)] for q in (0.5, 0.95, 0.99))
+        return self.total_us / n, p50, p95, p99, self.max_us
+
+
+class LSMHarness:
+    """One embedded OM-like DB and its workload, compaction policies and metric samples"""
+
+    def __init__(self, db_dir, range_compaction=False, periodic_full_compaction=False, weights=DEFAULT_WEIGHTS,
+                 ops_per_second=OPS_PER_SECOND, list_batch=LIST_BATCH, seed=0, db_options=None):
+        require_rocksdict()
+        self.db_dir = db_dir
+        self.range_compaction = range_compaction
+        self.periodic_full_compaction = periodic_full_compaction
+        self.weights = np.asarray(weights, dtype=float) / sum(weights)
+        self.ops_per_sample = ops_per_second * STEP_SECONDS
+        self.list_batch = list_batch
+        self.rng = np.random.default_rng(seed)
+        self.value = self.rng.bytes(VALUE_BYTES)
+
+        self.options = rocksdict.Options(raw_mode=True)
+        self.options.create_if_missing(True)
+        self.options.create_missing_column_families(True)
+        self.options.enable_statistics()
+        settings = dict(DB_OPTIONS, **(db_options or {}))
+        self.options.set_write_buffer_size(settings["write_buffer_size"])
+        self.options.set_level_zero_file_num_compaction_trigger(settings["level0_file_num_compaction_trigger"])
+        self.options.set_max_bytes_for_level_base(settings["max_bytes_for_level_base"])
+        self.options.set_target_file_size_base(settings["target_file_size_base"])
+        self.db = rocksdict.Rdict(db_dir, self.options, column_families={cf: self.options for cf in COLUMN_FAMILIES})
+        self.tables = {cf: self.db.get_column_family(cf) for cf in COLUMN_FAMILIES}
+        self.handles = {cf: self.db.get_column_family_handle(cf) for cf in COLUMN_FAMILIES}
+
+        self.next_key = 0  # next counter to create
+        self.oldest = 0  # oldest live counter, deleted next
+        self.compacted_to = 0  # keyTable prefix below this has been range-compacted
+        self.seeks = SeekHistogram()
+        self.samples = []
+        self.range_log = []
+        self.previous_tickers = {}
+        self.previous_flushes = 0
+        self.last_range_compaction = 0.0
+        self.last_full_compaction = 0.0
+
+    def close(self):
+        self.db.close()
+
+    def _create(self):
+        key = format_key(self.next_key)
+        self.tables["keyTable"].get(key)  # OM checks for an existing key before committing
+        self.tables["keyTable"][key] = self.value
+        self.next_key += 1
+
+    def _delete(self):
+        if self.oldest >= self.next_key:
+            return self._create()
+        key = format_key(self.oldest)
+        self.tables["keyTable"].get(key)
+        batch = rocksdict.WriteBatch(raw_mode=True)
+        batch.delete(key, self.handles["keyTable"])
+        # deletedTable keys carry the object id, as in the range-compaction log
+        batch.put(key + f"/{self.oldest - 2**63}".encode(), self.value, self.handles["deletedTable"])
+        self.db.write(batch)
+        self.oldest += 1
+
+    def _list(self):
+        iterator = self.tables["keyTable"].iter()
+        start = time.perf_counter_ns()
+        iterator.seek(KEY_PREFIX.encode())
+        self.seeks.add((time.perf_counter_ns() - start) / 1e3)
+        for _ in range(self.list_batch):
+            if not iterator.valid():
+                break
+            iterator.next()
+        del iterator
+
+    def _compact(self, t_seconds):
+        """Run the enabled compaction policies at virtual time t_seconds"""
+        if self.range_compaction and t_seconds - self.last_range_compaction >= RANGE_COMPACTION_INTERVAL_S:
+            self.last_range_compaction = t_seconds
+            if self.oldest - self.compacted_to >= RANGE_COMPACTION_MIN_ENTRIES:
+                for cf, start, end in (
+                    ("keyTable", format_key(self.compacted_to), format_key(self.oldest)),
+                    ("deletedTable", format_key(self.compacted_to), format_key(self.oldest)),
+                ):
+                    self.tables[cf].compact_range(start, end)
+                    stamp = (START_TIME + pd.Timedelta(seconds=t_seconds)).strftime("%Y-%m-%d %H:%M:%S,000")
+                    self.range_log.append(
+                        f"om-1  | {stamp} [om1-RangeCompactionService#0] INFO compaction.AbstractCompactor: "
+                        f"Compacting range KeyRange{{startKey='{start.decode()}', endKey='{end.decode()}'}} for table {cf}"
+                    )
+                self.compacted_to = self.oldest
+        if self.periodic_full_compaction and t_seconds - self.last_full_compaction >= FULL_COMPACTION_INTERVAL_S:
+            self.last_full_compaction = t_seconds
+            for table in self.tables.values():
+                table.compact_range(None, None)
+
+    def _sample(self, t_seconds):
+        tickers, histograms = parse_statistics(self.options.get_statistics() or "")
+        row = {"Time": START_TIME + pd.Timedelta(seconds=t_seconds)}
+        for metric, ticker in RATE_TICKERS.items():
+            row[metric] = (tickers.get(ticker, 0) - self.previous_tickers.get(ticker, 0)) / STEP_SECONDS
+        flush = histograms.get("rocksdb.db.flush.micros", (0.0,) * 6)
+        flushes = flush[4] - self.previous_flushes
+        row["Flush write median latency"] = row["Flush write bytes"] * STEP_SECONDS / flushes if flushes else 0.0
+        row["Flush time average"] = flush[5] / flush[4] if flush[4] else 0.0
+        self.previous_tickers = tickers
+        self.previous_flushes = flush[4]
+        row[KEY_COUNT_METRIC] = self.tables["keyTable"].property_int_value("rocksdb.estimate-num-keys")
+        row["DeletedTable Estimated number of keys"] = self.tables["deletedTable"].property_int_value(
+            "rocksdb.estimate-num-keys"
+        )
+        row["SST file total size"] = sum(
+            table.property_int_value("rocksdb.total-sst-files-size") or 0 for table in self.tables.values()
+        )
+        average, p50, p95, p99, peak = self.seeks.snapshot()
+        row.update({
+            "Seek average latency": average, "Seek median latency": p50, "Seek 95%-tile latency": p95,
+            "Seek 99%-tile latency": p99, "Seek max latency": peak,
+        })
+        get = histograms.get("rocksdb.db.get.micros", (0.0,) * 6)
+        row.update({
+            "DB get average latency": get[5] / get[4] if get[4] else 0.0,
+            "DB get median": get[0],
+            "DB get 95%-tile": get[1],
+            "DB get 99%-tile": get[2],
+        })
+        compaction = histograms.get("rocksdb.compaction.times.micros", (0.0,) * 6)
+        row["Compaction time average"] = compaction[5] / compaction[4] if compaction[4] else 0.0
+        self.samples.append(row)
+
+    def run(self, total_ops, progress=True):
+        """Execute total_ops operations, sampling metrics every 30 virtual seconds"""
+        operations = (self._create, self._delete, self._list)
+        choices = self.rng.choice(len(operations), size=total_ops, p=self.weights)
+        started = time.perf_counter()
+        for first in range(0, total_ops, self.ops_per_sample):
+            for op in choices[first:first + self.ops_per_sample].tolist():
+                operations[op]()
+            t_seconds = (first // self.ops_per_sample + 1) * STEP_SECONDS
+            self._compact(t_seconds)
+            self._sample(t_seconds)
+            if progress and len(self.samples) % 20 == 0:
+                done = min(first + self.ops_per_sample, total_ops)
+                print(f"  {done:>12,} ops  {len(self.samples):>5} samples  {time.perf_counter() - started:.1f}s")
+
+    def write(self, folder):
+        """Write the samples as one export per metric (and the range-compaction log) into folder"""
+        os.makedirs(folder, exist_ok=True)
+        frame = pd.DataFrame(self.samples)
+        for metric, family in HARNESS_METRICS.items():
+            write_export(os.path.join(folder, f"{metric}-data-{EXPORT_STAMP}.csv"), frame["Time"], frame[metric], family)
+        if self.range_log:
+            with open(os.path.join(folder, RANGE_LOG_NAME), "w") as f:
+                f.write("\n".join(self.range_log) + "\n")
+        return frame
+
+
+def run_experiment(out_dir, total_ops=DEFAULT_OPS, range_compaction=False, periodic_full_compaction=False,
+                   weights=DEFAULT_WEIGHTS, db_dir=None, keep_db=False, **harness_options):
+    """Run one configuration into out_dir/<canonical folder name>; returns the folder path"""
+    folder = os.path.join(out_dir, experiment_folder_name(total_ops, weights, range_compaction, periodic_full_compaction))
+    db_dir = db_dir or tempfile.mkdtemp(prefix="lsm-harness-")
+    harness = LSMHarness(db_dir, range_compaction, periodic_full_compaction, weights, **harness_options)
+    try:
+        harness.run(total_ops)
+    finally:
+        harness.close()
+    harness.write(folder)
+    if not keep_db:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    return folder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce the range-compaction experiments on an embedded RocksDB")
+    parser.add_argument("out_dir", help="Directory to write the experiment folders into")
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS, help="Operations per experiment")
+    parser.add_argument("--weights", default="20:8:1", help="create:delete:list mix")
+    parser.add_argument("--config", choices=["range", "none", "periodic", "all"], default="all",
+                        help="Compaction configuration(s) to run")
+    parser.add_argument("--ops-per-second", type=int, default=OPS_PER_SECOND, help="Virtual rate mapping ops to time")
+    parser.add_argument("--list-batch", type=int, default=LIST_BATCH, help="Keys walked per list operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-db", action="store_true", help="Keep the RocksDB directories for sst_properties.py")
+    args = parser.parse_args()
+
+    weights = tuple(int(w) for w in args.weights.split(":"))
+    configs = {"range": (True, False), "none": (False, False), "periodic": (False, True)}
+    selected = list(configs) if args.config == "all" else [args.config]
+    for name in selected:
+        range_compaction, periodic = configs[name]
+        print(f"\n{experiment_folder_name(args.ops, weights, range_compaction, periodic)}")
+        print("=" * 70)
+        started = time.perf_counter()
+        db_dir = tempfile.mkdtemp(prefix=f"lsm-harness-{name}-")
+        folder = run_experiment(args.out_dir, args.ops, range_compaction, periodic, weights, db_dir=db_dir,
+                                keep_db=args.keep_db, ops_per_second=args.ops_per_second,
+                                list_batch=args.list_batch, seed=args.seed)
+        print(f"Wrote {folder} in {time.perf_counter() - started:.1f}s" + (f" (DB kept in {db_dir})" if args.keep_db else ""))
+
+
+if __name__ == "__main__":
+    main()
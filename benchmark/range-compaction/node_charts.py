@@ -0,0 +1,82 @@
+"""
+Per-node charts for OM HA exports.
+Plots every instance column of a metric against that node's own KeyTable
+estimate, leader solid and followers dashed, with one panel per experiment,
+plus the cross-node sum/max when more than one instance is present.
+"""
+
+import argparse
+import os
+import re
+
+import matplotlib.pyplot as plt
+from benchmark_utils import (
+    BASE_PATH,
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    aggregate_instances,
+    get_metric_files,
+    instance_roles,
+    load_instance_series,
+    project_instances_onto_key_count,
+    project_onto_key_count,
+    save_chart,
+)
+
+OUT_DIR = os.path.join(BASE_PATH, "node_charts")
+
+
+def chart_filename(metric):
+    return re.sub(r"[^A-Za-z0-9_]", "_", metric.replace("µ", "u").replace(" ", "_")) + "_nodes.png"
+
+
+def plot_metric_by_node(metric, aggregates=("sum", "max")):
+    """One panel per experiment, one line per instance, over each node's own key count"""
+    _, axes = plt.subplots(1, len(EXPERIMENT_FOLDERS), figsize=(6 * len(EXPERIMENT_FOLDERS), 5), squeeze=False)
+    for ax, (experiment_name, folder_name) in zip(axes[0], EXPERIMENT_FOLDERS.items()):
+        projected = project_instances_onto_key_count(folder_name, metric)
+        if projected is None or projected.empty:
+            ax.set_visible(False)
+            continue
+
+        for (instance, role), df in projected.groupby(["instance", "role"], sort=False):
+            ax.plot(df["key_count"], df["value"], linestyle="-" if role == "leader" else "--",
+                    linewidth=1, label=f"{instance} ({role})")
+
+        if projected["instance"].nunique() > 1:
+            instances = load_instance_series(folder_name, metric)
+            key_counts = aggregate_instances(
+                load_instance_series(folder_name, KEY_COUNT_METRIC), "leader", instance_roles(folder_name)
+            )
+            for how in aggregates:
+                combined = project_onto_key_count(aggregate_instances(instances, how), key_counts)
+                ax.plot(combined["key_count"], combined["value"], linestyle=":", linewidth=1.5, label=f"all nodes ({how})")
+
+        ax.set_xscale("log")
+        ax.set_xlabel("Key Count (own KeyTable estimate)")
+        ax.set_ylabel(f"{metric} ({projected.attrs.get('kind', 'count')})")
+        ax.set_title(experiment_name, fontsize=10)
+        ax.legend(fontsize=8)
+        ax.grid(True, alpha=0.3)
+
+    plt.suptitle(f"{metric} by OM Node", fontweight="bold")
+    os.makedirs(OUT_DIR, exist_ok=True)
+    save_chart(os.path.join(OUT_DIR, chart_filename(metric)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart every OM instance of each metric separately")
+    parser.add_argument("--metric", action="append", default=None, help="Metric to chart (repeatable, default: all)")
+    args = parser.parse_args()
+
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        roles = instance_roles(folder_name)
+        print(f"{experiment_name}: " + ", ".join(f"{i} ({r})" for i, r in roles.items()))
+
+    metrics = args.metric or sorted(set().union(*(get_metric_files(f) for f in EXPERIMENT_FOLDERS.values())))
+    for metric in metrics:
+        plot_metric_by_node(metric)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Streaming statistics for long metric series.
+Time-based windows (not sample counts) with O(1) amortized work per point:
+Welford mean/variance (mergeable with Chan's formula), time-decayed EWMA that
+handles irregular sampling, and KLL quantile sketches for rolling p50/p95/p99.
+CSV exports are read in chunks, so bands are produced without holding a full
+series in memory.
+"""
+
+import argparse
+import math
+import random
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import get_metric_files, parse_metric_values
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Welford:
+    """Running count, mean and variance; merge() combines partial results (Chan et al.)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+
+class EWMA:
+    """Exponentially weighted moving average with a time constant, so gaps decay correctly"""
+
+    def __init__(self, tau_seconds):
+        self.tau = tau_seconds
+        self.value = float("nan")
+        self.last_time = None
+
+    def update(self, t_seconds, x):
+        if self.last_time is None:
+            self.value = x
+        else:
+            alpha = 1.0 - math.exp(-max(t_seconds - self.last_time, 0.0) / self.tau)
+            self.value += alpha * (x - self.value)
+        self.last_time = t_seconds
+        return self.value
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang, Liberty 2016) with mergeable compactors
+
+    Level h holds items of weight 2^h; a full level is sorted and every other item,
+    from a random offset, is promoted to the next level.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        # Per-sketch generators only when reproducibility is asked for; they are costly to seed
+        self.rng = random.Random(seed) if seed is not None else random
+        self.compactors = [[]]
+        self.size = 0
+        self.max_size = self._capacity(0)
+
+    def _capacity(self, height):
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _compress(self):
+        for height, items in enumerate(self.compactors):
+            if len(items) < self._capacity(height):
+                continue
+            if height + 1 == len(self.compactors):
+                self.compactors.append([])
+            items.sort()
+            # An odd leftover stays behind so the promoted weight is exact
+            keep = [items.pop()] if len(items) % 2 else []
+            self.compactors[height + 1].extend(items[self.rng.random() < 0.5::2])
+            self.compactors[height] = keep
+            self.size = sum(len(c) for c in self.compactors)
+            self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+            if self.size < self.max_size:
+                break
+
+    def update(self, x):
+        self.compactors[0].append(x)
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for height, items in enumerate(other.compactors):
+            self.compactors[height].extend(items)
+        self.size = sum(len(c) for c in self.compactors)
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+        while self.size >= self.max_size:
+            self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Estimated quantiles for the given fractions (NaN if empty)"""
+        items = np.concatenate([np.asarray(c, dtype=float) for c in self.compactors])
+        if len(items) == 0:
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate([np.full(len(c), 2.0**h) for h, c in enumerate(self.compactors)])
+        order = np.argsort(items)
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side="left")
+        return items[order][np.clip(positions, 0, len(items) - 1)]
+
+
+class WindowedStats:
+    """Trailing time-window statistics built from fixed-width time buckets
+
+    Points update the current bucket in O(1); when a bucket closes, the buckets in
+    the window are merged once and a row (time, count, mean, std, ewma, quantiles)
+    is emitted, so the cost per point stays O(1) amortized.
+    """
+
+    def __init__(self, window_seconds, buckets_per_window=10, quantiles=DEFAULT_QUANTILES, ewma_tau=None, k=200):
+        self.window = window_seconds
+        self.width = window_seconds / buckets_per_window
+        self.buckets_per_window = buckets_per_window
+        self.quantiles = quantiles
+        self.k = k
+        self.ewma = EWMA(ewma_tau or window_seconds)
+        self.buckets = []  # (bucket index, Welford, KLLSketch)
+        self.current = None
+
+    def _new_bucket(self, index):
+        return index, Welford(), KLLSketch(self.k)
+
+    def _emit(self):
+        index = self.current[0]
+        first = index - self.buckets_per_window + 1
+        self.buckets = [b for b in self.buckets if b[0] >= first] + [self.current]
+        moments, sketch = Welford(), KLLSketch(self.k)
+        for _, bucket_moments, bucket_sketch in self.buckets:
+            moments.merge(bucket_moments)
+            sketch.merge(bucket_sketch)
+        row = {
+            "time": pd.Timestamp((index + 1) * self.width, unit="s"),
+            "count": moments.count,
+            "mean": moments.mean if moments.count else float("nan"),
+            "std": math.sqrt(moments.variance) if moments.count > 1 else float("nan"),
+            "ewma": self.ewma.value,
+        }
+        row.update({f"p{round(q * 100)}": v for q, v in zip(self.quantiles, sketch.quantiles(self.quantiles))})
+        return row
+
+    def update(self, t_seconds, x):
+        """Add one point (non-decreasing time); returns rows for buckets that closed"""
+        rows = []
+        index = int(t_seconds // self.width)
+        if self.current is not None and index != self.current[0]:
+            rows.append(self._emit())
+            self.current = None
+        if self.current is None:
+            self.current = self._new_bucket(index)
+        if not math.isnan(x):
+            self.current[1].update(x)
+            self.current[2].update(x)
+            self.ewma.update(t_seconds, x)
+        return rows
+
+    def flush(self):
+        rows = [self._emit()] if self.current is not None else []
+        self.current = None
+        return rows
+
+
+def iter_csv_chunks(csv_path, chunksize=4096):
+    """Yield (unix seconds, {instance: values in base units}, kind) per chunk of an export"""
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        seconds = pd.to_datetime(chunk["Time"]).to_numpy().astype("datetime64[ns]").view(np.int64) / 1e9
+        columns, kind = {}, "count"
+        for instance in chunk.columns[1:]:
+            columns[instance], column_kind = parse_metric_values(chunk[instance])
+            kind = column_kind if column_kind != "count" else kind
+        yield seconds, columns, kind
+
+
+def stream_bands(csv_path, window_seconds=300, quantiles=DEFAULT_QUANTILES, ewma_tau=None, chunksize=4096):
+    """Rolling bands per instance of one export, read chunk by chunk"""
+    windows, rows = {}, []
+    for seconds, columns, _ in iter_csv_chunks(csv_path, chunksize):
+        for instance, values in columns.items():
+            stats = windows.setdefault(instance, WindowedStats(window_seconds, quantiles=quantiles, ewma_tau=ewma_tau))
+            for t, x in zip(seconds.tolist(), values.tolist()):
+                rows.extend(dict(row, instance=instance) for row in stats.update(t, x))
+    for instance, stats in windows.items():
+        rows.extend(dict(row, instance=instance) for row in stats.flush())
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream rolling mean/std/EWMA/percentile bands for one metric")
+    parser.add_argument("folder", help="Experiment folder")
+    parser.add_argument("metric", help="Metric name")
+    parser.add_argument("--window-minutes", type=float, default=5.0)
+    parser.add_argument("--out", default=None, help="Write the bands to this CSV file")
+    args = parser.parse_args()
+
+    csv_path = get_metric_files(args.folder).get(args.metric)
+    if csv_path is None:
+        print(f"No export for '{args.metric}' in {args.folder}")
+        return
+
+    bands = stream_bands(csv_path, args.window_minutes * 60)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(bands.tail(20).to_string(index=False, float_format="%.4g"))
+    if args.out:
+        bands.to_csv(args.out, index=False)
+        print(f"\nBands saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Profiling hooks for the analysis pipeline.
+Named stage spans (load, parse, align, derive, smooth, render, savefig) record
+wall time, CPU time, peak RSS, tracemalloc allocation deltas and row counts.
+Spans are free when profiling is off; with --profile a script writes a JSON
+trace and a Chrome trace-event file (chrome://tracing, Perfetto) and prints a
+per-stage summary on exit.
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024**2
+
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler:
+    """Collects nested spans; tracemalloc peaks are tracked per span without losing the parent's"""
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.stack = []
+        self.origin = time.perf_counter_ns()
+
+    def enable(self, trace_memory=True):
+        self.enabled = True
+        self.origin = time.perf_counter_ns()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def span(self, name, detail=None, rows=None):
+        if not self.enabled:
+            yield
+            return
+
+        record = {"name": name, "detail": detail, "depth": len(self.stack), "rows": rows}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                # Fold the parent's peak so far in before resetting it for this span
+                self.stack[-1]["_peak"] = max(self.stack[-1]["_peak"], peak)
+            tracemalloc.reset_peak()
+            record["_start_memory"] = record["_peak"] = current
+        rss_before = _peak_rss()
+        self.stack.append(record)
+        start_wall, start_cpu = time.perf_counter_ns(), time.process_time_ns()
+        try:
+            yield
+        finally:
+            record["start_us"] = (start_wall - self.origin) / 1e3
+            record["wall_s"] = (time.perf_counter_ns() - start_wall) / 1e9
+            record["cpu_s"] = (time.process_time_ns() - start_cpu) / 1e9
+            rss_after = _peak_rss()
+            record["peak_rss_mb"] = rss_after / MB if rss_after is not None else None
+            record["rss_growth_mb"] = (rss_after - rss_before) / MB if rss_after is not None else None
+            self.stack.pop()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, record.pop("_peak"))
+                start_memory = record.pop("_start_memory")
+                record["alloc_mb"] = (current - start_memory) / MB
+                record["alloc_peak_mb"] = (peak - start_memory) / MB
+                if self.stack:
+                    self.stack[-1]["_peak"] = max(self.stack[-1]["_peak"], peak)
+            self.spans.append(record)
+
+    def add_rows(self, rows):
+        """Count rows against the innermost open span"""
+        if self.enabled and self.stack:
+            self.stack[-1]["rows"] = (self.stack[-1]["rows"] or 0) + rows
+
+    def write_trace(self, path):
+        with open(path, "w") as f:
+            json.dump({"spans": self.spans, "stages": summarize(self.spans)}, f, indent=1)
+
+    def write_chrome_trace(self, path):
+        pid, tid = os.getpid(), threading.get_ident()
+        events = [
+            {
+                "name": f"{s['name']} {s['detail']}" if s["detail"] else s["name"],
+                "cat": s["name"],
+                "ph": "X",
+                "ts": s["start_us"],
+                "dur": s["wall_s"] * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {k: v for k, v in s.items() if k not in ("name", "start_us", "depth") and v is not None},
+            }
+            for s in self.spans
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def report(self, prefix):
+        """Write <prefix>.json and <prefix>.trace.json and print the stage summary"""
+        if not self.spans:
+            return
+        self.write_trace(f"{prefix}.json")
+        self.write_chrome_trace(f"{prefix}.trace.json")
+        print_summary(summarize(self.spans), (time.perf_counter_ns() - self.origin) / 1e9)
+        print(f"Profile saved as '{prefix}.json' and '{prefix}.trace.json'")
+
+
+def summarize(spans):
+    """Per-stage totals: calls, wall/CPU seconds, rows, net allocation and peaks (inclusive of nested spans)"""
+    stages = {}
+    for s in spans:
+        stage = stages.setdefault(
+            s["name"],
+            {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0, "alloc_mb": 0.0, "alloc_peak_mb": 0.0, "peak_rss_mb": 0.0},
+        )
+        stage["calls"] += 1
+        stage["wall_s"] += s["wall_s"]
+        stage["cpu_s"] += s["cpu_s"]
+        stage["rows"] += s["rows"] or 0
+        stage["alloc_mb"] += s.get("alloc_mb", 0.0)
+        stage["alloc_peak_mb"] = max(stage["alloc_peak_mb"], s.get("alloc_peak_mb", 0.0))
+        stage["peak_rss_mb"] = max(stage["peak_rss_mb"], s["peak_rss_mb"] or 0.0)
+    return dict(sorted(stages.items(), key=lambda item: -item[1]["wall_s"]))
+
+
+def print_summary(stages, total_seconds=None):
+    print("\n" + "=" * 70)
+    print("PROFILE BY STAGE (nested spans are included in their parents)")
+    print("=" * 70)
+    print(f"{'Stage':<10} {'Calls':>6} {'Wall s':>9} {'CPU s':>9} {'Rows':>10} {'Alloc MB':>9} {'Peak MB':>8} {'RSS MB':>8}")
+    for name, s in stages.items():
+        print(
+            f"{name:<10} {s['calls']:>6} {s['wall_s']:>9.3f} {s['cpu_s']:>9.3f} {s['rows']:>10,} "
+            f"{s['alloc_mb']:>9.1f} {s['alloc_peak_mb']:>8.1f} {s['peak_rss_mb']:>8.0f}"
+        )
+    if total_seconds is not None:
+        print(f"Total run time: {total_seconds:.3f}s")
+
+
+PROFILER = Profiler()
+span = PROFILER.span
+add_rows = PROFILER.add_rows
+
+
+def profile_from_argv(name, argv=None):
+    """Enable profiling when --profile is on the command line; the report is written at exit
+
+    --profile-dir sets where <name>_profile.json and <name>_profile.trace.json go.
+    Returns whether profiling is on.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-dir", default=".")
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.profile:
+        PROFILER.enable()
+        os.makedirs(args.profile_dir, exist_ok=True)
+        atexit.register(PROFILER.report, os.path.join(args.profile_dir, f"{name}_profile"))
+    return args.profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the stage summary of a saved profile")
+    parser.add_argument("trace", help="JSON trace written with --profile")
+    args = parser.parse_args()
+
+    with open(args.trace) as f:
+        spans = json.load(f)["spans"]
+    print_summary(summarize(spans))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Local results database for archived benchmark runs.
+Every experiment folder is ingested once into an SQLite file: one row per
+(experiment, metric, instance, time) sample in base units, with the KeyTable
+estimate at that time, and the configuration parsed from the folder name as
+columns. Exports are streamed in chunks, and rolling mean/std/EWMA/p50/p95/p99
+bands are computed during ingest. Range and aggregate queries return NumPy arrays
+per (experiment, instance); percentiles are computed inside SQLite.
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    BASE_PATH,
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    get_metric_files,
+    parse_experiment_config,
+    parse_metric_values,
+)
+from online_stats import WindowedStats, iter_csv_chunks
+
+DEFAULT_DB_PATH = os.path.join(BASE_PATH, "results.sqlite")
+SQL_AGGREGATES = {"mean": "AVG", "min": "MIN", "max": "MAX", "sum": "SUM", "count": "COUNT"}
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99}
+BAND_WINDOW_SECONDS = 600
+BAND_BUCKETS = 5  # one band row per 2 minutes
+BAND_COLUMNS = ["count", "mean", "std", "ewma", "p50", "p95", "p99"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE NOT NULL,
+    total_ops INTEGER,
+    weights TEXT,
+    range_compaction INTEGER,
+    periodic_full_compaction INTEGER
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    kind TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    experiment_id INTEGER NOT NULL,
+    metric_id INTEGER NOT NULL,
+    instance TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    value REAL,
+    key_count REAL,
+    PRIMARY KEY (experiment_id, metric_id, instance, time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_by_key_count ON samples (metric_id, key_count);
+CREATE TABLE IF NOT EXISTS bands (
+    experiment_id INTEGER NOT NULL,
+    metric_id INTEGER NOT NULL,
+    instance TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    count INTEGER,
+    mean REAL,
+    std REAL,
+    ewma REAL,
+    p50 REAL,
+    p95 REAL,
+    p99 REAL,
+    PRIMARY KEY (experiment_id, metric_id, instance, time)
+) WITHOUT ROWID;
+"""
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def discover_experiments(root=None):
+    """Experiment folders to ingest
+
+    Defaults to EXPERIMENT_FOLDERS (RANGE_COMPACTION_EXPERIMENTS when set); with a root, any
+    directory under it holding Grafana CSV exports.
+    """
+    if root is None:
+        return sorted(EXPERIMENT_FOLDERS.values())
+    folders = {os.path.dirname(path) for path in glob.glob(os.path.join(root, "*", "*.csv"))}
+    return sorted(os.path.relpath(folder, BASE_PATH) for folder in folders)
+
+
+def _read_instances(csv_path):
+    """Parse every instance column of an export: (unix seconds, {instance: values}, kind)"""
+    df = pd.read_csv(csv_path)
+    seconds = pd.to_datetime(df["Time"]).to_numpy().astype("datetime64[s]").astype(np.int64)
+    columns, kind = {}, "count"
+    for instance in df.columns[1:]:
+        columns[instance], kind = parse_metric_values(df[instance])
+    return seconds, columns, kind
+
+
+def _metric_id(conn, name, kind):
+    conn.execute("INSERT OR IGNORE INTO metrics (name, kind) VALUES (?, ?)", (name, kind))
+    # A leading chunk of zeros reads as a plain count; a later chunk with units corrects it
+    conn.execute("UPDATE metrics SET kind = ? WHERE name = ? AND kind = 'count'", (kind, name))
+    return conn.execute("SELECT id FROM metrics WHERE name = ?", (name,)).fetchone()[0]
+
+
+def _nearest_key_counts(seconds, key_counts, instance):
+    """KeyTable estimate nearest in time to each sample, from the instance's own column when present"""
+    if key_counts is None:
+        return np.full(len(seconds), np.nan)
+    key_seconds, key_columns, _ = key_counts
+    key_values = key_columns.get(instance, next(iter(key_columns.values())))
+    has_key = ~np.isnan(key_values)
+    key_seconds, key_values = key_seconds[has_key], key_values[has_key]
+    if len(key_seconds) == 0:
+        return np.full(len(seconds), np.nan)
+    if len(key_seconds) == 1:
+        return np.full(len(seconds), key_values[0])
+    idx = np.clip(np.searchsorted(key_seconds, seconds), 1, len(key_seconds) - 1)
+    before = np.abs(seconds - key_seconds[idx - 1]) <= np.abs(key_seconds[idx] - seconds)
+    return key_values[np.where(before, idx - 1, idx)]
+
+
+def ingest_experiment(conn, folder_name, refresh=False):
+    """Stream one experiment folder in; returns the number of samples written (0 if already present)"""
+    row = conn.execute("SELECT id FROM experiments WHERE folder = ?", (folder_name,)).fetchone()
+    if row is not None and not refresh:
+        return 0
+    if row is not None:
+        conn.execute("DELETE FROM samples WHERE experiment_id = ?", (row[0],))
+        conn.execute("DELETE FROM bands WHERE experiment_id = ?", (row[0],))
+        conn.execute("DELETE FROM experiments WHERE id = ?", (row[0],))
+
+    try:
+        config = parse_experiment_config(folder_name)
+    except (ValueError, IndexError):
+        config = {"total_ops": None, "weights": None, "range_compaction": None, "periodic_full_compaction": None}
+    experiment_id = conn.execute(
+        "INSERT INTO experiments (folder, total_ops, weights, range_compaction, periodic_full_compaction) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (folder_name, config["total_ops"], config["weights"], config["range_compaction"],
+         config["periodic_full_compaction"]),
+    ).lastrowid
+
+    files = get_metric_files(folder_name)
+    key_counts = _read_instances(files[KEY_COUNT_METRIC]) if KEY_COUNT_METRIC in files else None
+
+    written = 0
+    for metric, csv_path in files.items():
+        windows = {}
+        for seconds, columns, kind in iter_csv_chunks(csv_path):
+            seconds = seconds.astype(np.int64)
+            metric_id = _metric_id(conn, metric, kind)
+            for instance, values in columns.items():
+                valid = ~np.isnan(values)
+                keys = _nearest_key_counts(seconds[valid], key_counts, instance)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?)",
+                    zip([experiment_id] * len(keys), [metric_id] * len(keys), [instance] * len(keys),
+                        seconds[valid].tolist(), values[valid].tolist(), keys.tolist()),
+                )
+                written += len(keys)
+
+                stats = windows.setdefault(instance, WindowedStats(BAND_WINDOW_SECONDS, BAND_BUCKETS))
+                bands = [band for t, x in zip(seconds.tolist(), values.tolist()) for band in stats.update(t, x)]
+                _insert_bands(conn, experiment_id, metric_id, instance, bands)
+        for instance, stats in windows.items():
+            _insert_bands(conn, experiment_id, metric_id, instance, stats.flush())
+    conn.commit()
+    return written
+
+
+def _insert_bands(conn, experiment_id, metric_id, instance, bands):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO bands VALUES (?, ?, ?, ?{', ?' * len(BAND_COLUMNS)})",
+        [(experiment_id, metric_id, instance, int(band["time"].timestamp()), *(band[c] for c in BAND_COLUMNS))
+         for band in bands],
+    )
+
+
+def ingest_all(conn, folders=None, refresh=False):
+    """Ingest every discovered experiment folder not yet in the database"""
+    return {folder: ingest_experiment(conn, folder, refresh) for folder in folders or discover_experiments()}
+
+
+def _filters(experiments=None, instance=None, start=None, end=None, min_keys=None, max_keys=None, **config):
+    """SQL WHERE fragments and parameters shared by range and aggregate queries"""
+    clauses, params = [], []
+    if experiments:
+        clauses.append(f"e.folder IN ({','.join('?' * len(experiments))})")
+        params.extend(experiments)
+    if instance is not None:
+        clauses.append("s.instance = ?")
+        params.append(instance)
+    for column, op, value in (("s.time", ">=", start), ("s.time", "<=", end),
+                              ("s.key_count", ">=", min_keys), ("s.key_count", "<", max_keys)):
+        if value is not None:
+            clauses.append(f"{column} {op} ?")
+            params.append(int(pd.Timestamp(value).timestamp()) if column == "s.time" else value)
+    for column, value in config.items():
+        if value is not None:
+            clauses.append(f"e.{column} = ?")
+            params.append(value)
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+def query_range(conn, metric, **filters):
+    """Samples of one metric as {(experiment folder, instance): (datetime64 times, values, key counts)}"""
+    where, params = _filters(**filters)
+    rows = conn.execute(
+        "SELECT e.folder, s.instance, s.time, s.value, s.key_count FROM samples s "
+        "JOIN experiments e ON e.id = s.experiment_id JOIN metrics m ON m.id = s.metric_id "
+        f"WHERE m.name = ?{where} ORDER BY e.folder, s.instance, s.time",
+        [metric, *params],
+    ).fetchall()
+    if not rows:
+        return {}
+
+    data = np.array([r[2:] for r in rows], dtype=float)
+    # Rows arrive grouped by (folder, instance); split at each change of key
+    keys = [r[:2] for r in rows]
+    starts = [0] + [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]] + [len(keys)]
+    result = {}
+    for start, stop in zip(starts, starts[1:]):
+        part = data[start:stop]
+        result[keys[start]] = (part[:, 0].astype(np.int64).astype("datetime64[s]"), part[:, 1], part[:, 2])
+    return result
+
+
+def query_aggregate(conn, metric, agg="mean", **filters):
+    """One aggregate per experiment and instance: returns (folders, instances, values) arrays
+
+    Everything runs in SQL. p50/p95/p99 rank each series' values with window functions and
+    interpolate between the two neighbouring ranks, as np.percentile does.
+    """
+    where, params = _filters(**filters)
+    if agg in SQL_AGGREGATES:
+        rows = conn.execute(
+            f"SELECT e.folder, s.instance, {SQL_AGGREGATES[agg]}(s.value) FROM samples s "
+            "JOIN experiments e ON e.id = s.experiment_id JOIN metrics m ON m.id = s.metric_id "
+            f"WHERE m.name = ?{where} GROUP BY e.folder, s.instance ORDER BY e.folder, s.instance",
+            [metric, *params],
+        ).fetchall()
+    elif agg in PERCENTILES:
+        rows = conn.execute(
+            "WITH ranked AS ("
+            " SELECT e.folder, s.instance, s.value,"
+            " ROW_NUMBER() OVER (PARTITION BY e.folder, s.instance ORDER BY s.value) - 1 AS rank,"
+            " (COUNT(*) OVER (PARTITION BY e.folder, s.instance) - 1) * ? AS position"
+            " FROM samples s JOIN experiments e ON e.id = s.experiment_id JOIN metrics m ON m.id = s.metric_id"
+            f" WHERE m.name = ? AND s.value IS NOT NULL{where}) "
+            "SELECT folder, instance,"
+            " SUM(value * CASE WHEN rank = CAST(position AS INTEGER) THEN 1 - (position - rank)"
+            " ELSE position - CAST(position AS INTEGER) END) FROM ranked "
+            "WHERE rank IN (CAST(position AS INTEGER), CAST(position AS INTEGER) + 1) "
+            "GROUP BY folder, instance ORDER BY folder, instance",
+            [PERCENTILES[agg] / 100, metric, *params],
+        ).fetchall()
+    else:
+        raise ValueError(f"Unknown aggregate '{agg}'")
+    return (np.array([r[0] for r in rows]), np.array([r[1] for r in rows]),
+            np.array([r[2] for r in rows], dtype=float))
+
+
+def query_bands(conn, metric, experiments=None, instance=None):
+    """Rolling bands of one metric as {experiment folder: (datetime64 times, {column: values})}"""
+    where, params = _filters(experiments=experiments, instance=instance)
+    rows = conn.execute(
+        f"SELECT e.folder, s.time, {', '.join('s.' + c for c in BAND_COLUMNS)} FROM bands s "
+        "JOIN experiments e ON e.id = s.experiment_id JOIN metrics m ON m.id = s.metric_id "
+        f"WHERE m.name = ?{where} ORDER BY e.folder, s.instance, s.time",
+        [metric, *params],
+    ).fetchall()
+    result = {}
+    for folder in dict.fromkeys(r[0] for r in rows):
+        data = np.array([r[1:] for r in rows if r[0] == folder], dtype=float)
+        times = data[:, 0].astype(np.int64).astype("datetime64[s]")
+        result[folder] = (times, {c: data[:, i + 1] for i, c in enumerate(BAND_COLUMNS)})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest and query the local benchmark results database")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Load experiment folders (default: all discovered)")
+    ingest.add_argument("folders", nargs="*")
+    ingest.add_argument("--refresh", action="store_true", help="Re-ingest folders already in the database")
+
+    query = subparsers.add_parser("query", help="Aggregate one metric per experiment")
+    query.add_argument("metric")
+    query.add_argument("--agg", default="mean", choices=list(SQL_AGGREGATES) + list(PERCENTILES))
+    query.add_argument("--instance", default=None, help="Only this instance column (default: every instance)")
+    query.add_argument("--min-keys", type=float, default=None)
+    query.add_argument("--max-keys", type=float, default=None)
+    query.add_argument("--start", default=None, help="Start time, e.g. 2025-06-10T12:00")
+    query.add_argument("--end", default=None)
+    query.add_argument("--range-compaction", type=int, choices=[0, 1], default=None)
+    query.add_argument("--periodic-full-compaction", type=int, choices=[0, 1], default=None)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "ingest":
+        for folder, written in ingest_all(conn, args.folders, args.refresh).items():
+            print(f"{folder}: {written:,} samples" if written else f"{folder}: already ingested")
+        return
+
+    folders, instances, values = query_aggregate(
+        conn, args.metric, args.agg, instance=args.instance, min_keys=args.min_keys, max_keys=args.max_keys,
+        start=args.start, end=args.end, range_compaction=args.range_compaction,
+        periodic_full_compaction=args.periodic_full_compaction,
+    )
+    if len(folders) == 0:
+        print("No matching samples")
+        return
+    print(f"{args.agg} of {args.metric}:")
+    for folder, instance, value in zip(folders, instances, values):
+        print(f"  {folder:<75} {instance:<30} {value:14.4g}")
+
+
+if __name__ == "__main__":
+    main()
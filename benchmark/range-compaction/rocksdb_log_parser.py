@@ -0,0 +1,231 @@
+"""
+RocksDB LOG parser for per-job compaction and flush timelines.
+Reads the OM DB `LOG` through mmap, extracts the EVENT_LOG_v1 JSON lines in
+parallel chunks and joins them into one columnar event table (one row per job).
+"""
+
+import argparse
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import split_file_chunks
+
+EVENT_MARKER = b"EVENT_LOG_v1 "
+
+# Events we keep, and the fields pulled out of each one
+EVENT_FIELDS = {
+    "compaction_started": ("job", "time_micros", "input_data_size", "compaction_reason", "cf_name"),
+    "compaction_finished": (
+        "job",
+        "time_micros",
+        "compaction_time_micros",
+        "output_level",
+        "total_output_size",
+        "num_input_records",
+        "num_output_records",
+        "cf_name",
+    ),
+    "flush_started": ("job", "time_micros", "total_data_size", "num_entries", "num_deletes", "flush_reason", "cf_name"),
+    "flush_finished": ("job", "time_micros", "cf_name"),
+    "table_file_creation": ("job", "file_size", "cf_name"),
+}
+
+EVENT_TYPES = ["flush", "compaction"]
+
+
+def parse_chunk(file_path, start, end):
+    """Parse the EVENT_LOG_v1 lines found in one byte range of a LOG file"""
+    events = {name: [] for name in EVENT_FIELDS}
+
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while True:
+            idx = mm.find(EVENT_MARKER, pos, end)
+            if idx == -1:
+                break
+            line_end = mm.find(b"\n", idx, end)
+            if line_end == -1:
+                line_end = end
+            pos = line_end + 1
+
+            try:
+                event = json.loads(mm[idx + len(EVENT_MARKER):line_end])
+            except ValueError:
+                # Truncated line at the end of a LOG that is still being written
+                continue
+
+            fields = EVENT_FIELDS.get(event.get("event"))
+            if fields is None:
+                continue
+            events[event["event"]].append(tuple(event.get(field) for field in fields))
+
+    return events
+
+
+def parse_log_events(file_path, workers=None):
+    """Parse a LOG file in parallel and return the raw events grouped by event name"""
+    workers = workers or os.cpu_count() or 1
+    chunks = split_file_chunks(file_path, workers * 4)
+    events = {name: [] for name in EVENT_FIELDS}
+
+    if workers == 1 or len(chunks) <= 1:
+        results = (parse_chunk(file_path, start, end) for start, end in chunks)
+        for result in results:
+            for name, rows in result.items():
+                events[name].extend(rows)
+        return events
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_chunk, file_path, start, end) for start, end in chunks]
+        # Chunks are merged in file order so job ids stay in LOG order
+        for future in futures:
+            for name, rows in future.result().items():
+                events[name].extend(rows)
+
+    return events
+
+
+def _events_frame(events, name):
+    """Build a DataFrame for one raw event type"""
+    return pd.DataFrame(events[name], columns=list(EVENT_FIELDS[name]))
+
+
+def _intern(values):
+    """Intern string values into a categorical column"""
+    return pd.Categorical(values.fillna("").astype(str))
+
+
+def build_event_table(events):
+    """Join raw events into a columnar table with one row per flush or compaction job"""
+    started = _events_frame(events, "compaction_started")
+    finished = _events_frame(events, "compaction_finished")
+    compactions = finished.merge(
+        started, on="job", how="left", suffixes=("", "_started")
+    )
+    compactions = pd.DataFrame(
+        {
+            "event": "compaction",
+            "job": compactions["job"],
+            "start_us": compactions["time_micros_started"].fillna(
+                compactions["time_micros"] - compactions["compaction_time_micros"]
+            ),
+            "duration_us": compactions["compaction_time_micros"],
+            "level": compactions["output_level"],
+            "input_bytes": compactions["input_data_size"],
+            "output_bytes": compactions["total_output_size"],
+            "records_in": compactions["num_input_records"],
+            "records_dropped": compactions["num_input_records"] - compactions["num_output_records"],
+            "deletes": np.nan,
+            "reason": compactions["compaction_reason"],
+            "cf": compactions["cf_name"].fillna(compactions["cf_name_started"]),
+        }
+    )
+
+    flush_started = _events_frame(events, "flush_started")
+    flush_finished = _events_frame(events, "flush_finished")
+    # Flush output size is only reported through the table files it creates
+    files = _events_frame(events, "table_file_creation")
+    flush_files = files[files["job"].isin(flush_started["job"])]
+    flush_output = flush_files.groupby("job", as_index=False).agg(
+        output_bytes=("file_size", "sum"), file_cf=("cf_name", "first")
+    )
+    flushes = flush_started.merge(
+        flush_finished, on="job", how="left", suffixes=("", "_finished")
+    ).merge(flush_output, on="job", how="left")
+    flushes = pd.DataFrame(
+        {
+            "event": "flush",
+            "job": flushes["job"],
+            "start_us": flushes["time_micros"],
+            "duration_us": flushes["time_micros_finished"] - flushes["time_micros"],
+            "level": 0,
+            "input_bytes": flushes["total_data_size"],
+            "output_bytes": flushes["output_bytes"],
+            "records_in": flushes["num_entries"],
+            "records_dropped": np.nan,
+            "deletes": flushes["num_deletes"],
+            "reason": flushes["flush_reason"],
+            "cf": flushes["cf_name"].fillna(flushes["cf_name_finished"]).fillna(flushes["file_cf"]),
+        }
+    )
+
+    frames = [df for df in (flushes, compactions) if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    table = pd.concat(frames, ignore_index=True)
+    table = table.sort_values("start_us", kind="stable").reset_index(drop=True)
+    return pd.DataFrame(
+        {
+            "event": pd.Categorical(table["event"], categories=EVENT_TYPES),
+            "job": table["job"].astype(np.int64),
+            "start_us": table["start_us"].astype(np.int64),
+            "duration_us": table["duration_us"].fillna(-1).astype(np.int64),
+            "level": table["level"].fillna(-1).astype(np.int8),
+            "input_bytes": table["input_bytes"].fillna(0).astype(np.int64),
+            "output_bytes": table["output_bytes"].fillna(0).astype(np.int64),
+            "records_in": table["records_in"].fillna(0).astype(np.int64),
+            "records_dropped": table["records_dropped"].fillna(0).astype(np.int64),
+            "deletes": table["deletes"].fillna(0).astype(np.int64),
+            "reason": _intern(table["reason"]),
+            "cf": _intern(table["cf"]),
+        }
+    )
+
+
+def read_rocksdb_log(file_path, workers=None):
+    """Parse a RocksDB LOG file into the per-job event table"""
+    return build_event_table(parse_log_events(file_path, workers))
+
+
+def summarize_events(table):
+    """Summarize the event table per event type, column family and output level"""
+    if table.empty:
+        return table
+
+    table = table.assign(duration_us=table["duration_us"].where(table["duration_us"] >= 0))
+    grouped = table.groupby(["event", "cf", "level"], observed=True)
+    summary = grouped.agg(
+        jobs=("job", "count"),
+        input_mb=("input_bytes", "sum"),
+        output_mb=("output_bytes", "sum"),
+        records_in=("records_in", "sum"),
+        records_dropped=("records_dropped", "sum"),
+        mean_duration_ms=("duration_us", "mean"),
+        max_duration_ms=("duration_us", "max"),
+    )
+    summary["input_mb"] /= 1024 * 1024
+    summary["output_mb"] /= 1024 * 1024
+    summary["mean_duration_ms"] /= 1000
+    summary["max_duration_ms"] /= 1000
+    return summary.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse RocksDB LOG files into per-job compaction/flush events")
+    parser.add_argument("logs", nargs="+", help="RocksDB LOG files (one per experiment)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--out", default=None, help="Write the combined event table to this CSV file")
+    args = parser.parse_args()
+
+    tables = []
+    for log_path in args.logs:
+        table = read_rocksdb_log(log_path, args.workers)
+        print(f"\n{log_path}: {len(table)} jobs")
+        print("=" * 70)
+        if table.empty:
+            continue
+        print(summarize_events(table).to_string(index=False, float_format="%.2f"))
+        tables.append(table.assign(log=log_path))
+
+    if args.out and tables:
+        pd.concat(tables, ignore_index=True).to_csv(args.out, index=False)
+        print(f"Event table saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
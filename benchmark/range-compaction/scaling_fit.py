@@ -0,0 +1,240 @@
+"""
+Scaling-law fitting of metrics against key count.
+Every (experiment, metric) series is projected onto the KeyTable estimate and
+binned on a shared log-spaced key-count grid; power-law and segmented (hinge)
+models are then fitted to all series at once in log-log space, and extrapolated
+to 10^8 / 10^9 keys with residual-bootstrap confidence bands.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    create_magnitude_label,
+    list_metrics,
+    load_metric_series,
+    project_onto_key_count,
+)
+
+EXTRAPOLATION_TARGETS = [10**8, 10**9]
+MIN_KEY_COUNT = 10**4
+BINS_PER_DECADE = 8
+MIN_POINTS_PER_SEGMENT = 3
+
+
+def key_count_matrix(metrics=None, bins_per_decade=BINS_PER_DECADE):
+    """Bin every (experiment, metric) series on a shared log10 key-count grid
+
+    Returns (labels, log10 bin centers, log10 median values) with NaN for empty bins.
+    """
+    binned = {}
+    max_key_count = MIN_KEY_COUNT * 10
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        key_count = load_metric_series(folder_name, KEY_COUNT_METRIC)
+        if key_count is None:
+            continue
+        max_key_count = max(max_key_count, key_count["value"].max())
+        for metric in metrics or list_metrics(folder_name):
+            if metric == KEY_COUNT_METRIC:
+                continue
+            series = load_metric_series(folder_name, metric)
+            if series is not None and not series.empty:
+                binned[(experiment_name, metric)] = project_onto_key_count(series, key_count)
+
+    edges = np.arange(np.log10(MIN_KEY_COUNT), np.log10(max_key_count) + 1 / bins_per_decade, 1 / bins_per_decade)
+    centers = (edges[:-1] + edges[1:]) / 2
+    labels = list(binned)
+    matrix = np.full((len(labels), len(centers)), np.nan)
+    for row, label in enumerate(labels):
+        df = binned[label]
+        df = df[(df["key_count"] >= MIN_KEY_COUNT) & (df["value"] > 0)]
+        bins = np.digitize(np.log10(df["key_count"].to_numpy()), edges) - 1
+        medians = pd.Series(df["value"].to_numpy()).groupby(bins).median()
+        medians = medians[(medians.index >= 0) & (medians.index < len(centers))]
+        matrix[row, medians.index.to_numpy()] = np.log10(medians.to_numpy())
+
+    return labels, centers, matrix
+
+
+def fit_power_law(x, y):
+    """Masked least squares of y = a + b x for every row of y (NaN = missing), batched over leading axes"""
+    w = ~np.isnan(y)
+    yz = np.where(w, y, 0.0)
+    n = w.sum(-1)
+    sx = (w * x).sum(-1)
+    sy = yz.sum(-1)
+    sxx = (w * x * x).sum(-1)
+    sxy = (yz * x).sum(-1)
+    denom = n * sxx - sx**2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b = (n * sxy - sx * sy) / denom
+        a = (sy - b * sx) / n
+    sse = np.where(w, (y - a[..., None] - b[..., None] * x) ** 2, 0.0).sum(-1)
+    return a, b, sse
+
+
+def _hinge_features(x, knots):
+    """Design matrices [1, x, max(0, x - knot)] for every knot, shape (knots, points, 3)"""
+    x = np.broadcast_to(x, (len(knots), len(x)))
+    return np.stack([np.ones_like(x), x, np.maximum(0.0, x - knots[:, None])], axis=-1)
+
+
+def _solve_hinge(features, w, y):
+    """Batched weighted normal equations for hinge models, returns coefficients (..., 3)"""
+    yz = np.where(w, y, 0.0)
+    ata = np.einsum("...t,...ti,...tj->...ij", w.astype(float), features, features)
+    atb = np.einsum("...t,...ti->...i", yz, features)
+    # A tiny ridge keeps degenerate knots (all points on one side) solvable
+    ata += np.eye(3) * 1e-9
+    return np.linalg.solve(ata, atb[..., None])[..., 0]
+
+
+def fit_segmented(x, y):
+    """Fit a continuous two-segment log-log model for every row, choosing the knot by SSE
+
+    Returns (coefficients (rows, 3), knot, sse).
+    """
+    w = ~np.isnan(y)
+    knots = x[MIN_POINTS_PER_SEGMENT:-MIN_POINTS_PER_SEGMENT]
+    if len(knots) == 0:
+        knots = x[len(x) // 2:len(x) // 2 + 1]
+    features = _hinge_features(x, knots)  # (K, T, 3)
+
+    coef = _solve_hinge(features[None], w[:, None, :], y[:, None, :])  # (S, K, 3)
+    fitted = np.einsum("ktj,skj->skt", features, coef)
+    sse = np.where(w[:, None, :], (y[:, None, :] - fitted) ** 2, 0.0).sum(-1)
+
+    # Each segment needs enough observed points to be meaningful
+    left = (w[:, None, :] & (x[None, None, :] <= knots[None, :, None])).sum(-1)
+    right = (w[:, None, :] & (x[None, None, :] > knots[None, :, None])).sum(-1)
+    sse = np.where((left >= MIN_POINTS_PER_SEGMENT) & (right >= MIN_POINTS_PER_SEGMENT), sse, np.inf)
+
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(len(y))
+    return coef[rows, best], knots[best], sse[rows, best]
+
+
+def _bic(sse, n, params):
+    """Gaussian BIC from residual sum of squares"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return n * np.log(np.maximum(sse, 1e-12) / n) + params * np.log(n)
+
+
+def bootstrap_extrapolation(x, y, use_hinge, coef, knots, targets, samples=1000, seed=0):
+    """Residual bootstrap of the chosen model; returns predictions (samples, rows, targets) in log10"""
+    rng = np.random.default_rng(seed)
+    w = ~np.isnan(y)
+    features = _hinge_features(x, knots)  # (S, T, 3), one knot per row
+    fitted = np.einsum("stj,sj->st", features, coef)
+    residuals = np.where(w, y - fitted, np.nan)
+
+    # Draw residual positions among each row's observed points
+    order = np.argsort(~w, axis=1, kind="stable")
+    counts = w.sum(1)
+    draws = (rng.random((samples, *y.shape)) * counts[None, :, None]).astype(int)
+    picked = np.take_along_axis(np.broadcast_to(order, draws.shape), draws, axis=2)
+    resampled = np.take_along_axis(np.broadcast_to(residuals, draws.shape), picked, axis=2)
+    y_star = np.where(w, fitted + resampled, np.nan)
+
+    target_x = np.log10(np.asarray(targets, dtype=float))
+    a, b, _ = fit_power_law(x, y_star)
+    power_pred = a[..., None] + b[..., None] * target_x
+
+    hinge_coef = _solve_hinge(features[None], w[None], y_star)  # (B, S, 3)
+    target_features = np.stack(
+        [np.ones((len(knots), len(target_x))), np.broadcast_to(target_x, (len(knots), len(target_x))),
+         np.maximum(0.0, target_x[None, :] - knots[:, None])],
+        axis=-1,
+    )
+    hinge_pred = np.einsum("stj,bsj->bst", target_features, hinge_coef)
+    return np.where(use_hinge[None, :, None], hinge_pred, power_pred)
+
+
+def fit_scaling_laws(metrics=None, targets=EXTRAPOLATION_TARGETS, samples=1000):
+    """Fit and extrapolate every metric of every experiment; returns one row per series"""
+    labels, x, y = key_count_matrix(metrics)
+    n = (~np.isnan(y)).sum(1)
+    keep = n >= 2 * MIN_POINTS_PER_SEGMENT
+    labels = [label for label, k in zip(labels, keep) if k]
+    y, n = y[keep], n[keep]
+    if len(labels) == 0:
+        return pd.DataFrame()
+
+    a, b, sse_power = fit_power_law(x, y)
+    coef, knots, sse_hinge = fit_segmented(x, y)
+    use_hinge = _bic(sse_hinge, n, 4) < _bic(sse_power, n, 2)
+    # Express the power law as a hinge model with zero slope change
+    coef = np.where(use_hinge[:, None], coef, np.stack([a, b, np.zeros_like(a)], axis=1))
+
+    predictions = bootstrap_extrapolation(x, y, use_hinge, coef, knots, targets, samples)
+    target_x = np.log10(np.asarray(targets, dtype=float))
+    point = coef[:, 0:1] + coef[:, 1:2] * target_x + coef[:, 2:3] * np.maximum(0.0, target_x - knots[:, None])
+    lower, upper = np.percentile(predictions, [2.5, 97.5], axis=0)
+
+    y_mean = np.nanmean(y, axis=1, keepdims=True)
+    sst = np.nansum((y - y_mean) ** 2, axis=1)
+    sse = np.where(use_hinge, sse_hinge, sse_power)
+
+    rows = []
+    for i, (experiment_name, metric) in enumerate(labels):
+        row = {
+            "experiment": experiment_name,
+            "metric": metric,
+            "points": int(n[i]),
+            "model": "segmented" if use_hinge[i] else "power_law",
+            "exponent": coef[i, 1],
+            "exponent_after_knee": coef[i, 1] + coef[i, 2] if use_hinge[i] else np.nan,
+            "knee_key_count": 10 ** knots[i] if use_hinge[i] else np.nan,
+            "r2": 1 - sse[i] / sst[i] if sst[i] > 0 else np.nan,
+        }
+        for t, target in enumerate(targets):
+            label = create_magnitude_label(target)
+            row[f"at_{label}"] = 10 ** point[i, t]
+            row[f"at_{label}_lo"] = 10 ** lower[i, t]
+            row[f"at_{label}_hi"] = 10 ** upper[i, t]
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit power-law / segmented scaling models over key count")
+    parser.add_argument("--metric", action="append", default=None, help="Metric to fit (repeatable, default: all)")
+    parser.add_argument("--samples", type=int, default=1000, help="Bootstrap resamples")
+    parser.add_argument("--out", default=None, help="Write the fit table to this CSV file")
+    args = parser.parse_args()
+
+    fits = fit_scaling_laws(args.metric, samples=args.samples)
+    if fits.empty:
+        print("No series with enough key-count coverage to fit")
+        return
+
+    print("Scaling Fits over Key Count (values in µs / bytes / counts):")
+    print("=" * 70)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(fits.to_string(index=False, float_format="%.4g"))
+
+    # "exponent" is the whole power law, or the segment below the knee of a segmented fit
+    super_linear = fits[(fits["exponent"] > 1) | (fits["exponent_after_knee"] > 1)]
+    if not super_linear.empty:
+        print("\nSuper-linear growth:")
+        for _, row in super_linear.iterrows():
+            if row["model"] == "power_law":
+                where = f"exponent {row['exponent']:.3f}"
+            else:
+                segments = [f"{side} ~{row['knee_key_count']:,.0f} keys exponent {exponent:.3f}"
+                            for side, exponent in (("below", row["exponent"]), ("above", row["exponent_after_knee"]))
+                            if exponent > 1]
+                where = ", ".join(segments)
+            print(f"  {row['experiment']}: {row['metric']} ({where})")
+
+    if args.out:
+        fits.to_csv(args.out, index=False)
+        print(f"\nFit table saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
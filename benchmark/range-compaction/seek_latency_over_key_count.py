@@ -1,129 +1,44 @@
-import glob
-import os
-
 import matplotlib.pyplot as plt
-import pandas as pd
-
-# Experiment folder paths
-experiment_folders = {
-    "Enable Range Compaction": "100M-20:8:1:enable-range-compaction:disable-peridioc-full-compaction",
-    "Disable Range Compaction": "100M-20:8:1:disable-range-compaction:disable-peridioc-full-compaction",
-    "Disable Range Compaction + Periodic Full Compaction": "100M-20:8:1:disable-range-compaction:enable-peridioc-full-compaction",
-}
-
-
-def parse_latency_value(value_str):
-    """Parse latency value from string to microseconds"""
-    if pd.isna(value_str) or value_str == "0" or value_str == 0:
-        return 0
-
-    value_str = str(value_str).strip()
-    if "µs" in value_str:
-        return float(value_str.replace(" µs", "").replace("µs", ""))
-    elif "ms" in value_str:
-        return float(value_str.replace(" ms", "").replace("ms", "")) * 1000
-    elif "ns" in value_str:
-        return float(value_str.replace(" ns", "").replace("ns", "")) / 1000
-    elif (
-        "s" in value_str
-        and "µs" not in value_str
-        and "ms" not in value_str
-        and "ns" not in value_str
-    ):
-        return float(value_str.replace(" s", "").replace("s", "")) * 1000000
-    else:
-        # Try to parse as plain number (assume microseconds)
-        try:
-            return float(value_str)
-        except ValueError:
-            return 0
-
-
-def read_csv_data(folder_path, file_pattern):
-    """Read CSV data from experiment folder"""
-    files = glob.glob(os.path.join(folder_path, file_pattern))
-    if not files:
-        return None
-
-    df = pd.read_csv(files[0])
-    return df
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    TARGET_MAGNITUDES,
+    create_magnitude_label,
+    load_key_count_projection,
+    save_chart,
+)
+from profiling import profile_from_argv
+
+profile_from_argv("seek_latency_over_key_count")
 
 
 def get_experiment_data():
     """Extract seek latency and key count data from experiment folders at different magnitudes"""
     data = {}
 
-    # Target magnitudes to analyze (based on actual data range)
-    target_magnitudes = [10**5, 10**6, 10**7]  # 100K, 1M, 10M
-
-    # Get key count data from one experiment (they should all be the same)
-    key_count_folder = list(experiment_folders.values())[0]
-    key_count_df = read_csv_data(
-        key_count_folder, "KeyTable Estimated number of keys*.csv"
-    )
-
-    if key_count_df is None:
-        return {}
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        # Latencies come back in µs; each experiment is read against its own KeyTable estimate
+        avg_latency = load_key_count_projection(folder_name, "Seek average latency")
+        max_latency = load_key_count_projection(folder_name, "Seek max latency")
 
-    key_count_col = key_count_df.columns[1]
-
-    # Get seek latency data from each experiment
-    for experiment_name, folder_name in experiment_folders.items():
-        avg_latency_df = read_csv_data(folder_name, "Seek average latency*.csv")
-        max_latency_df = read_csv_data(folder_name, "Seek max latency*.csv")
-
-        if avg_latency_df is None or max_latency_df is None:
+        if avg_latency is None or max_latency is None:
             continue
 
-        avg_latency_col = avg_latency_df.columns[1]
-        max_latency_col = max_latency_df.columns[1]
-
         # Extract data at target magnitudes
         magnitude_data = {}
 
-        for target_mag in target_magnitudes:
-            # Find the closest point where key count reaches this magnitude
-            closest_idx = None
-            min_diff = float("inf")
-
-            key_counts = key_count_df[key_count_col].values
-            for i, key_count in enumerate(key_counts):
-                if key_count >= target_mag:
-                    diff = abs(key_count - target_mag)
-                    if diff < min_diff:
-                        min_diff = diff
-                        closest_idx = i
-                    break
-
-            # Handle cases where files have different lengths
-            if closest_idx is not None and closest_idx < len(key_count_df):
-                # Use the closest available index for each file
-                avg_idx = (
-                    min(closest_idx, len(avg_latency_df) - 1)
-                    if len(avg_latency_df) > 0
-                    else None
-                )
-                max_idx = (
-                    min(closest_idx, len(max_latency_df) - 1)
-                    if len(max_latency_df) > 0
-                    else None
-                )
-
-                if avg_idx is not None and max_idx is not None:
-                    avg_latency_val = parse_latency_value(
-                        avg_latency_df[avg_latency_col].iloc[avg_idx]
-                    )
-                    max_latency_val = parse_latency_value(
-                        max_latency_df[max_latency_col].iloc[max_idx]
-                    )
-                    actual_key_count = key_count_df[key_count_col].iloc[closest_idx]
-
-                    magnitude_data[f"10^{len(str(target_mag)) - 1}"] = {
-                        "avg_latency_us": avg_latency_val,
-                        "max_latency_us": max_latency_val,
-                        "key_count": actual_key_count,
-                        "target_magnitude": target_mag,
-                    }
+        for target_mag in TARGET_MAGNITUDES:
+            # First sample where the key count reaches this magnitude
+            avg_reached = avg_latency[avg_latency["key_count"] >= target_mag]
+            max_reached = max_latency[max_latency["key_count"] >= target_mag]
+            if avg_reached.empty or max_reached.empty:
+                continue
+
+            magnitude_data[create_magnitude_label(target_mag)] = {
+                "avg_latency_us": avg_reached["value"].iloc[0],
+                "max_latency_us": max_reached["value"].iloc[0],
+                "key_count": int(avg_reached["key_count"].iloc[0]),
+                "target_magnitude": target_mag,
+            }
 
         data[experiment_name] = magnitude_data
 
@@ -294,10 +209,7 @@ ax2.set_yscale("log")
 ax2.legend()
 ax2.grid(True, alpha=0.3)
 
-plt.tight_layout()
-plt.savefig("seek_latency_over_key_count.png", dpi=150, bbox_inches="tight")
-print("Chart saved as 'seek_latency_over_key_count.png'")
-plt.close()  # Close instead of show to avoid display issues
+save_chart("seek_latency_over_key_count.png")
 
 # Print summary by magnitude
 print("Performance Analysis by Order of Magnitude:")
@@ -0,0 +1,256 @@
+"""
+Significance testing between compaction configurations.
+Samples are 30s apart and strongly autocorrelated, so each window is resampled in
+blocks: a moving-block bootstrap gives confidence intervals for the ratio and
+difference of means, and a block permutation test gives p-values. All metrics,
+windows and configuration pairs are resampled in one batch.
+Windows are the key-count magnitudes (±0.25 decades around 10^5, 10^6, 10^7)
+and the steady-state tail of each run.
+"""
+
+import argparse
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    TARGET_MAGNITUDES,
+    create_magnitude_label,
+    list_metrics,
+    load_metric_series,
+    project_onto_key_count,
+)
+
+MAGNITUDE_HALF_WIDTH = 0.25  # decades on either side of each target magnitude
+STEADY_STATE_MINUTES = 120  # tail of each run treated as steady state
+MIN_SAMPLES = 10
+ALPHA = 0.05
+CHUNK_ELEMENTS = 2 * 10**7  # bound on resampling work arrays
+
+
+def collect_windows(metrics=None, steady_minutes=STEADY_STATE_MINUTES):
+    """Samples of every metric per window and experiment: {(metric, window): {experiment: array}}"""
+    windows = {}
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        key_count = load_metric_series(folder_name, KEY_COUNT_METRIC)
+        if key_count is None:
+            continue
+        for metric in metrics or list_metrics(folder_name):
+            series = load_metric_series(folder_name, metric)
+            if series is None or series.empty:
+                continue
+            df = project_onto_key_count(series, key_count)
+            log_keys = np.log10(df["key_count"].clip(lower=1).to_numpy())
+            for target in TARGET_MAGNITUDES:
+                inside = np.abs(log_keys - np.log10(target)) <= MAGNITUDE_HALF_WIDTH
+                label = create_magnitude_label(target)
+                windows.setdefault((metric, label), {})[experiment_name] = df["value"].to_numpy()[inside]
+            tail = df["Time"] >= df["Time"].iloc[-1] - pd.Timedelta(minutes=steady_minutes)
+            windows.setdefault((metric, "steady"), {})[experiment_name] = df["value"].to_numpy()[tail.to_numpy()]
+    return windows
+
+
+def _pad(arrays):
+    """Stack variable-length arrays into a NaN-padded matrix with their lengths"""
+    lengths = np.array([len(a) for a in arrays])
+    matrix = np.full((len(arrays), max(lengths.max(), 1)), np.nan)
+    for row, a in enumerate(arrays):
+        matrix[row, : len(a)] = a
+    return matrix, lengths
+
+
+def _prefix_sums(matrix):
+    return np.concatenate([np.zeros((len(matrix), 1)), np.cumsum(np.nan_to_num(matrix), axis=1)], axis=1)
+
+
+def block_lengths(matrix, lengths):
+    """AR(1)-based optimal block length for the mean, (3n/2)^(1/3) (2rho / (1 - rho^2))^(2/3), per row"""
+    valid = ~np.isnan(matrix)
+    mean = np.nansum(matrix, axis=1) / np.maximum(lengths, 1)
+    centered = np.where(valid, matrix - mean[:, None], 0.0)
+    var = (centered**2).sum(1)
+    lag1 = (centered[:, 1:] * centered[:, :-1]).sum(1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = np.clip(np.where(var > 0, lag1 / var, 0.0), 0.0, 0.95)
+    optimal = (1.5 * lengths) ** (1 / 3) * (2 * rho / (1 - rho**2)) ** (2 / 3)
+    return np.clip(np.ceil(optimal), 1, np.maximum(lengths // 4, 1)).astype(int)
+
+
+def block_bootstrap_means(matrix, lengths, block, samples, rng):
+    """Moving-block bootstrap replicates of the mean of every row, shape (samples, rows)"""
+    prefix = _prefix_sums(matrix)
+    blocks = -(-lengths // block)  # ceil
+    k = np.arange(blocks.max())
+    # Every block is full length except a truncated last one; padding blocks are empty
+    size = np.where(k[None, :] < blocks[:, None] - 1, block[:, None], 0)
+    size = np.where(k[None, :] == blocks[:, None] - 1, lengths[:, None] - (blocks[:, None] - 1) * block[:, None], size)
+
+    means = np.empty((samples, len(matrix)))
+    chunk = max(1, CHUNK_ELEMENTS // size.size)
+    for first in range(0, samples, chunk):
+        count = min(chunk, samples - first)
+        starts = (rng.random((count, *size.shape)) * (lengths - block + 1)[None, :, None]).astype(int)
+        cs = np.broadcast_to(prefix, (count, *prefix.shape))
+        sums = np.take_along_axis(cs, starts + size[None], axis=2) - np.take_along_axis(cs, starts, axis=2)
+        means[first:first + count] = sums.sum(2) / lengths[None, :]
+    return means
+
+
+def block_permutation_pvalues(a, b, block, permutations, rng):
+    """Two-sided p-values for a difference in means, permuting non-overlapping blocks between a and b
+
+    a, b are (matrix, lengths) pairs with one row per comparison; block is the shared block length.
+    """
+    (ma, na), (mb, nb) = a, b
+    pa, pb = _prefix_sums(ma), _prefix_sums(mb)
+    ka, kb = -(-na // block), -(-nb // block)
+    width = (ka + kb).max()
+    sums = np.zeros((len(block), width))
+    counts = np.zeros((len(block), width))
+    for row in range(len(block)):
+        for offset, prefix, n, k in ((0, pa[row], na[row], ka[row]), (ka[row], pb[row], nb[row], kb[row])):
+            edges = np.minimum(np.arange(k + 1) * block[row], n)
+            sums[row, offset:offset + k] = np.diff(prefix[edges])
+            counts[row, offset:offset + k] = np.diff(edges)
+
+    def difference(in_a):
+        in_b = counts > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_a = (sums * in_a).sum(-1) / (counts * in_a).sum(-1)
+            mean_b = (sums * (in_b & ~in_a)).sum(-1) / (counts * (in_b & ~in_a)).sum(-1)
+        return mean_b - mean_a
+
+    positions = np.arange(width)
+    observed = difference(positions[None, :] < ka[:, None])
+
+    # Random ranks over the real blocks; the first ka ranks go to group a
+    exceed = np.zeros(len(block), dtype=int)
+    chunk = max(1, CHUNK_ELEMENTS // counts.size)
+    for first in range(0, permutations, chunk):
+        count = min(chunk, permutations - first)
+        keys = np.where(counts[None] > 0, rng.random((count, *counts.shape)), np.inf)
+        ranks = np.argsort(np.argsort(keys, axis=2), axis=2)
+        permuted = difference(ranks < ka[None, :, None])
+        exceed += (np.abs(permuted) >= np.abs(observed)[None] - 1e-12).sum(0)
+    p_values = (1 + exceed) / (permutations + 1)
+    return np.where((ka >= 2) & (kb >= 2), p_values, np.nan)
+
+
+def benjamini_hochberg(p_values):
+    """False-discovery-rate adjusted q-values (NaN entries are left out)"""
+    q = np.full_like(p_values, np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    order = valid[np.argsort(p_values[valid])]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    q[order] = np.minimum.accumulate(ranked[::-1])[::-1].clip(max=1.0)
+    return q
+
+
+def compare_configurations(metrics=None, samples=2000, permutations=2000, steady_minutes=STEADY_STATE_MINUTES, seed=0):
+    """Effect sizes with block-bootstrap intervals and permutation p-values for every configuration pair"""
+    rng = np.random.default_rng(seed)
+    windows = collect_windows(metrics, steady_minutes)
+
+    # One row per (metric, window, experiment) series, then one comparison per pair of rows
+    series, keys = [], []
+    for (metric, window), by_experiment in windows.items():
+        for experiment_name, values in by_experiment.items():
+            values = values[~np.isnan(values)]
+            if len(values) >= MIN_SAMPLES:
+                keys.append((metric, window, experiment_name))
+                series.append(values)
+    if not series:
+        return pd.DataFrame()
+
+    index = {key: row for row, key in enumerate(keys)}
+    matrix, lengths = _pad(series)
+    block = block_lengths(matrix, lengths)
+    replicates = block_bootstrap_means(matrix, lengths, block, samples, rng)
+    means = np.nansum(matrix, axis=1) / lengths
+
+    pairs = []
+    for (metric, window), by_experiment in windows.items():
+        for baseline, candidate in combinations(EXPERIMENT_FOLDERS, 2):
+            i, j = index.get((metric, window, baseline)), index.get((metric, window, candidate))
+            if i is not None and j is not None:
+                pairs.append((metric, window, baseline, candidate, i, j))
+    if not pairs:
+        return pd.DataFrame()
+
+    ia = np.array([p[4] for p in pairs])
+    ib = np.array([p[5] for p in pairs])
+    shared_block = np.maximum(block[ia], block[ib])
+    p_values = block_permutation_pvalues(
+        (matrix[ia], lengths[ia]), (matrix[ib], lengths[ib]), shared_block, permutations, rng
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = means[ib] / means[ia]
+        ratio_replicates = replicates[:, ib] / replicates[:, ia]
+    ratio_replicates = np.where(np.isfinite(ratio_replicates), ratio_replicates, np.nan)
+    diff_replicates = replicates[:, ib] - replicates[:, ia]
+    ratio_lo, ratio_hi = np.nanpercentile(ratio_replicates, [100 * ALPHA / 2, 100 * (1 - ALPHA / 2)], axis=0)
+    diff_lo, diff_hi = np.percentile(diff_replicates, [100 * ALPHA / 2, 100 * (1 - ALPHA / 2)], axis=0)
+
+    table = pd.DataFrame(
+        {
+            "metric": [p[0] for p in pairs],
+            "window": [p[1] for p in pairs],
+            "baseline": [p[2] for p in pairs],
+            "candidate": [p[3] for p in pairs],
+            "n_baseline": lengths[ia],
+            "n_candidate": lengths[ib],
+            "block": shared_block,
+            "mean_baseline": means[ia],
+            "mean_candidate": means[ib],
+            "ratio": np.where(np.isfinite(ratio), ratio, np.nan),
+            "ratio_lo": ratio_lo,
+            "ratio_hi": ratio_hi,
+            "difference": means[ib] - means[ia],
+            "difference_lo": diff_lo,
+            "difference_hi": diff_hi,
+            "p_value": p_values,
+        }
+    )
+    table["q_value"] = benjamini_hochberg(table["p_value"].to_numpy())
+    table["significant"] = (table["q_value"] < ALPHA) & ((table["difference_lo"] > 0) | (table["difference_hi"] < 0))
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Block-bootstrap comparison of compaction configurations")
+    parser.add_argument("--metric", action="append", default=None, help="Metric to compare (repeatable, default: all)")
+    parser.add_argument("--samples", type=int, default=2000, help="Bootstrap resamples")
+    parser.add_argument("--permutations", type=int, default=2000, help="Block permutations")
+    parser.add_argument("--steady-minutes", type=float, default=STEADY_STATE_MINUTES, help="Steady-state tail length")
+    parser.add_argument("--all", action="store_true", help="Also print comparisons that are not significant")
+    parser.add_argument("--out", default=None, help="Write the comparison table to this CSV file")
+    args = parser.parse_args()
+
+    table = compare_configurations(args.metric, args.samples, args.permutations, args.steady_minutes)
+    if table.empty:
+        print("No windows with enough samples to compare")
+        return
+
+    print("Configuration Comparisons (ratio = candidate / baseline, 95% block-bootstrap CI):")
+    print("=" * 70)
+    shown = table if args.all else table[table["significant"]]
+    for window, df in shown.groupby("window", sort=False):
+        print(f"\n{window} {'Keys' if window != 'steady' else 'state'}:")
+        print("-" * 20)
+        for _, row in df.iterrows():
+            print(
+                f"  {row['metric']:<38} {row['candidate'][:28]:<28} vs {row['baseline'][:24]:<24} "
+                f"{row['ratio']:7.2f}x [{row['ratio_lo']:.2f}, {row['ratio_hi']:.2f}]  q={row['q_value']:.3g}"
+            )
+    print(f"\n{int(table['significant'].sum())} of {len(table)} comparisons significant at q < {ALPHA}")
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"\nComparison table saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+SST properties reader for per-file and per-level tombstone accounting.
+Memory-maps the SST files of an OM DB snapshot and parses only the footer, the
+metaindex block and the properties block (never data blocks). Levels and key
+ranges come from the MANIFEST, which is parsed alongside.
+"""
+
+import argparse
+import mmap
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+BLOCK_BASED_TABLE_MAGIC = 0x88E241B785F4CFF7
+LEGACY_BLOCK_BASED_TABLE_MAGIC = 0xDB4775248B80FB57
+LEGACY_FOOTER_SIZE = 48
+FOOTER_SIZE = 53
+BLOCK_TRAILER_SIZE = 5
+PROPERTIES_BLOCK = b"rocksdb.properties"
+
+# Numeric table properties are varint64 encoded, everything else is a raw string
+NUMERIC_PROPERTIES = {
+    b"rocksdb.num.entries": "entries",
+    b"rocksdb.deleted.keys": "deletions",
+    b"rocksdb.num.range-deletions": "range_deletions",
+    b"rocksdb.merge.operands": "merge_operands",
+    b"rocksdb.raw.key.size": "raw_key_size",
+    b"rocksdb.raw.value.size": "raw_value_size",
+    b"rocksdb.data.size": "data_size",
+    b"rocksdb.index.size": "index_size",
+    b"rocksdb.filter.size": "filter_size",
+    b"rocksdb.num.data.blocks": "data_blocks",
+    b"rocksdb.column.family.id": "cf_id",
+    b"rocksdb.creation.time": "creation_time",
+}
+STRING_PROPERTIES = {
+    b"rocksdb.column.family.name": "cf",
+    b"rocksdb.compression": "compression",
+}
+
+SST_COLUMNS = ["file_number", "file", "cf", "level", "file_size"] + list(NUMERIC_PROPERTIES.values()) + [
+    "compression",
+    "smallest_key",
+    "largest_key",
+]
+
+# MANIFEST (VersionEdit) tags, see rocksdb/db/version_edit.h
+TAG_COMPARATOR = 1
+TAG_COMPACT_CURSOR = 5
+TAG_DELETED_FILE = 6
+TAG_NEW_FILE = 7
+TAG_NEW_FILE2 = 100
+TAG_NEW_FILE3 = 102
+TAG_NEW_FILE4 = 103
+TAG_COLUMN_FAMILY = 200
+TAG_COLUMN_FAMILY_ADD = 201
+TAG_COLUMN_FAMILY_DROP = 202
+TAG_SAFE_IGNORE_MASK = 1 << 13
+NEW_FILE_CUSTOM_TAG_TERMINATE = 1
+VARINT_TAGS = {2, 3, 4, 9, 10, 203, 300}
+
+LOG_BLOCK_SIZE = 32768
+LOG_HEADER_SIZE = 7
+RECYCLABLE_LOG_HEADER_SIZE = 11
+
+
+def decode_varint(buf, pos):
+    """Decode a little-endian base-128 varint, returning (value, next_pos)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def decode_length_prefixed(buf, pos):
+    """Decode a varint length-prefixed slice, returning (bytes, next_pos)"""
+    length, pos = decode_varint(buf, pos)
+    return bytes(buf[pos:pos + length]), pos + length
+
+
+def read_footer(mm):
+    """Return (metaindex_offset, metaindex_size) from a block-based table footer"""
+    size = len(mm)
+    if size < LEGACY_FOOTER_SIZE:
+        raise ValueError("file too small to be an SST")
+
+    magic = struct.unpack_from("<Q", mm, size - 8)[0]
+    if magic == LEGACY_BLOCK_BASED_TABLE_MAGIC:
+        offset, pos = decode_varint(mm, size - LEGACY_FOOTER_SIZE)
+        length, _ = decode_varint(mm, pos)
+        return offset, length
+    if magic != BLOCK_BASED_TABLE_MAGIC:
+        raise ValueError(f"not a block-based table (magic {magic:#x})")
+
+    footer_offset = size - FOOTER_SIZE
+    format_version = struct.unpack_from("<I", mm, size - 12)[0]
+    if format_version >= 6:
+        # Metaindex handle is implied: the block sits right before the footer
+        length = struct.unpack_from("<I", mm, footer_offset + 13)[0]
+        return footer_offset - length - BLOCK_TRAILER_SIZE, length
+
+    offset, pos = decode_varint(mm, footer_offset + 1)
+    length, _ = decode_varint(mm, pos)
+    return offset, length
+
+
+def iter_block(mm, offset, length):
+    """Yield (key, value) entries of an uncompressed block"""
+    if mm[offset + length] != 0:
+        raise ValueError("compressed meta block")
+
+    block = memoryview(mm)[offset:offset + length]
+    # Top bit of the restart count flags a data block hash index
+    num_restarts = struct.unpack_from("<I", block, length - 4)[0] & 0x7FFFFFFF
+    limit = length - 4 - 4 * num_restarts
+    pos = 0
+    key = b""
+    try:
+        while pos < limit:
+            shared, pos = decode_varint(block, pos)
+            non_shared, pos = decode_varint(block, pos)
+            value_length, pos = decode_varint(block, pos)
+            key = key[:shared] + bytes(block[pos:pos + non_shared])
+            pos += non_shared
+            yield key, bytes(block[pos:pos + value_length])
+            pos += value_length
+    finally:
+        block.release()
+
+
+def read_sst_properties(file_path):
+    """Read the table properties of one SST file without touching data blocks"""
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        metaindex_offset, metaindex_length = read_footer(mm)
+        handle = None
+        for name, value in iter_block(mm, metaindex_offset, metaindex_length):
+            if name == PROPERTIES_BLOCK:
+                offset, pos = decode_varint(value, 0)
+                handle = (offset, decode_varint(value, pos)[0])
+                break
+        if handle is None:
+            raise ValueError("no properties block")
+
+        properties = {}
+        for name, value in iter_block(mm, *handle):
+            if name in NUMERIC_PROPERTIES:
+                properties[NUMERIC_PROPERTIES[name]] = decode_varint(value, 0)[0]
+            elif name in STRING_PROPERTIES:
+                properties[STRING_PROPERTIES[name]] = value.decode("utf-8", "replace")
+
+    return properties
+
+
+def iter_log_records(data):
+    """Yield the logical records of a RocksDB log file (MANIFEST or WAL)"""
+    pos = 0
+    fragments = []
+    while pos + LOG_HEADER_SIZE <= len(data):
+        block_left = LOG_BLOCK_SIZE - pos % LOG_BLOCK_SIZE
+        if block_left < LOG_HEADER_SIZE:
+            pos += block_left
+            continue
+
+        length, record_type = struct.unpack_from("<HB", data, pos + 4)
+        if record_type == 0 and length == 0:
+            # Zero padding (preallocated tail of the file or of a block)
+            pos += block_left
+            continue
+        header = RECYCLABLE_LOG_HEADER_SIZE if 5 <= record_type <= 8 else LOG_HEADER_SIZE
+        payload = data[pos + header:pos + header + length]
+        pos += header + length
+
+        kind = record_type - 4 if record_type >= 5 else record_type
+        if kind == 1:
+            yield payload
+        elif kind == 2:
+            fragments = [payload]
+        elif kind == 3:
+            fragments.append(payload)
+        elif kind == 4:
+            fragments.append(payload)
+            yield b"".join(fragments)
+            fragments = []
+
+
+def apply_version_edit(record, files, cf_names):
+    """Apply one VersionEdit record to the live file map"""
+    pos = 0
+    cf_id = 0
+    added = []
+    while pos < len(record):
+        tag, pos = decode_varint(record, pos)
+        if tag in VARINT_TAGS:
+            _, pos = decode_varint(record, pos)
+        elif tag == TAG_COMPARATOR:
+            _, pos = decode_length_prefixed(record, pos)
+        elif tag == TAG_COMPACT_CURSOR:
+            _, pos = decode_varint(record, pos)
+            _, pos = decode_length_prefixed(record, pos)
+        elif tag == TAG_DELETED_FILE:
+            _, pos = decode_varint(record, pos)
+            number, pos = decode_varint(record, pos)
+            files.pop(number, None)
+        elif tag in (TAG_NEW_FILE, TAG_NEW_FILE2, TAG_NEW_FILE3, TAG_NEW_FILE4):
+            level, pos = decode_varint(record, pos)
+            number, pos = decode_varint(record, pos)
+            if tag == TAG_NEW_FILE3:
+                _, pos = decode_varint(record, pos)  # path id
+            file_size, pos = decode_varint(record, pos)
+            smallest, pos = decode_length_prefixed(record, pos)
+            largest, pos = decode_length_prefixed(record, pos)
+            if tag != TAG_NEW_FILE:
+                _, pos = decode_varint(record, pos)  # smallest seqno
+                _, pos = decode_varint(record, pos)  # largest seqno
+            if tag == TAG_NEW_FILE4:
+                while True:
+                    custom_tag, pos = decode_varint(record, pos)
+                    if custom_tag == NEW_FILE_CUSTOM_TAG_TERMINATE:
+                        break
+                    _, pos = decode_length_prefixed(record, pos)
+            # Strip the 8-byte (seqno, type) trailer of the internal keys
+            smallest = smallest[:-8].decode("utf-8", "backslashreplace")
+            largest = largest[:-8].decode("utf-8", "backslashreplace")
+            added.append((number, level, file_size, smallest, largest))
+        elif tag == TAG_COLUMN_FAMILY:
+            cf_id, pos = decode_varint(record, pos)
+        elif tag == TAG_COLUMN_FAMILY_ADD:
+            name, pos = decode_length_prefixed(record, pos)
+            cf_names[cf_id] = name.decode("utf-8", "replace")
+        elif tag == TAG_COLUMN_FAMILY_DROP:
+            pass
+        elif tag & TAG_SAFE_IGNORE_MASK:
+            _, pos = decode_length_prefixed(record, pos)
+        else:
+            # Blob file records and anything newer: nothing we need follows
+            break
+
+    for number, level, file_size, smallest, largest in added:
+        files[number] = {
+            "cf_id": cf_id,
+            "level": level,
+            "file_size": file_size,
+            "smallest_key": smallest,
+            "largest_key": largest,
+        }
+
+
+def read_manifest(db_dir):
+    """Return {file_number: {cf, level, file_size, smallest_key, largest_key}} for the live SSTs"""
+    current = Path(db_dir) / "CURRENT"
+    if not current.exists():
+        return {}
+
+    manifest = Path(db_dir) / current.read_text().strip()
+    files = {}
+    cf_names = {0: "default"}
+    with open(manifest, "rb") as f:
+        data = f.read()
+    for record in iter_log_records(data):
+        apply_version_edit(record, files, cf_names)
+
+    for info in files.values():
+        info["cf"] = cf_names.get(info.pop("cf_id"), "")
+    return files
+
+
+def _read_file_row(path, manifest):
+    """Build one per-file row; unreadable files are reported and skipped"""
+    try:
+        properties = read_sst_properties(path)
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        print(f"Skipping {path}: {e}")
+        return None
+
+    number = int(path.stem) if path.stem.isdigit() else -1
+    info = manifest.get(number, {})
+    row = {"file_number": number, "file": path.name, "level": info.get("level", -1)}
+    row["file_size"] = info.get("file_size", path.stat().st_size)
+    row.update(properties)
+    # Prefer the MANIFEST column family name; it is authoritative for live files
+    row["cf"] = info.get("cf") or properties.get("cf", "")
+    row["smallest_key"] = info.get("smallest_key")
+    row["largest_key"] = info.get("largest_key")
+    return row
+
+
+def scan_sst_directory(db_dir, workers=16):
+    """Read the properties of every SST in a DB directory with a thread pool"""
+    paths = sorted(Path(db_dir).glob("*.sst"))
+    manifest = read_manifest(db_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = [row for row in pool.map(lambda p: _read_file_row(p, manifest), paths) if row]
+
+    df = pd.DataFrame(rows).reindex(columns=SST_COLUMNS)
+    numeric = [c for c in SST_COLUMNS if c in NUMERIC_PROPERTIES.values()]
+    df[numeric] = df[numeric].fillna(0).astype("int64")
+    return df.sort_values(["cf", "level", "smallest_key"], na_position="last", ignore_index=True)
+
+
+def summarize_levels(files_df):
+    """Aggregate per-file properties into per column family / level totals"""
+    summary = files_df.groupby(["cf", "level"], as_index=False).agg(
+        files=("file", "count"),
+        size_mb=("file_size", "sum"),
+        entries=("entries", "sum"),
+        deletions=("deletions", "sum"),
+        range_deletions=("range_deletions", "sum"),
+        raw_key_size=("raw_key_size", "sum"),
+        raw_value_size=("raw_value_size", "sum"),
+    )
+    summary["size_mb"] /= 1024 * 1024
+    summary["tombstone_ratio"] = summary["deletions"] / summary["entries"].where(summary["entries"] > 0)
+    return summary
+
+
+def key_prefix(key, depth):
+    """Return the first `depth` '/'-separated components of an OM key"""
+    if not isinstance(key, str):
+        return None
+    parts = key.split("/")
+    # OM keys start with '/', so the first component is empty
+    return "/".join(parts[:depth + 1])
+
+
+def tombstone_density_by_prefix(files_df, depth=2):
+    """Aggregate deletions/entries per key prefix (e.g. depth 2 = /volume/bucket)"""
+    df = files_df.assign(prefix=files_df["smallest_key"].map(lambda k: key_prefix(k, depth)))
+    density = df.groupby(["cf", "prefix"], as_index=False).agg(
+        files=("file", "count"),
+        entries=("entries", "sum"),
+        deletions=("deletions", "sum"),
+        range_deletions=("range_deletions", "sum"),
+        first_key=("smallest_key", "min"),
+        last_key=("largest_key", "max"),
+    )
+    density["tombstone_ratio"] = density["deletions"] / density["entries"].where(density["entries"] > 0)
+    return density.sort_values("tombstone_ratio", ascending=False, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-file and per-level SST property accounting")
+    parser.add_argument("db_dir", help="OM DB directory or checkpoint (e.g. om.db)")
+    parser.add_argument("--workers", type=int, default=16, help="Reader threads")
+    parser.add_argument("--prefix-depth", type=int, default=2, help="Key path components for tombstone density")
+    parser.add_argument("--out", default=None, help="Write the per-file table to this CSV file")
+    args = parser.parse_args()
+
+    files_df = scan_sst_directory(args.db_dir, args.workers)
+    print(f"Read properties of {len(files_df)} SST files from {args.db_dir}")
+    if files_df.empty:
+        return
+
+    print("\nPer-level summary:")
+    print("=" * 70)
+    print(summarize_levels(files_df).to_string(index=False, float_format="%.3f"))
+    print("\nTombstone density by key prefix:")
+    print("=" * 70)
+    print(tombstone_density_by_prefix(files_df, args.prefix_depth).head(20).to_string(index=False, float_format="%.3f"))
+
+    if args.out:
+        files_df.to_csv(args.out, index=False)
+        print(f"\nPer-file table saved as '{args.out}'")
+
+
+if __name__ == "__main__":
+    main()
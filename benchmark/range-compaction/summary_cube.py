@@ -0,0 +1,185 @@
+"""
+Summary cube of every metric at every key-count magnitude for every experiment.
+Stats follow the per-magnitude chart scripts: `value` is the sample where the
+KeyTable estimate first reaches the magnitude, and max/mean/p50/p95/p99 cover the
+run up to that point. The cube is stored as one compressed .npz array file and
+can be queried or exported to CSV/JSON from the command line.
+"""
+
+import argparse
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    BASE_PATH,
+    EXPERIMENT_FOLDERS,
+    KEY_COUNT_METRIC,
+    TARGET_MAGNITUDES,
+    align_experiment_series,
+    create_magnitude_label,
+    list_metrics,
+    load_metric_series,
+)
+
+STATS = ["value", "max", "mean", "p50", "p95", "p99"]
+DEFAULT_CUBE_PATH = os.path.join(BASE_PATH, "summary_cube.npz")
+
+
+def magnitude_stats(matrix, crossings):
+    """Stats for every metric row at every crossing index, shape (metrics, magnitudes, stats)
+
+    crossings holds the grid index where the key count first reaches each magnitude, or -1.
+    """
+    num_metrics, num_samples = matrix.shape
+    positions = np.arange(num_samples)
+    # (magnitudes, metrics, samples): the run up to each crossing
+    upto = np.where(positions[None, None, :] <= crossings[:, None, None], matrix[None], np.nan)
+
+    # Metrics with no samples before a crossing stay NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        maximum = np.nanmax(upto, axis=2)
+        mean = np.nanmean(upto, axis=2)
+        percentiles = np.nanpercentile(upto, [50, 95, 99], axis=2)
+
+    # Value at the crossing, falling back to the latest sample before it for gaps
+    filled = pd.DataFrame(matrix.T).ffill().to_numpy().T
+    value = filled[:, np.clip(crossings, 0, None)].T
+
+    cube = np.stack([value, maximum, mean, *percentiles], axis=-1)  # (magnitudes, metrics, stats)
+    cube[crossings < 0] = np.nan
+    return np.swapaxes(cube, 0, 1)
+
+
+def build_cube(magnitudes=TARGET_MAGNITUDES, step_seconds=30):
+    """Compute the (experiment, metric, magnitude, stat) cube over all experiments"""
+    experiments = list(EXPERIMENT_FOLDERS)
+    aligned = {}
+    for experiment_name, folder_name in EXPERIMENT_FOLDERS.items():
+        aligned[experiment_name] = align_experiment_series(folder_name, list_metrics(folder_name), step_seconds)
+    metrics = sorted({name for _, names, _ in aligned.values() for name in names})
+
+    cube = np.full((len(experiments), len(metrics), len(magnitudes), len(STATS)), np.nan)
+    key_counts = np.full((len(experiments), len(magnitudes)), np.nan)
+    kinds = {}
+    for e, experiment_name in enumerate(experiments):
+        _, names, matrix = aligned[experiment_name]
+        if KEY_COUNT_METRIC not in names:
+            continue
+        keys = pd.Series(matrix[names.index(KEY_COUNT_METRIC)]).ffill().to_numpy()
+        reached = keys[None, :] >= np.asarray(magnitudes, dtype=float)[:, None]
+        crossings = np.where(reached.any(axis=1), np.argmax(reached, axis=1), -1)
+        key_counts[e] = np.where(crossings >= 0, keys[np.clip(crossings, 0, None)], np.nan)
+
+        rows = [metrics.index(name) for name in names]
+        cube[e, rows] = magnitude_stats(matrix, crossings)
+        for name in names:
+            if name not in kinds:
+                kinds[name] = load_metric_series(EXPERIMENT_FOLDERS[experiment_name], name).attrs.get("kind", "count")
+
+    return {
+        "experiments": np.array(experiments),
+        "metrics": np.array(metrics),
+        "magnitudes": np.array([create_magnitude_label(m) for m in magnitudes]),
+        "stats": np.array(STATS),
+        "kinds": np.array([kinds.get(m, "count") for m in metrics]),
+        "key_counts": key_counts,
+        "values": cube,
+    }
+
+
+def save_cube(cube, path=DEFAULT_CUBE_PATH):
+    np.savez_compressed(path, **cube)
+
+
+def load_cube(path=DEFAULT_CUBE_PATH):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def query_cube(cube, experiment=None, metric=None, magnitude=None, stat=None):
+    """Select from the cube as a long DataFrame; each filter is a name or list of names"""
+
+    def select(axis, wanted):
+        labels = cube[axis]
+        if wanted is None:
+            return np.arange(len(labels))
+        wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+        return np.flatnonzero(np.isin(labels, wanted))
+
+    e, m, k, s = (select(a, w) for a, w in
+                  (("experiments", experiment), ("metrics", metric), ("magnitudes", magnitude), ("stats", stat)))
+    values = cube["values"][np.ix_(e, m, k, s)]
+    grid = np.meshgrid(e, m, k, s, indexing="ij")
+    df = pd.DataFrame(
+        {
+            "experiment": cube["experiments"][grid[0].ravel()],
+            "metric": cube["metrics"][grid[1].ravel()],
+            "kind": cube["kinds"][grid[1].ravel()],
+            "magnitude": cube["magnitudes"][grid[2].ravel()],
+            "key_count": cube["key_counts"][grid[0].ravel(), grid[2].ravel()],
+            "stat": cube["stats"][grid[3].ravel()],
+            "value": values.ravel(),
+        }
+    )
+    return df.dropna(subset=["value"]).reset_index(drop=True)
+
+
+def export_cube(cube, path):
+    """Write the whole cube in long form as CSV or JSON (by file extension)"""
+    df = query_cube(cube)
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(df.to_dict(orient="records"), f, indent=1)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the metric x magnitude x experiment summary cube")
+    parser.add_argument("--cube", default=DEFAULT_CUBE_PATH, help="Cube file (.npz)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("build", help="Compute the cube from the experiment CSVs")
+
+    query = subparsers.add_parser("query", help="Print a slice of the cube")
+    query.add_argument("--experiment", action="append", default=None)
+    query.add_argument("--metric", action="append", default=None)
+    query.add_argument("--magnitude", action="append", default=None, help="e.g. 10^6")
+    query.add_argument("--stat", action="append", default=None, choices=STATS)
+    query.add_argument("--pivot", action="store_true", help="One column per experiment")
+
+    export = subparsers.add_parser("export", help="Write the cube as CSV or JSON")
+    export.add_argument("out", help="Output path ending in .csv or .json")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        cube = build_cube()
+        save_cube(cube, args.cube)
+        shape = " x ".join(str(n) for n in cube["values"].shape)
+        print(f"Summary cube ({shape}: experiments x metrics x magnitudes x stats) saved as '{args.cube}'")
+        return
+
+    cube = load_cube(args.cube)
+    if args.command == "export":
+        export_cube(cube, args.out)
+        print(f"Summary cube exported to '{args.out}'")
+        return
+
+    df = query_cube(cube, args.experiment, args.metric, args.magnitude, args.stat)
+    if df.empty:
+        print("No matching cells")
+        return
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_rows", None):
+        if args.pivot:
+            print(df.pivot_table(index=["metric", "magnitude", "stat"], columns="experiment", values="value")
+                  .to_string(float_format="%.4g"))
+        else:
+            print(df.to_string(index=False, float_format="%.4g"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Experiment sweep orchestrator.
+Expands a parameter matrix (key count, op mix, compaction flags, client threads)
+into cells, runs them through a pluggable backend with bounded parallelism and
+writes each into the canonical experiment-folder layout. A cell counts as done
+once its `.complete` marker exists, so an interrupted sweep resumes where it
+stopped and half-written folders are redone.
+Backends: `fake` (synthetic exports, for testing the orchestration offline),
+`embedded` (lsm_harness on a local RocksDB) and `compose` (a docker compose
+Ozone cluster driven by a load command, exported from Prometheus).
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from lsm_harness import HARNESS_METRICS, experiment_folder_name, write_export
+from synthetic_data import EXPORT_STAMP, SYNTHETIC_METRICS, write_experiment
+
+MARKER = ".complete"
+DEFAULT_THREADS = 10
+FAKE_ROWS = 2000
+
+
+def expand_matrix(keys, weights, range_compaction, periodic_full_compaction, threads):
+    """Every combination of the parameter lists as cell dicts"""
+    return [
+        {"keys": k, "weights": w, "range_compaction": r, "periodic_full_compaction": p, "threads": t}
+        for k, w, r, p, t in itertools.product(keys, weights, range_compaction, periodic_full_compaction, threads)
+    ]
+
+
+def cell_folder_name(cell):
+    """Canonical folder name; a non-default thread count is appended as ':threads-N'"""
+    name = experiment_folder_name(cell["keys"], cell["weights"], cell["range_compaction"], cell["periodic_full_compaction"])
+    return name if cell["threads"] == DEFAULT_THREADS else f"{name}:threads-{cell['threads']}"
+
+
+class FakeBackend:
+    """Synthetic exports shaped like the cluster's, in seconds and without any cluster"""
+
+    name = "fake"
+    max_parallel = os.cpu_count() or 1
+
+    def __init__(self, rows=FAKE_ROWS, seed=0):
+        self.rows = rows
+        self.seed = seed
+
+    def run_cell(self, cell, folder):
+        write_experiment(folder, self.rows, total_keys=cell["keys"], seed=self.seed)
+
+
+class EmbeddedBackend:
+    """lsm_harness on a private RocksDB per cell; the harness is single-threaded, so threads are ignored"""
+
+    name = "embedded"
+    max_parallel = os.cpu_count() or 1
+
+    def __init__(self, **harness_options):
+        self.harness_options = harness_options
+
+    def run_cell(self, cell, folder):
+        from lsm_harness import LSMHarness
+
+        db_dir = folder + ".db"
+        harness = LSMHarness(db_dir, cell["range_compaction"], cell["periodic_full_compaction"], cell["weights"],
+                             **self.harness_options)
+        try:
+            harness.run(cell["keys"], progress=False)
+        finally:
+            harness.close()
+            shutil.rmtree(db_dir, ignore_errors=True)
+        harness.write(folder)
+
+
+class ComposeBackend:
+    """One docker compose Ozone cluster per cell, so cells run one at a time
+
+    The cluster reads its compaction flags from the environment passed to
+    `docker compose up` (RANGE_COMPACTION, PERIODIC_FULL_COMPACTION = true/false).
+    `load_command` is a shell template with {keys}, {weights}, {threads}
+    placeholders run on the host once the cluster is up. Metrics are pulled from
+    Prometheus with one PromQL query per exported metric name.
+    """
+
+    name = "compose"
+    max_parallel = 1
+
+    def __init__(self, compose_file, load_command, prometheus_url, queries, step_seconds=30, startup_seconds=60):
+        self.compose_file = compose_file
+        self.load_command = load_command
+        self.prometheus_url = prometheus_url.rstrip("/")
+        self.queries = queries
+        self.step_seconds = step_seconds
+        self.startup_seconds = startup_seconds
+
+    def _compose(self, *args, env=None):
+        subprocess.run(["docker", "compose", "-f", self.compose_file, *args], check=True, env=env)
+
+    def query_range(self, query, start, end):
+        """(datetime64 times, float values) of the first series a PromQL range query returns"""
+        params = urllib.parse.urlencode({"query": query, "start": start, "end": end, "step": self.step_seconds})
+        with urllib.request.urlopen(f"{self.prometheus_url}/api/v1/query_range?{params}", timeout=60) as response:
+            result = json.load(response)["data"]["result"]
+        if not result:
+            return np.array([], dtype="datetime64[s]"), np.array([])
+        samples = np.array(result[0]["values"], dtype=float)
+        return samples[:, 0].astype("datetime64[s]"), samples[:, 1]
+
+    def run_cell(self, cell, folder):
+        env = dict(os.environ, RANGE_COMPACTION=str(cell["range_compaction"]).lower(),
+                   PERIODIC_FULL_COMPACTION=str(cell["periodic_full_compaction"]).lower())
+        self._compose("up", "-d", env=env)
+        try:
+            time.sleep(self.startup_seconds)
+            start = time.time()
+            command = self.load_command.format(keys=cell["keys"], weights=":".join(map(str, cell["weights"])),
+                                               threads=cell["threads"])
+            subprocess.run(command, shell=True, check=True)
+            end = time.time()
+            os.makedirs(folder, exist_ok=True)
+            families = dict(SYNTHETIC_METRICS, **HARNESS_METRICS)
+            for metric, query in self.queries.items():
+                times, values = self.query_range(query, start, end)
+                path = os.path.join(folder, f"{metric}-data-{EXPORT_STAMP}.csv")
+                write_export(path, times, values, families.get(metric, "count"))
+        finally:
+            self._compose("down", "-v", env=env)
+
+
+def run_cell(backend, cell, folder):
+    """Run one cell into a fresh folder and mark it complete; returns (folder, seconds)"""
+    shutil.rmtree(folder, ignore_errors=True)
+    started = time.perf_counter()
+    backend.run_cell(cell, folder)
+    seconds = time.perf_counter() - started
+    with open(os.path.join(folder, MARKER), "w") as f:
+        json.dump(dict(cell, backend=backend.name, seconds=seconds), f)
+    return folder, seconds
+
+
+def run_sweep(backend, cells, out_dir, parallel=None):
+    """Run every incomplete cell; returns rows of (folder, status, seconds, error)"""
+    parallel = max(1, min(parallel or backend.max_parallel, backend.max_parallel))
+    rows, pending = [], []
+    for cell in cells:
+        folder = os.path.join(out_dir, cell_folder_name(cell))
+        if os.path.exists(os.path.join(folder, MARKER)):
+            rows.append({"folder": os.path.basename(folder), "status": "skipped", "seconds": np.nan, "error": ""})
+        else:
+            pending.append((cell, folder))
+    print(f"{len(cells)} cells: {len(cells) - len(pending)} already complete, {len(pending)} to run "
+          f"on '{backend.name}' with {parallel} in parallel")
+
+    with ProcessPoolExecutor(max_workers=parallel) as pool:
+        futures = {pool.submit(run_cell, backend, cell, folder): folder for cell, folder in pending}
+        for future in as_completed(futures):
+            name = os.path.basename(futures[future])
+            try:
+                _, seconds = future.result()
+                rows.append({"folder": name, "status": "done", "seconds": seconds, "error": ""})
+                print(f"  done    {name} ({seconds:.1f}s)")
+            except Exception as e:  # one failing cell must not stop an unattended sweep
+                rows.append({"folder": name, "status": "failed", "seconds": np.nan, "error": f"{type(e).__name__}: {e}"})
+                print(f"  failed  {name}: {type(e).__name__}: {e}")
+    return pd.DataFrame(rows)
+
+
+def parse_count(text):
+    """'100M' / '1e6' / '250K' -> int"""
+    multiplier = {"K": 10**3, "M": 10**6, "B": 10**9}.get(text[-1:].upper(), 1)
+    return int(float(text.rstrip("KMBkmb")) * multiplier)
+
+
+def parse_switch(values):
+    return [{"on": True, "off": False}[v] for v in values]
+
+
+def make_backend(args):
+    if args.backend == "fake":
+        return FakeBackend(args.fake_rows, args.seed)
+    if args.backend == "embedded":
+        return EmbeddedBackend(seed=args.seed)
+    if not (args.compose_file and args.load_command and args.queries):
+        raise SystemExit("The compose backend needs --compose-file, --load-command and --queries")
+    with open(args.queries) as f:
+        queries = json.load(f)
+    return ComposeBackend(args.compose_file, args.load_command, args.prometheus_url, queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a matrix of range-compaction experiments unattended")
+    parser.add_argument("out_dir", help="Directory for the experiment folders")
+    parser.add_argument("--backend", choices=["fake", "embedded", "compose"], default="fake")
+    parser.add_argument("--keys", nargs="+", default=["100M"], help="Total keys/operations per cell (e.g. 1M 10M)")
+    parser.add_argument("--weights", nargs="+", default=["20:8:1"], help="create:delete:list mixes")
+    parser.add_argument("--range-compaction", nargs="+", choices=["on", "off"], default=["on", "off"])
+    parser.add_argument("--periodic-full-compaction", nargs="+", choices=["on", "off"], default=["off", "on"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[DEFAULT_THREADS], help="Client thread counts")
+    parser.add_argument("--parallel", type=int, default=None, help="Cells at once (capped by the backend)")
+    parser.add_argument("--fake-rows", type=int, default=FAKE_ROWS, help="Rows per export with the fake backend")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compose-file", default=None)
+    parser.add_argument("--load-command", default=None, help="Shell template with {keys} {weights} {threads}")
+    parser.add_argument("--prometheus-url", default="http://localhost:9090")
+    parser.add_argument("--queries", default=None, help="JSON file mapping exported metric name -> PromQL")
+    parser.add_argument("--dry-run", action="store_true", help="List the cells and their status only")
+    args = parser.parse_args()
+
+    cells = expand_matrix(
+        [parse_count(k) for k in args.keys],
+        [tuple(int(w) for w in mix.split(":")) for mix in args.weights],
+        parse_switch(args.range_compaction),
+        parse_switch(args.periodic_full_compaction),
+        args.threads,
+    )
+    if args.dry_run:
+        for cell in cells:
+            folder = os.path.join(args.out_dir, cell_folder_name(cell))
+            print(f"{'complete' if os.path.exists(os.path.join(folder, MARKER)) else 'pending ':<8}  {folder}")
+        return
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    results = run_sweep(make_backend(args), cells, args.out_dir, args.parallel)
+    print("\n" + "=" * 70)
+    print("SWEEP SUMMARY")
+    print("=" * 70)
+    with pd.option_context("display.width", 200, "display.max_colwidth", 90):
+        print(results.to_string(index=False, float_format="%.1f"))
+    if (results["status"] == "failed").any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
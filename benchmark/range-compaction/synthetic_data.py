@@ -0,0 +1,212 @@
+"""
+Synthetic Grafana exports for exercising the analysis tools at scale.
+Writes experiment folders shaped like the real ones: one CSV per metric with a
+"Time","om:9874" header, values carrying Grafana unit strings (mixed ns/µs/ms/s,
+B/kB/MB/GB), a stretch of 2-minute sampling, dropped rows and empty cells, and
+OM restarts that reset cumulative counters. Rows are generated and written in
+chunks, so exports of 10^8 rows need no more memory than 10^6.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import KEY_COUNT_METRIC, LEADER_METRIC
+
+CHUNK_ROWS = 10**6
+START_TIME = pd.Timestamp("2025-06-10 11:00:00")
+EXPORT_STAMP = "2025-06-11 01_36_19"
+
+# Fraction of the run spent at 2-minute sampling, and where it starts
+SLOW_SAMPLING = (0.4, 0.1)
+# Fractions of the run where the OM restarts
+RESTARTS = (0.37, 0.81)
+RESTART_GAP_ROWS = 10
+GAP_PROBABILITY = 0.005
+EMPTY_PROBABILITY = 0.001
+
+# Metric -> unit family of its exported values ("raw" is a plain integer)
+SYNTHETIC_METRICS = {
+    KEY_COUNT_METRIC: "raw",
+    "DeletedTable Estimated number of keys": "raw",
+    # Cumulative since the OM started, so it resets on every restart
+    "Number of keys written": "raw",
+    "Number of seeks per second": "count",
+    "Number of next per second": "count",
+    "Number of keys read per second": "count",
+    "Bytes write per second": "bytes",
+    "Flush write bytes": "bytes",
+    "Compaction write bytes": "bytes",
+    "SST file total size": "bytes",
+    "Seek average latency": "duration",
+    "Seek max latency": "duration",
+    "Compaction time average": "duration",
+}
+
+# Only the leader serves reads, followers export zeros for these
+READ_METRICS = {LEADER_METRIC, "Number of next per second", "Number of keys read per second",
+                "Seek average latency", "Seek max latency"}
+
+BYTE_UNITS = [("B", 1), ("kB", 1024), ("MB", 1024**2), ("GB", 1024**3), ("TB", 1024**4)]
+DURATION_UNITS = [("ns", 1e-3), ("µs", 1), ("ms", 1e3), ("s", 1e6)]
+COUNT_UNITS = [("", 1)]
+
+CONFIGURATIONS = [
+    ("enable-range-compaction", "disable-peridioc-full-compaction"),
+    ("disable-range-compaction", "disable-peridioc-full-compaction"),
+    ("disable-range-compaction", "enable-peridioc-full-compaction"),
+    ("enable-range-compaction", "enable-peridioc-full-compaction"),
+]
+
+
+def experiment_folder_name(index, total_ops="100M"):
+    """Folder name in the repo's naming scheme, cycling through the compaction configurations"""
+    range_compaction, periodic = CONFIGURATIONS[index % len(CONFIGURATIONS)]
+    name = f"{total_ops}-20:8:1:{range_compaction}:{periodic}"
+    return name if index < len(CONFIGURATIONS) else f"{name}:rep-{index // len(CONFIGURATIONS)}"
+
+
+def slowdown(folder_name):
+    """How strongly tombstones degrade reads: none with range compaction, partial with periodic full compaction"""
+    if "enable-range-compaction" in folder_name:
+        return 0.0
+    return 0.5 if "enable-peridioc-full-compaction" in folder_name else 1.0
+
+
+def sample_times(index, rows, step_seconds):
+    """Timestamps of global row indices: fixed step, except one stretch at 2-minute sampling"""
+    slow_start = int(SLOW_SAMPLING[0] * rows)
+    slow_rows = np.clip(index - slow_start, 0, int(SLOW_SAMPLING[1] * rows))
+    seconds = index * step_seconds + slow_rows * max(120 - step_seconds, 0)
+    return START_TIME.to_datetime64() + seconds.astype("timedelta64[s]")
+
+
+def model_chunk(index, rows, total_keys, degradation, rng):
+    """Base-unit values of every synthetic metric for the given global row indices"""
+    progress = (index + 1) / rows
+    n = len(index)
+    keys = np.floor(total_keys * progress * rng.uniform(0.995, 1.005, n))
+    deleted = keys * (0.05 + 0.25 * progress) * (1 + degradation)
+    restart_starts = np.array([0.0] + [r * rows for r in RESTARTS])
+    since = restart_starts[np.searchsorted(restart_starts, index, side="right") - 1]
+    written = np.floor(total_keys * (index - since) / rows)
+
+    seeks = rng.lognormal(np.log(60.0), 0.3, n)
+    # Without range compaction every seek walks over more tombstones as deletes pile up
+    next_per_seek = 1 + 20 * degradation * progress * np.log10(keys + 10)
+    latency = 40 * next_per_seek * rng.lognormal(0.0, 0.4, n)
+    write_bytes = rng.lognormal(np.log(600 * 1024), 0.8, n)
+    compacting = rng.random(n) < 0.2
+    return {
+        KEY_COUNT_METRIC: keys,
+        "DeletedTable Estimated number of keys": np.floor(deleted),
+        "Number of keys written": written,
+        "Number of seeks per second": seeks,
+        "Number of next per second": seeks * next_per_seek,
+        "Number of keys read per second": seeks * rng.uniform(0.9, 1.0, n),
+        "Bytes write per second": write_bytes,
+        "Flush write bytes": write_bytes * rng.uniform(0.8, 1.2, n),
+        "Compaction write bytes": np.where(compacting, write_bytes * rng.lognormal(1.0, 0.7, n), 0.0),
+        "SST file total size": 200.0 * keys * (1 + degradation * progress),
+        "Seek average latency": np.where(seeks > 20, latency, 0.0),
+        # Heavy tail: mostly µs, sometimes tens of ms, occasionally sub-µs
+        "Seek max latency": latency * rng.lognormal(1.5, 1.5, n),
+        "Compaction time average": np.where(compacting, rng.lognormal(np.log(50e3), 2.0, n), 0.0),
+    }
+
+
+def format_values(values, family):
+    """Grafana-style strings: three significant digits and the largest unit keeping the number >= 1"""
+    if family == "raw":
+        text = np.where(np.isnan(values), "", np.nan_to_num(values).astype(np.int64).astype(str))
+        return text.tolist()
+    units = {"bytes": BYTE_UNITS, "duration": DURATION_UNITS, "count": COUNT_UNITS}[family]
+    scales = np.array([scale for _, scale in units], dtype=float)
+    magnitude = np.abs(np.nan_to_num(values))
+    idx = np.clip(np.searchsorted(scales, magnitude, side="right") - 1, 0, len(units) - 1)
+    # Zero is exported in the smallest unit ("0 ns", "0 B")
+    idx = np.where(magnitude == 0, 0, idx)
+    scaled = values / scales[idx]
+    with np.errstate(divide="ignore"):
+        decimals = np.clip(2 - np.floor(np.log10(np.abs(scaled))), 0, 2)
+    decimals = np.where(np.isfinite(decimals) & (scaled != 0), decimals, 0).astype(int)
+    names = [name for name, _ in units]
+    return [
+        "" if v != v else (f"{v:.{d}f} {names[i]}" if names[i] else f"{v:.{d}f}")
+        for v, d, i in zip(scaled.tolist(), decimals.tolist(), idx.tolist())
+    ]
+
+
+def write_experiment(folder, rows, instances=1, step_seconds=30, total_keys=10**8, seed=0):
+    """Write one synthetic experiment folder; returns the CSV paths"""
+    os.makedirs(folder, exist_ok=True)
+    degradation = slowdown(os.path.basename(folder))
+    columns = ["om:9874"] + [f"om{i + 1}:9874" for i in range(1, instances)]
+    handles = {}
+    for metric in SYNTHETIC_METRICS:
+        path = os.path.join(folder, f"{metric}-data-{EXPORT_STAMP}.csv")
+        handles[metric] = open(path, "w", encoding="utf-8")
+        handles[metric].write(",".join(f'"{c}"' for c in ["Time"] + columns))
+
+    restart_rows = np.array([int(r * rows) for r in RESTARTS])
+    # Every metric draws its own gaps, as separate Grafana panels do
+    gap_rngs = {metric: np.random.default_rng([seed, i]) for i, metric in enumerate(SYNTHETIC_METRICS)}
+    try:
+        for first in range(0, rows, CHUNK_ROWS):
+            index = np.arange(first, min(first + CHUNK_ROWS, rows))
+            model = model_chunk(index, rows, total_keys, degradation, np.random.default_rng([seed, first]))
+            last_restart = restart_rows[np.clip(np.searchsorted(restart_rows, index, side="right") - 1, 0, None)]
+            # The OM exports nothing while it restarts
+            restarting = (index >= last_restart) & (index < last_restart + RESTART_GAP_ROWS)
+            stamps = np.datetime_as_string(sample_times(index, rows, step_seconds), unit="s")
+
+            for metric, family in SYNTHETIC_METRICS.items():
+                rng = gap_rngs[metric]
+                keep = (rng.random(len(index)) >= GAP_PROBABILITY) & ~restarting
+                values = np.where(rng.random(len(index)) < EMPTY_PROBABILITY, np.nan, model[metric])[keep]
+                cells = [format_values(values, family)]
+                for _ in columns[1:]:
+                    if metric in READ_METRICS:
+                        follower = np.zeros_like(values)
+                    else:
+                        # Replicated key counts match the leader; local rates differ a little
+                        follower = values if family == "raw" else values * rng.uniform(0.98, 1.02, len(values))
+                    cells.append(format_values(follower, family))
+                times = [f"{t[:10]} {t[11:]}" for t in stamps[keep].tolist()]
+                handles[metric].write("".join(f"\n{t}," + ",".join(row) for t, *row in zip(times, *cells)))
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return [handle.name for handle in handles.values()]
+
+
+def generate(out_dir, experiments=3, rows=10**4, instances=1, step_seconds=30, seed=0):
+    """Write `experiments` synthetic experiment folders under out_dir; returns their paths"""
+    folders = []
+    for e in range(experiments):
+        folder = os.path.join(out_dir, experiment_folder_name(e))
+        write_experiment(folder, rows, instances, step_seconds, seed=seed + e)
+        folders.append(folder)
+    return folders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic Grafana exports for scaling tests")
+    parser.add_argument("out_dir", help="Directory to write the experiment folders into")
+    parser.add_argument("--experiments", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=10**4, help="Rows per metric export")
+    parser.add_argument("--instances", type=int, default=1, help="OM instances (columns) per export")
+    parser.add_argument("--step-seconds", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    folders = generate(args.out_dir, args.experiments, args.rows, args.instances, args.step_seconds, args.seed)
+    size = sum(os.path.getsize(os.path.join(f, name)) for f in folders for name in os.listdir(f)) / 1024**2
+    print(f"Wrote {len(folders)} experiments x {len(SYNTHETIC_METRICS)} metrics x {args.rows:,} rows ({size:.1f} MB)")
+    for folder in folders:
+        print(f"  {folder}")
+
+
+if __name__ == "__main__":
+    main()
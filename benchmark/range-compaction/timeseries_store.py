@@ -0,0 +1,191 @@
+"""
+Memory-mapped time-series store.
+Each (experiment, metric) series is written once as two fixed-dtype .npy files,
+int64 nanosecond timestamps and float64 values in base units, next to a small
+JSON index. Readers open the arrays with np.load(mmap_mode="r"), so every process
+shares the same page-cache pages with no parsing and no copies. Once built,
+benchmark_utils.load_metric_series (and so every script and parallel worker)
+reads from the store whenever the entry is current with the exports it came from.
+"""
+
+import argparse
+import functools
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    BASE_PATH,
+    EXPERIMENT_FOLDERS,
+    get_metric_files,
+    list_metrics,
+    load_metric_series,
+)
+
+DEFAULT_STORE_PATH = os.path.join(BASE_PATH, "timeseries_store")
+INDEX_FILE = "index.json"
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def _save_atomic(path, array):
+    """Write an .npy file via rename, so readers holding the old file keep a consistent mapping"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def source_mtime(folder_name, metric, files=None):
+    """Modification time of the export(s) a series is built from
+
+    Derived metrics depend on several exports, so they follow the newest one.
+    """
+    files = get_metric_files(folder_name) if files is None else files
+    if metric in files:
+        return os.path.getmtime(files[metric])
+    return max((os.path.getmtime(p) for p in files.values()), default=0.0)
+
+
+def _remove_entry(store_path, entry):
+    for key in ("times", "values"):
+        path = os.path.join(store_path, entry[key])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_store(store_path=DEFAULT_STORE_PATH, folders=None):
+    """Write every metric of every experiment that changed since the last build; returns the index
+
+    Entries of metrics no longer exported, and of experiment folders that are gone, are removed.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    index = open_store(store_path) if os.path.exists(os.path.join(store_path, INDEX_FILE)) else {}
+
+    for folder_name in list(index):
+        if not os.path.isdir(os.path.join(BASE_PATH, folder_name)):
+            shutil.rmtree(os.path.join(store_path, _slug(folder_name)), ignore_errors=True)
+            del index[folder_name]
+
+    for folder_name in folders or EXPERIMENT_FOLDERS.values():
+        entries = index.setdefault(folder_name, {})
+        files = get_metric_files(folder_name)
+        metrics = list_metrics(folder_name)
+        for metric in set(entries) - set(metrics):
+            _remove_entry(store_path, entries.pop(metric))
+
+        for metric in metrics:
+            mtime = source_mtime(folder_name, metric, files)
+            entry = entries.get(metric)
+            if entry is not None and entry["source_mtime"] == mtime:
+                continue
+
+            series = load_metric_series(folder_name, metric)
+            if series is None:
+                if entry is not None:
+                    _remove_entry(store_path, entries.pop(metric))
+                continue
+            directory = os.path.join(store_path, _slug(folder_name))
+            os.makedirs(directory, exist_ok=True)
+            stem = os.path.join(directory, _slug(metric))
+            _save_atomic(f"{stem}.times.npy", series["Time"].to_numpy().astype("datetime64[ns]").view(np.int64))
+            _save_atomic(f"{stem}.values.npy", series["value"].to_numpy(dtype=np.float64))
+            entries[metric] = {
+                "times": os.path.relpath(f"{stem}.times.npy", store_path),
+                "values": os.path.relpath(f"{stem}.values.npy", store_path),
+                "length": len(series),
+                "kind": series.attrs.get("kind", "count"),
+                "source_mtime": mtime,
+            }
+
+    tmp = os.path.join(store_path, f"{INDEX_FILE}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(store_path, INDEX_FILE))
+    return index
+
+
+def open_store(store_path=DEFAULT_STORE_PATH):
+    """Read the store index: {experiment folder: {metric: entry}}"""
+    with open(os.path.join(store_path, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def read_series(index, folder_name, metric, store_path=DEFAULT_STORE_PATH):
+    """Memory-mapped (int64 ns times, float64 values) of one series, or None if not stored"""
+    entry = index.get(folder_name, {}).get(metric)
+    if entry is None:
+        return None
+    times = np.load(os.path.join(store_path, entry["times"]), mmap_mode="r")
+    values = np.load(os.path.join(store_path, entry["values"]), mmap_mode="r")
+    return times, values
+
+
+def read_frame(index, folder_name, metric, store_path=DEFAULT_STORE_PATH):
+    """Stored series as the Time/value DataFrame returned by load_metric_series"""
+    arrays = read_series(index, folder_name, metric, store_path)
+    if arrays is None:
+        return None
+    times, values = arrays
+    series = pd.DataFrame({"Time": times.view("datetime64[ns]"), "value": values}, copy=False)
+    series.attrs["kind"] = index[folder_name][metric]["kind"]
+    return series
+
+
+@functools.lru_cache(maxsize=4)
+def _cached_index(index_path, mtime):
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def read_current_frame(folder_name, metric, store_path=DEFAULT_STORE_PATH):
+    """Stored series as a Time/value DataFrame if the store holds it and its exports are unchanged, else None"""
+    index_path = os.path.join(store_path, INDEX_FILE)
+    try:
+        index = _cached_index(index_path, os.path.getmtime(index_path))
+        entry = index.get(folder_name, {}).get(metric)
+        if entry is None or entry["source_mtime"] != source_mtime(folder_name, metric):
+            return None
+        return read_frame(index, folder_name, metric, store_path)
+    except OSError:
+        # No store yet, or a rebuild replaced a file under us: parse the exports instead
+        return None
+
+
+def open_all(store_path=DEFAULT_STORE_PATH):
+    """Map every stored series: {(experiment folder, metric): (times, values)}"""
+    index = open_store(store_path)
+    return {
+        (folder_name, metric): read_series(index, folder_name, metric, store_path)
+        for folder_name, entries in index.items()
+        for metric in entries
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the memory-mapped time-series store")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Store directory")
+    parser.add_argument("--open", action="store_true", help="Only time opening every stored series")
+    args = parser.parse_args()
+
+    if not args.open:
+        start = time.perf_counter()
+        index = build_store(args.store)
+        count = sum(len(entries) for entries in index.values())
+        print(f"Stored {count} series in '{args.store}' ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    series = open_all(args.store)
+    samples = sum(len(values) for _, values in series.values())
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Opened {len(series)} series ({samples:,} samples) in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Scaling benchmark for the analysis tooling.
+Times ingest, unit parsing, cached loading, magnitude lookup, alignment and
+rendering on synthetic exports of growing size, fits how each stage scales,
+and compares against a local baseline. Timings are divided by a fixed
+calibration workload timed in the same run, so the comparison holds across
+machines: a stage whose scaling exponent grows, or whose calibrated time grows
+by more than the tolerance, fails the run with a non-zero exit code.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from benchmark_utils import (
+    KEY_COUNT_METRIC,
+    TARGET_MAGNITUDES,
+    _read_metric_csv,
+    align_experiment_series,
+    find_magnitude_index,
+    get_metric_files,
+    load_metric_series,
+    parse_metric_values,
+    read_csv_data,
+)
+from synthetic_data import experiment_folder_name, write_experiment
+
+DEFAULT_SIZES = [10**6, 10**7, 10**8]
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "range-compaction-synthetic")
+BENCH_METRIC = "Seek max latency"
+ALIGN_METRICS = [KEY_COUNT_METRIC, "Number of seeks per second", "Number of next per second", BENCH_METRIC]
+DEFAULT_TOLERANCE = 0.25
+# A scaling exponent this much above the baseline's is a regression whatever the machine
+EXPONENT_TOLERANCE = 0.15
+# Calibrated timings of the default sizes, kept per checkout (gitignored); refresh with --save-baseline
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tooling_baseline.json")
+# Differences below this are timer noise, never regressions
+MIN_REGRESSION_SECONDS = 0.05
+# Rows parsed and sorted by the calibration workload
+CALIBRATION_ROWS = 10**6
+
+
+def synthetic_folder(rows, data_dir=DEFAULT_DATA_DIR):
+    """Experiment folder with `rows` rows per export, generated on first use"""
+    folder = os.path.join(data_dir, f"rows-{rows}", experiment_folder_name(1))
+    marker = os.path.join(folder, ".complete")
+    if not os.path.exists(marker):
+        print(f"Generating {rows:,} rows per export in {folder}")
+        write_experiment(folder, rows)
+        open(marker, "w").close()
+    return folder
+
+
+def _stage_ingest(folder):
+    return lambda: pd.read_csv(get_metric_files(folder)[BENCH_METRIC])
+
+
+def _stage_parse(folder):
+    column = pd.read_csv(get_metric_files(folder)[BENCH_METRIC]).iloc[:, 1]
+    return lambda: parse_metric_values(column)
+
+
+def _stage_load(folder):
+    def run():
+        _read_metric_csv.cache_clear()
+        return load_metric_series(folder, BENCH_METRIC)
+
+    return run
+
+
+def _stage_magnitude(folder):
+    key_count_df = read_csv_data(folder, f"{KEY_COUNT_METRIC}*.csv")
+    column = key_count_df.columns[1]
+    return lambda: [find_magnitude_index(key_count_df, column, m) for m in TARGET_MAGNITUDES]
+
+
+def _stage_align(folder):
+    for metric in ALIGN_METRICS:
+        load_metric_series(folder, metric)
+    return lambda: align_experiment_series(folder, ALIGN_METRICS)
+
+
+def _stage_render(folder):
+    series = load_metric_series(folder, BENCH_METRIC)
+    minutes = (series["Time"] - series["Time"].iloc[0]).dt.total_seconds().to_numpy() / 60
+    path = os.path.join(tempfile.gettempdir(), "tooling_benchmark_render.png")
+
+    def run():
+        plt.figure(figsize=(10, 6))
+        plt.plot(minutes, series["value"], linewidth=1)
+        plt.yscale("log")
+        plt.savefig(path, dpi=100)
+        plt.close()
+
+    return run
+
+
+STAGES = {
+    "ingest": _stage_ingest,
+    "parse": _stage_parse,
+    "load": _stage_load,
+    "magnitude": _stage_magnitude,
+    "align": _stage_align,
+    "render": _stage_render,
+}
+
+
+def _calibration():
+    """Fixed CSV parse and sort, the unit every stage time is expressed in"""
+    rng = np.random.default_rng(0)
+    text = "Time,value\n" + "\n".join(f"{i},{x:.6g} ms" for i, x in enumerate(rng.random(CALIBRATION_ROWS)))
+
+    def run():
+        df = pd.read_csv(io.StringIO(text))
+        np.sort(df["value"].str[:-3].astype(float).to_numpy())
+
+    return run
+
+
+def time_stage(run, repeat):
+    """Best of `repeat` wall-clock runs in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(sizes, stages, repeat=3, data_dir=DEFAULT_DATA_DIR):
+    """(calibration seconds, {stage: {rows: seconds}})"""
+    calibration = time_stage(_calibration(), repeat)
+    print(f"  calibration {CALIBRATION_ROWS:>10,} rows  {calibration:.4f}s")
+    results = {stage: {} for stage in stages}
+    for rows in sizes:
+        folder = synthetic_folder(rows, data_dir)
+        for stage in stages:
+            results[stage][rows] = time_stage(STAGES[stage](folder), repeat)
+            print(f"  {stage:<10} {rows:>12,} rows  {results[stage][rows]:.4f}s")
+    return calibration, results
+
+
+def scaling_exponent(timings):
+    """Slope of log(time) over log(rows): 1 is linear, 0 constant"""
+    rows = np.array([r for r, t in timings.items() if t > 0], dtype=float)
+    if len(rows) < 2:
+        return float("nan")
+    seconds = np.array([timings[int(r)] for r in rows])
+    return np.polyfit(np.log10(rows), np.log10(seconds), 1)[0]
+
+
+def baseline_record(calibration, results):
+    """Machine-independent form of a run: scaling exponents and timings in calibration units"""
+    return {
+        "calibration_seconds": calibration,
+        "stages": {
+            stage: {"exponent": scaling_exponent(timings),
+                    "calibrated": {str(r): t / calibration for r, t in timings.items()}}
+            for stage, timings in results.items()
+        },
+    }
+
+
+def find_regressions(calibration, results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """(stage, what, baseline, measured) for every exponent or calibrated time worse than the baseline allows
+
+    A calibrated time counts only when the absolute slowdown it implies on this machine is
+    above timer noise.
+    """
+    regressions = []
+    for stage, record in baseline_record(calibration, results)["stages"].items():
+        reference = baseline["stages"].get(stage)
+        if reference is None:
+            continue
+        exponent = record["exponent"]
+        if exponent > reference["exponent"] + EXPONENT_TOLERANCE:
+            regressions.append((stage, "exponent", reference["exponent"], exponent))
+        for rows, ratio in record["calibrated"].items():
+            expected = reference["calibrated"].get(rows)
+            if expected is None:
+                continue
+            if ratio > expected * (1 + tolerance) and (ratio - expected) * calibration > MIN_REGRESSION_SECONDS:
+                regressions.append((stage, f"{int(rows):,} rows", expected, ratio))
+    return regressions
+
+
+def print_results(calibration, results, sizes):
+    print("\n" + "=" * 70)
+    print(f"TOOLING SCALING (best wall time, seconds; calibration {calibration:.4f}s)")
+    print("=" * 70)
+    print(f"{'Stage':<10} " + " ".join(f"{r:>11,}" for r in sizes) + f" {'Exponent':>9}")
+    for stage, timings in results.items():
+        cells = " ".join(f"{timings[r]:>11.4f}" for r in sizes)
+        print(f"{stage:<10} {cells} {scaling_exponent(timings):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the analysis tooling on synthetic exports of growing size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Rows per export")
+    parser.add_argument("--stage", action="append", choices=list(STAGES), default=None, help="Stage to run (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where synthetic exports are cached")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fail on regressions against this baseline JSON")
+    parser.add_argument("--no-baseline", dest="baseline", action="store_const", const=None, help="Skip the comparison")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown fraction")
+    parser.add_argument("--save-baseline", default=None, help="Write the results as a baseline JSON")
+    args = parser.parse_args()
+
+    calibration, results = run_benchmarks(args.sizes, args.stage or list(STAGES), args.repeat, args.data_dir)
+    print_results(calibration, results, args.sizes)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(baseline_record(calibration, results), f, indent=1)
+        print(f"\nBaseline saved as '{args.save_baseline}'")
+
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f"\nNo baseline at '{args.baseline}'; save one with --save-baseline to gate later runs")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(calibration, results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS against '{args.baseline}' (exponent +{EXPONENT_TOLERANCE}, "
+                  f"calibrated time +{args.tolerance:.0%}):")
+            for stage, what, reference, measured in regressions:
+                print(f"  {stage:<10} {what:>18}  {reference:.3f} -> {measured:.3f}")
+            sys.exit(1)
+        print(f"\nNo regressions against '{args.baseline}'")
+
+
+if __name__ == "__main__":
+    main()
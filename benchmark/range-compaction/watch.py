@@ -0,0 +1,292 @@
+"""
+Watch mode for running benchmarks.
+Tails the metric exports of one or more experiment folders while they grow: each
+poll parses only the bytes appended since the stored offset, appends them to
+cached arrays, updates running aggregates (Welford mean/std, EWMA, min/max) and
+an incrementally decimated min/max envelope, then re-renders only the charts
+whose data changed. Parsing, aggregation and plotting work per poll therefore
+follow the new data, not the length of the run.
+"""
+
+import argparse
+import codecs
+import io
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from benchmark_utils import BASE_PATH, EXPERIMENT_FOLDERS, LEADER_METRIC, get_metric_files, parse_metric_values
+from matplotlib.figure import Figure
+from online_stats import EWMA, Welford
+
+OUT_DIR = os.path.join(BASE_PATH, "live_charts")
+DEFAULT_INTERVAL = 30
+# Envelope buckets kept per series; pairs are merged once it overflows
+MAX_ENVELOPE_BUCKETS = 2000
+# Grafana's CSV timestamp layout
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class GrowingArray:
+    """Append-only numpy array with doubling capacity"""
+
+    def __init__(self, dtype):
+        self.data = np.empty(1024, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, 2 * len(self.data)), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class Envelope:
+    """Min/max per bucket of 2^k samples, maintained incrementally with a bounded bucket count"""
+
+    def __init__(self, max_buckets=MAX_ENVELOPE_BUCKETS):
+        self.max_buckets = max_buckets
+        self.width = 1
+        self.times, self.low, self.high = [], [], []
+        self.pending = []
+
+    def extend(self, times, values):
+        for t, v in zip(times.tolist(), values.tolist()):
+            if v != v:
+                continue
+            self.pending.append((t, v))
+            if len(self.pending) == self.width:
+                self._close()
+
+    def _close(self):
+        values = [v for _, v in self.pending]
+        self.times.append(self.pending[0][0])
+        self.low.append(min(values))
+        self.high.append(max(values))
+        self.pending = []
+        if len(self.times) > self.max_buckets:
+            # Halve the resolution: merge neighbouring buckets, an odd last one stays
+            keep = len(self.times) - len(self.times) % 2
+            self.times = self.times[0:keep:2] + self.times[keep:]
+            self.low = [min(a, b) for a, b in zip(self.low[0:keep:2], self.low[1:keep:2])] + self.low[keep:]
+            self.high = [max(a, b) for a, b in zip(self.high[0:keep:2], self.high[1:keep:2])] + self.high[keep:]
+            self.width *= 2
+
+    def points(self):
+        """Interleaved (times, values) tracing low and high of every bucket, plus the open bucket"""
+        times, low, high = list(self.times), list(self.low), list(self.high)
+        if self.pending:
+            times.append(self.pending[0][0])
+            low.append(min(v for _, v in self.pending))
+            high.append(max(v for _, v in self.pending))
+        values = np.column_stack([low, high]).ravel() if times else np.empty(0)
+        return np.repeat(times, 2), values
+
+
+class TailedExport:
+    """One growing Grafana export: byte offset, cached arrays and running aggregates per instance"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.leftover = ""
+        self.columns = None
+        self.kind = "count"
+        self.times = GrowingArray("int64")
+        self.values = {}
+        self.stats = {}
+
+    def poll(self, final=False):
+        """Parse the bytes appended since the last poll; returns the number of new rows"""
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # Truncated or replaced: start over
+            self.__init__(self.path)
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            appended = f.read()
+        self.offset += len(appended)
+        # The incremental decoder holds back a multi-byte character (µ) split across polls
+        data = self.leftover + self.decoder.decode(appended, final=final)
+
+        # Only newline-terminated rows are whole while the writer may still append to the last one
+        # (a value or unit cut mid-way parses as a different number). Grafana writes no trailing
+        # newline, so the unterminated last row is taken on the final poll only
+        end = data.rfind("\n") + 1
+        complete, self.leftover = data[:end], data[end:]
+        if final:
+            complete, self.leftover = data, ""
+
+        lines = [line for line in complete.splitlines() if line.strip()]
+        if self.columns is None and lines:
+            self.columns = list(pd.read_csv(io.StringIO(lines.pop(0)), nrows=0).columns)
+        return self._append(lines) if lines else 0
+
+    def _append(self, lines):
+        df = pd.read_csv(io.StringIO("\n".join(lines)), header=None, names=self.columns)
+        times = pd.to_datetime(df["Time"], format=TIME_FORMAT, errors="coerce")
+        columns = {}
+        for instance in self.columns[1:]:
+            columns[instance], kind = parse_metric_values(df[instance])
+            self.kind = kind if kind != "count" else self.kind
+
+        # Same rule as the batch loader: keep rows where any instance has a value
+        valid = times.notna().to_numpy() & ~np.all([np.isnan(v) for v in columns.values()], axis=0)
+        if not valid.any():
+            return 0
+
+        ns = times.to_numpy()[valid].astype("datetime64[ns]").view(np.int64)
+        self.times.extend(ns)
+        for instance, values in columns.items():
+            values = values[valid]
+            self.values.setdefault(instance, GrowingArray("float64")).extend(values)
+            stats = self.stats.get(instance)
+            if stats is None:
+                stats = self.stats[instance] = {
+                    "moments": Welford(), "ewma": EWMA(600), "min": np.inf, "max": -np.inf, "envelope": Envelope(),
+                }
+            for t, v in zip((ns / 1e9).tolist(), values.tolist()):
+                if v == v:
+                    stats["moments"].update(v)
+                    stats["ewma"].update(t, v)
+            stats["min"] = np.fmin(stats["min"], np.nanmin(values, initial=np.inf))
+            stats["max"] = np.fmax(stats["max"], np.nanmax(values, initial=-np.inf))
+            stats["envelope"].extend(ns, values)
+        return int(valid.sum())
+
+
+class Watcher:
+    """Tails every export of a set of experiment folders and keeps one live chart per metric"""
+
+    def __init__(self, folders, out_dir=OUT_DIR, metrics=None):
+        self.folders = folders
+        self.out_dir = out_dir
+        self.metrics = set(metrics) if metrics else None
+        self.exports = {}  # (folder, metric) -> TailedExport
+        self.figures = {}  # metric -> (figure, axes, {folder: line})
+
+    def _discover(self):
+        for folder in self.folders:
+            for metric, path in get_metric_files(folder).items():
+                if self.metrics and metric not in self.metrics:
+                    continue
+                tailed = self.exports.get((folder, metric))
+                # A re-export under a newer name replaces the old file
+                if tailed is None or tailed.path != path:
+                    self.exports[(folder, metric)] = TailedExport(path)
+
+    def label(self, folder):
+        names = {path: name for name, path in EXPERIMENT_FOLDERS.items()}
+        return names.get(folder, os.path.basename(folder.rstrip("/")))
+
+    def leader(self, folder):
+        """Instance with the most seeks so far, or the first column"""
+        seeks = self.exports.get((folder, LEADER_METRIC))
+        if seeks is None or not seeks.stats:
+            return None
+        return max(seeks.stats, key=lambda i: seeks.stats[i]["moments"].mean * seeks.stats[i]["moments"].count)
+
+    def poll(self, final=False):
+        """One pass over all exports; returns {metric: new rows} for the metrics that changed"""
+        self._discover()
+        changed = {}
+        for (folder, metric), tailed in self.exports.items():
+            rows = tailed.poll(final)
+            if rows:
+                changed[metric] = changed.get(metric, 0) + rows
+        return changed
+
+    def render(self, metric):
+        """Redraw one metric's chart from the envelopes of every experiment"""
+        if metric not in self.figures:
+            # Figures outside pyplot stay alive between polls without piling up in its registry
+            fig = Figure(figsize=(10, 6))
+            ax = fig.subplots()
+            self.figures[metric] = (fig, ax, {})
+        fig, ax, lines = self.figures[metric]
+        kind = "count"
+        for folder in self.folders:
+            tailed = self.exports.get((folder, metric))
+            if tailed is None or not tailed.stats:
+                continue
+            kind = tailed.kind
+            instance = self.leader(folder)
+            stats = tailed.stats.get(instance) or next(iter(tailed.stats.values()))
+            times, values = stats["envelope"].points()
+            start = tailed.times.view()[0]
+            minutes = (np.asarray(times, dtype=float) - start) / 6e10
+            if folder not in lines:
+                (lines[folder],) = ax.plot([], [], linewidth=1, label=self.label(folder))
+                ax.legend(fontsize=8)
+            lines[folder].set_data(minutes, values)
+        ax.relim()
+        ax.autoscale_view()
+        ax.set_xlabel("Time Offset (minutes)")
+        ax.set_ylabel(f"{metric} ({kind})")
+        ax.set_title(f"{metric} (live)", fontweight="bold")
+        ax.grid(True, alpha=0.3)
+        os.makedirs(self.out_dir, exist_ok=True)
+        filename = re.sub(r"[^A-Za-z0-9_]", "_", metric.replace("µ", "u").replace(" ", "_")) + "_live.png"
+        fig.savefig(os.path.join(self.out_dir, filename), dpi=100)
+
+    def summary(self, metric):
+        """One status line per experiment with the running aggregates of its leader"""
+        rows = []
+        for folder in self.folders:
+            tailed = self.exports.get((folder, metric))
+            if tailed is None or not tailed.stats:
+                continue
+            stats = tailed.stats.get(self.leader(folder)) or next(iter(tailed.stats.values()))
+            moments = stats["moments"]
+            std = np.sqrt(moments.variance) if moments.count > 1 else float("nan")
+            rows.append(
+                f"    {self.label(folder)[:55]:<55} n={moments.count:<8} mean={moments.mean:.4g} "
+                f"std={std:.4g} ewma={stats['ewma'].value:.4g} min={stats['min']:.4g} max={stats['max']:.4g}"
+            )
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tail growing metric exports and keep live charts up to date")
+    parser.add_argument("folders", nargs="*", help="Experiment folders (default: the configured experiments)")
+    parser.add_argument("--metric", action="append", default=None, help="Metric to watch (repeatable, default: all)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between polls")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="Directory for the live charts")
+    parser.add_argument("--once", action="store_true", help="Poll and render once, then exit")
+    parser.add_argument("--quiet", action="store_true", help="Do not print running aggregates")
+    args = parser.parse_args()
+
+    watcher = Watcher(args.folders or list(EXPERIMENT_FOLDERS.values()), args.out_dir, args.metric)
+    try:
+        while True:
+            start = time.perf_counter()
+            changed = watcher.poll(final=args.once)
+            for metric in sorted(changed):
+                watcher.render(metric)
+            elapsed = time.perf_counter() - start
+            stamp = time.strftime("%H:%M:%S")
+            print(f"[{stamp}] +{sum(changed.values()):,} rows, re-rendered {len(changed)} charts ({elapsed:.2f}s)")
+            if not args.quiet:
+                for metric in sorted(changed):
+                    print(f"  {metric}")
+                    print("\n".join(watcher.summary(metric)))
+            if args.once:
+                break
+            time.sleep(max(args.interval - elapsed, 0))
+    except KeyboardInterrupt:
+        # Take the unterminated last rows before leaving
+        for metric in sorted(watcher.poll(final=True)):
+            watcher.render(metric)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Content-addressed cache of Ozone builds, keyed by commit SHA.
+Every file of an extracted `ozone-bin` tarball is stored once under
+objects/<sha256>-<mode> and hardlinked into builds/<commit sha>/, so builds that
+share jars share disk. Files users edit (`compose/`, `etc/` and config files)
+are copied instead, writable and private to their build. Tarballs are streamed member by member into a thread pool
+that hashes and writes the objects (decompressed by pigz when it is installed),
+least recently used builds are evicted to stay under a disk budget, and
+`current` is a symlink switched atomically between cached builds.
+Artifacts come from a pluggable source: GitHub via `gh`, or a local directory.
+"""
+
+import argparse
+import fcntl
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ROOT = "ozone-build"
+DEFAULT_REPO = "github.com/apache/ozone"
+ARTIFACT_NAME = "ozone-bin"
+META_FILE = "commit-meta.json"
+INDEX_FILE = "index.json"
+DEFAULT_BUDGET = "20G"
+EXTRACT_WORKERS = 8
+# Member bytes read ahead of the hashing/writing threads
+MAX_IN_FLIGHT_BYTES = 256 * 1024**2
+SIZE_SUFFIXES = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+# Members copied rather than linked: editing a shared read-only object would change every build using it
+EDITABLE_PATTERNS = ["*/compose/*", "*/etc/*", "*.xml", "*.yaml", "*.yml", "*.conf", "*.properties", "*.env",
+                     "*docker-config"]
+
+
+class GitHubSource:
+    """Workflow run artifacts downloaded with the `gh` CLI"""
+
+    def __init__(self, repo=DEFAULT_REPO):
+        self.repo = repo
+
+    def metadata(self, run_id):
+        output = subprocess.run(
+            ["gh", "run", "view", str(run_id), "--repo", self.repo, "--json", "headSha,headBranch,createdAt"],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(output)
+
+    def download(self, run_id, dest):
+        subprocess.run(["gh", "run", "download", str(run_id), "-n", ARTIFACT_NAME, "--repo", self.repo, "--dir", dest],
+                       check=True)
+        return sorted(glob.glob(os.path.join(dest, "ozone-*.tar.gz")))
+
+
+class LocalSource:
+    """A directory standing in for GitHub: <dir>/<run id>/commit-meta.json and ozone-*.tar.gz"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def metadata(self, run_id):
+        with open(os.path.join(self.directory, str(run_id), META_FILE)) as f:
+            return json.load(f)
+
+    def download(self, run_id, dest):
+        # Tarballs are read in place, nothing needs copying
+        return sorted(glob.glob(os.path.join(self.directory, str(run_id), "ozone-*.tar.gz")))
+
+
+def parse_size(text):
+    """'20G' / '500M' / '1024' -> bytes"""
+    text = str(text).strip().upper().rstrip("B")
+    return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]]) if text[-1:] in SIZE_SUFFIXES else int(text)
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def is_editable(member_name):
+    return any(fnmatch.fnmatch(member_name, pattern) for pattern in EDITABLE_PATTERNS)
+
+
+def _open_tar_stream(path):
+    """Streaming tarfile over a .tar.gz, decompressed by pigz in a separate process when available"""
+    pigz = shutil.which("pigz")
+    if pigz:
+        process = subprocess.Popen([pigz, "-dc", path], stdout=subprocess.PIPE)
+        return tarfile.open(fileobj=process.stdout, mode="r|"), process
+    return tarfile.open(path, mode="r|gz"), None
+
+
+class BuildCache:
+    """Objects, build trees, the LRU index and the `current` symlink under one root"""
+
+    def __init__(self, root=DEFAULT_ROOT, budget=DEFAULT_BUDGET, workers=EXTRACT_WORKERS):
+        self.root = os.path.abspath(root)
+        self.objects = os.path.join(self.root, "objects")
+        self.builds = os.path.join(self.root, "builds")
+        self.budget = parse_size(budget)
+        self.workers = workers
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.builds, exist_ok=True)
+
+    # Index
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_index(self, index):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".index-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path())
+
+    def lock(self):
+        """Exclusive lock on the cache for the lifetime of the returned file object"""
+        handle = open(os.path.join(self.root, ".lock"), "w")
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    # Objects
+
+    def _store(self, data, mode):
+        """Path of the object holding `data`, written on first sight (read-only, mode is part of the key)"""
+        mode = mode & 0o555
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.objects, digest[:2], f"{digest}-{mode:o}")
+        if os.path.exists(path):
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+        return path, True
+
+    def objects_size(self):
+        total = 0
+        for directory, _, files in os.walk(self.objects):
+            total += sum(os.lstat(os.path.join(directory, name)).st_size for name in files)
+        return total
+
+    # Extraction
+
+    def _extract(self, tar_path, dest, stats):
+        """Stream one tarball into dest: regular files become hardlinks to objects, editable ones copies"""
+        tar, process = _open_tar_stream(tar_path)
+        in_flight = threading.BoundedSemaphore(max(MAX_IN_FLIGHT_BYTES // (1024 * 1024), 1))
+        lock = threading.Lock()
+        deferred_links = []
+
+        def store_and_link(member_path, data, mode, slots, editable):
+            try:
+                if editable:
+                    with open(member_path, "wb") as f:
+                        f.write(data)
+                    os.chmod(member_path, (mode & 0o777) | 0o200)
+                    written = False
+                else:
+                    object_path, written = self._store(data, mode)
+                    os.link(object_path, member_path)
+                with lock:
+                    stats["files"] += 1
+                    stats["bytes"] += len(data)
+                    stats["copied"] += editable
+                    stats["new_objects"] += written
+                    stats["new_bytes"] += len(data) if written else 0
+            finally:
+                for _ in range(slots):
+                    in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = []
+            try:
+                for member in tar:
+                    target = os.path.join(dest, member.name)
+                    resolved, root = os.path.realpath(target), os.path.realpath(dest)
+                    if resolved != root and not resolved.startswith(root + os.sep):
+                        raise ValueError(f"Refusing to extract {member.name} outside the build directory")
+                    if member.isdir():
+                        os.makedirs(target, exist_ok=True)
+                    elif member.issym():
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.symlink(member.linkname, target)
+                    elif member.islnk():
+                        deferred_links.append((os.path.join(dest, member.linkname), target))
+                    elif member.isfile():
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        # One slot per MiB bounds the bytes read ahead of the workers
+                        slots = min(max(member.size // (1024 * 1024), 1), MAX_IN_FLIGHT_BYTES // (1024 * 1024))
+                        for _ in range(slots):
+                            in_flight.acquire()
+                        data = tar.extractfile(member).read()
+                        futures.append(pool.submit(store_and_link, target, data, member.mode, slots,
+                                                   is_editable(member.name)))
+            finally:
+                tar.close()
+                if process is not None:
+                    process.wait()
+            for future in futures:
+                future.result()
+        for source, target in deferred_links:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.link(source, target)
+
+    def add(self, run_id, source):
+        """Fetch and extract a run's build unless its commit is cached; returns (commit sha, metadata)"""
+        meta = source.metadata(run_id)
+        sha = meta["headSha"]
+        with self.lock():
+            index = self.load_index()
+            if sha in index and os.path.isdir(os.path.join(self.builds, sha)):
+                print(f"{sha[:12]} ({meta.get('headBranch')}) already cached")
+                self.touch(sha, index)
+                return sha, meta
+
+            staging = tempfile.mkdtemp(dir=self.builds, prefix=f".tmp-{sha[:12]}-")
+            download_dir = tempfile.mkdtemp(dir=self.root, prefix=".download-")
+            try:
+                started = time.perf_counter()
+                tarballs = source.download(run_id, download_dir)
+                if not tarballs:
+                    raise FileNotFoundError(f"No ozone-*.tar.gz in the {ARTIFACT_NAME} artifact of run {run_id}")
+                stats = {"files": 0, "bytes": 0, "copied": 0, "new_objects": 0, "new_bytes": 0}
+                # Tarballs extract concurrently; members of each are hashed and written by the pool
+                with ThreadPoolExecutor(max_workers=len(tarballs)) as pool:
+                    for future in [pool.submit(self._extract, t, staging, stats) for t in tarballs]:
+                        future.result()
+                with open(os.path.join(staging, META_FILE), "w") as f:
+                    json.dump(meta, f)
+                os.replace(staging, os.path.join(self.builds, sha))
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            finally:
+                shutil.rmtree(download_dir, ignore_errors=True)
+
+            index[sha] = {
+                "branch": meta.get("headBranch"),
+                "created_at": meta.get("createdAt"),
+                "run_id": str(run_id),
+                "size": stats["bytes"],
+                "last_used": time.time(),
+            }
+            self._alias(sha, meta.get("headBranch"))
+            print(f"Extracted {sha[:12]} ({meta.get('headBranch')}): {stats['files']:,} files, {format_size(stats['bytes'])}; "
+                  f"{stats['new_objects']:,} new objects ({format_size(stats['new_bytes'])}), "
+                  f"{stats['copied']:,} editable files copied, rest hardlinked, in {time.perf_counter() - started:.1f}s")
+            self.evict(index, keep={sha})
+            self.save_index(index)
+        return sha, meta
+
+    def _alias(self, sha, branch):
+        """ozone-build/<branch>-<sha> as in the manual download steps, pointing at the cached tree"""
+        if not branch:
+            return
+        alias = os.path.join(self.root, f"{branch.replace('/', '_')}-{sha}")
+        if not os.path.lexists(alias):
+            os.symlink(os.path.join("builds", sha), alias)
+
+    # LRU and switching
+
+    def touch(self, sha, index):
+        index[sha]["last_used"] = time.time()
+        self.save_index(index)
+
+    def current(self):
+        link = os.path.join(self.root, "current")
+        return os.path.basename(os.readlink(link)) if os.path.islink(link) else None
+
+    def resolve(self, name, index):
+        """Commit SHA for a full/abbreviated SHA, a run id or a branch name (most recent build)"""
+        matches = [sha for sha in index if sha.startswith(name)]
+        if len(matches) == 1:
+            return matches[0]
+        by_run = [sha for sha, entry in index.items() if entry.get("run_id") == name]
+        by_branch = sorted((sha for sha, entry in index.items() if entry.get("branch") == name),
+                           key=lambda sha: index[sha].get("created_at") or "")
+        candidates = by_run or by_branch[-1:]
+        if not candidates:
+            raise KeyError(f"No cached build matches '{name}'")
+        return candidates[0]
+
+    def use(self, name):
+        """Point `current` at a cached build; the symlink is replaced atomically"""
+        with self.lock():
+            index = self.load_index()
+            sha = self.resolve(name, index)
+            tmp = os.path.join(self.root, f".current-{os.getpid()}")
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            os.symlink(os.path.join("builds", sha), tmp)
+            os.replace(tmp, os.path.join(self.root, "current"))
+            self.touch(sha, index)
+        return sha
+
+    def evict(self, index, keep=()):
+        """Drop least recently used builds (never `current` or `keep`) until objects fit the budget"""
+        protected = set(keep) | {self.current()}
+        size = self.objects_size()
+        for sha in sorted(index, key=lambda s: index[s]["last_used"]):
+            if size <= self.budget:
+                break
+            if sha in protected:
+                continue
+            shutil.rmtree(os.path.join(self.builds, sha), ignore_errors=True)
+            for alias in glob.glob(os.path.join(self.root, f"*-{sha}")):
+                if os.path.islink(alias):
+                    os.unlink(alias)
+            del index[sha]
+            size -= self.collect_garbage()
+            print(f"Evicted {sha[:12]}, cache now {format_size(size)}")
+        return size
+
+    def collect_garbage(self):
+        """Delete objects no build links to (link count 1); returns the bytes freed"""
+        freed = 0
+        for directory, _, files in os.walk(self.objects):
+            for name in files:
+                path = os.path.join(directory, name)
+                stat = os.lstat(path)
+                if stat.st_nlink == 1:
+                    freed += stat.st_size
+                    os.unlink(path)
+        return freed
+
+
+def make_source(args):
+    return LocalSource(args.local_dir) if args.local_dir else GitHubSource(args.repo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed cache of Ozone builds keyed by commit SHA")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Cache directory")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="Disk budget for cached objects (e.g. 20G)")
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="Hashing/writing threads per tarball")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch = commands.add_parser("fetch", help="Download and cache a workflow run's ozone-bin build, then switch to it")
+    fetch.add_argument("run_id")
+    fetch.add_argument("--repo", default=DEFAULT_REPO)
+    fetch.add_argument("--local-dir", default=None, help="Read artifacts from <dir>/<run id>/ instead of GitHub")
+    fetch.add_argument("--no-switch", action="store_true", help="Cache only, leave `current` alone")
+    use = commands.add_parser("use", help="Switch `current` to a cached build (SHA prefix, run id or branch)")
+    use.add_argument("name")
+    commands.add_parser("list", help="Cached builds, most recently used first")
+    commands.add_parser("path", help="Print the directory of the current build")
+    commands.add_parser("gc", help="Evict builds over the budget and delete unreferenced objects")
+    args = parser.parse_args()
+
+    cache = BuildCache(args.root, args.budget, args.workers)
+    if args.command == "fetch":
+        sha, _ = cache.add(args.run_id, make_source(args))
+        if not args.no_switch:
+            cache.use(sha)
+            print(f"current -> {os.path.join(cache.builds, sha)}")
+    elif args.command == "use":
+        try:
+            sha = cache.use(args.name)
+        except KeyError as e:
+            sys.exit(e.args[0])
+        print(f"current -> {os.path.join(cache.builds, sha)}")
+    elif args.command == "list":
+        index, current = cache.load_index(), cache.current()
+        for sha in sorted(index, key=lambda s: -index[s]["last_used"]):
+            entry = index[sha]
+            used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+            print(f"{'*' if sha == current else ' '} {sha[:12]}  {entry.get('branch') or '':<30} run {entry.get('run_id')}  "
+                  f"{format_size(entry['size']):>10}  used {used}")
+        print(f"Objects on disk: {format_size(cache.objects_size())} of {format_size(cache.budget)}")
+    elif args.command == "path":
+        current = cache.current()
+        if current is None:
+            sys.exit("No current build, run `fetch` or `use` first")
+        print(os.path.join(cache.builds, current))
+    elif args.command == "gc":
+        with cache.lock():
+            index = cache.load_index()
+            size = cache.evict(index)
+            cache.save_index(index)
+            freed = cache.collect_garbage()
+        print(f"Cache {format_size(size - freed)} of {format_size(cache.budget)}, {format_size(freed)} unreferenced objects freed")
+
+
+if __name__ == "__main__":
+    main()